@@ -2,6 +2,13 @@ DEBUG = True
 
 CELERY_ALWAYS_EAGER = True
 
+# Tests run in a single process, celery tasks included
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'giscube.db.backends.postgis',
@@ -327,7 +327,8 @@ CELERY_TASK_SERIALIZER = 'json'
 
 CELERY_QUEUES = (
     Queue('default', Exchange('default'), routing_key='default'),
-    Queue('sequential_queue', Exchange('long'), routing_key='sequential_queue')
+    Queue('sequential_queue', Exchange('long'), routing_key='sequential_queue'),
+    Queue('thumbnails', Exchange('thumbnails'), routing_key='thumbnails')
 )
 CELERY_ROUTES = {
     'giscube.tasks.async_haystack_rebuild_index': {
@@ -339,17 +340,103 @@ CELERY_RESULT_BACKEND = 'django-db'
 CELERY_CACHE_BACKEND = 'django-cache'
 CELERY_TASK_TRACK_STARTED = True
 
+# Shared by the web, celery and management command processes: layerserver keeps there the versions of
+# the compiled layers, the layer data generations, the thumbnails status...
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/1'),
+    }
+}
+
 USER_ASSETS_STORAGE_CLASS = 'django.core.files.storage.FileSystemStorage'
 
 LAYERSERVER_FILE_STORAGE_CLASS = 'django.core.files.storage.FileSystemStorage'
 LAYERSERVER_THUMBNAIL_STORAGE_CLASS = 'django.core.files.storage.FileSystemStorage'
 
+# Protected files (layer files and thumbnails, user assets, resources, exports) are sent by Django once
+# the permissions are checked, giscube.utils.file_delivery.XAccelRedirectFileDelivery (nginx) or
+# XSendfileFileDelivery (Apache mod_xsendfile) let the web server send them
+PROTECTED_FILES_DELIVERY_CLASS = os.getenv(
+    'PROTECTED_FILES_DELIVERY_CLASS', 'giscube.utils.file_delivery.FileDelivery')
+# nginx internal locations of the protected directories used by X-Accel-Redirect
+PROTECTED_FILES_X_ACCEL_LOCATIONS = {
+    MEDIA_ROOT: os.getenv('PROTECTED_FILES_X_ACCEL_MEDIA_LOCATION', '/protected/media/'),
+    VAR_ROOT: os.getenv('PROTECTED_FILES_X_ACCEL_VAR_LOCATION', '/protected/var/'),
+}
+
 LAYERSERVER_THUMBNAIL_WIDTH = 256
 LAYERSERVER_THUMBNAIL_HEIGHT = 256
+# Other thumbnail sizes of image fields, {name: [width, height]}, widgets can set their own thumbnail_sizes
+LAYERSERVER_THUMBNAIL_SIZES = {}
+# Thumbnails format, PNG or WEBP, widgets can set their own thumbnail_format
+LAYERSERVER_THUMBNAIL_FORMAT = os.getenv('LAYERSERVER_THUMBNAIL_FORMAT', 'PNG')
+# Thumbnails are saved by celery workers of LAYERSERVER_THUMBNAIL_QUEUE (thumbnails has its own
+# prefork worker in docker-custom/django/celery.sh), they are 202 Accepted while they are pending
+LAYERSERVER_THUMBNAIL_ASYNC = os.getenv('LAYERSERVER_THUMBNAIL_ASYNC', 'True').lower() == 'true'
+LAYERSERVER_THUMBNAIL_QUEUE = os.getenv('LAYERSERVER_THUMBNAIL_QUEUE', 'thumbnails')
 
 LAYERSERVER_MAX_PAGE_SIZE = int(os.getenv('LAYERSERVER_MAX_PAGE_SIZE', '1000'))
 LAYERSERVER_PAGE_SIZE = int(os.getenv('LAYERSERVER_PAGE_SIZE', '50'))
 
+# Cache alias used by layerserver, it must be shared by every process (checked on startup)
+LAYERSERVER_CACHE = os.getenv('LAYERSERVER_CACHE', 'default')
+
+# Build GeoJSON content lists in the database when the layer fields allow it
+LAYERSERVER_SQL_GEOJSON = os.getenv('LAYERSERVER_SQL_GEOJSON', 'True').lower() == 'true'
+
+# Rows read at once from the server side cursor when streaming unpaginated content lists
+LAYERSERVER_STREAMING_CHUNK_SIZE = int(os.getenv('LAYERSERVER_STREAMING_CHUNK_SIZE', '2000'))
+
+# Rows written by each statement of databaselayer bulk requests
+LAYERSERVER_BULK_BATCH_SIZE = int(os.getenv('LAYERSERVER_BULK_BATCH_SIZE', '500'))
+
+# Answer If-None-Match on databaselayer content list and detail responses of tables. ETags change with the
+# data changed through the API, exactly counted list pages also read the row versions to see changes made
+# outside the API, ROW_VERSIONS reads them for details too
+LAYERSERVER_CONDITIONAL_GET = os.getenv('LAYERSERVER_CONDITIONAL_GET', 'True').lower() == 'true'
+LAYERSERVER_CONDITIONAL_GET_ROW_VERSIONS = os.getenv(
+    'LAYERSERVER_CONDITIONAL_GET_ROW_VERSIONS', 'False').lower() == 'true'
+
+# Cache alias of the content list responses cache, empty disables it. Bound its memory with the cache
+# backend options (MAX_ENTRIES, redis maxmemory)
+LAYERSERVER_RESPONSE_CACHE = os.getenv('LAYERSERVER_RESPONSE_CACHE', '')
+LAYERSERVER_RESPONSE_CACHE_TIMEOUT = int(os.getenv('LAYERSERVER_RESPONSE_CACHE_TIMEOUT', '300'))
+# Larger responses (bytes) are not cached
+LAYERSERVER_RESPONSE_CACHE_MAX_SIZE = int(os.getenv('LAYERSERVER_RESPONSE_CACHE_MAX_SIZE', str(1024 * 1024)))
+
+# Seconds the permissions and group data filters of a user on a layer are cached, they are invalidated
+# when the layer permissions or the user groups change
+LAYERSERVER_PERMISSIONS_CACHE_TIMEOUT = int(os.getenv('LAYERSERVER_PERMISSIONS_CACHE_TIMEOUT', '300'))
+
+# Layer export jobs files, finished exports are reused and deleted after LAYERSERVER_EXPORT_EXPIRE seconds
+LAYERSERVER_EXPORT_ROOT = os.getenv('LAYERSERVER_EXPORT_ROOT', os.path.join(VAR_ROOT, 'layerserver', 'exports'))
+LAYERSERVER_EXPORT_EXPIRE = int(os.getenv('LAYERSERVER_EXPORT_EXPIRE', '86400'))
+# Seconds between a layer data change and the regeneration of its artifacts (data.fgb), changes made
+# meanwhile are written once
+LAYERSERVER_ARTIFACT_REFRESH_DELAY = int(os.getenv('LAYERSERVER_ARTIFACT_REFRESH_DELAY', '10'))
+# Distinct values of the fields with the distinct values widget, default and maximum values per page and
+# seconds they are cached (writes to the layer invalidate them)
+LAYERSERVER_DISTINCT_VALUES_LIMIT = int(os.getenv('LAYERSERVER_DISTINCT_VALUES_LIMIT', '100'))
+LAYERSERVER_DISTINCT_VALUES_MAX_LIMIT = int(os.getenv('LAYERSERVER_DISTINCT_VALUES_MAX_LIMIT', '1000'))
+LAYERSERVER_DISTINCT_VALUES_CACHE_TIMEOUT = int(os.getenv('LAYERSERVER_DISTINCT_VALUES_CACHE_TIMEOUT', '3600'))
+
+# Results of the queries of the fields with the sqlchoices widget, default and maximum rows per page and
+# seconds they are cached (saving the field or the dblayer_clear_sqlchoices_cache command invalidate them)
+LAYERSERVER_SQLCHOICES_LIMIT = int(os.getenv('LAYERSERVER_SQLCHOICES_LIMIT', '100'))
+LAYERSERVER_SQLCHOICES_MAX_LIMIT = int(os.getenv('LAYERSERVER_SQLCHOICES_MAX_LIMIT', '1000'))
+LAYERSERVER_SQLCHOICES_CACHE_TIMEOUT = int(os.getenv('LAYERSERVER_SQLCHOICES_CACHE_TIMEOUT', '3600'))
+
+# Seconds between a layer data change and the refresh of the materialized relation1n counts of its
+# parent layers
+LAYERSERVER_RELATION_COUNTS_REFRESH_DELAY = int(os.getenv('LAYERSERVER_RELATION_COUNTS_REFRESH_DELAY', '10'))
+
+# Vector tiles cache directory, used by layers with tile_cache enabled
+LAYERSERVER_TILE_CACHE_ROOT = os.getenv('LAYERSERVER_TILE_CACHE_ROOT', os.path.join(VAR_ROOT, 'layerserver', 'tiles'))
+# Seconds a cached vector tile is served, the cache is cleared by changes made through the API but edits made
+# outside it are only seen when the tiles expire. 0 keeps them until the cache is cleared.
+LAYERSERVER_TILE_CACHE_TIMEOUT = int(os.getenv('LAYERSERVER_TILE_CACHE_TIMEOUT', '3600'))
+
 if not GISCUBE_LAYERSERVER_DISABLED:
     LAYERSERVER_STYLE_STROKE_COLOR = '#FF3333'
     LAYERSERVER_STYLE_FILL_COLOR = '#FFC300'
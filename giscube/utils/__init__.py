@@ -2,7 +2,9 @@ from .category import create_category, get_or_create_category
 from .django import (AdminEmailHandler, RecursionException, check_recursion, get_cls, get_version,
                      unique_service_directory)
 from .file import extract_zipfile, find_file, zipfile_find_file
+from .file_delivery import serve_protected_file
 from .giscube import get_giscube_id
+from .http import range_file_response
 from .string import env_string_parse
 from .url import full_url, remove_app_url, url_slash_join
 from .wms import get_service_wms_bbox
@@ -12,7 +14,9 @@ __all__ = [
     'create_category', 'get_or_create_category',
     'AdminEmailHandler', 'RecursionException', 'check_recursion', 'get_cls', 'get_version', 'unique_service_directory',
     'extract_zipfile', 'find_file', 'zipfile_find_file',
+    'serve_protected_file',
     'get_giscube_id', 'unique_service_directory',
+    'range_file_response',
     'env_string_parse',
     'full_url', 'remove_app_url', 'url_slash_join',
     'get_service_wms_bbox'
@@ -0,0 +1,92 @@
+import mimetypes
+import os
+
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_response_headers
+
+from .django import get_cls
+from .http import range_file_response
+
+
+def get_content_disposition(filename, as_attachment=False):
+    disposition = 'attachment' if as_attachment else 'inline'
+    try:
+        filename.encode('ascii')
+        return '%s; filename="%s"' % (disposition, filename.replace('\\', '\\\\').replace('"', r'\"'))
+    except UnicodeEncodeError:
+        return "%s; filename*=utf-8''%s" % (disposition, quote(filename))
+
+
+class FileDelivery(object):
+    """
+    Sends protected files from Django, once the view has checked the permissions
+    """
+
+    def serve(self, request, path, content_type=None, as_attachment=False, filename=None, etag=None):
+        if not os.path.isfile(path):
+            raise Http404
+        return range_file_response(
+            request, path, content_type=content_type, as_attachment=as_attachment, filename=filename, etag=etag)
+
+
+class XSendfileFileDelivery(FileDelivery):
+    """
+    Lets the web server send the file (Apache mod_xsendfile, lighttpd), it handles Range and
+    conditional requests
+    """
+    header = 'X-Sendfile'
+
+    def get_header_value(self, path):
+        return path
+
+    def serve(self, request, path, content_type=None, as_attachment=False, filename=None, etag=None):
+        if not os.path.isfile(path):
+            raise Http404
+        value = self.get_header_value(path)
+        if value is None:
+            return super().serve(request, path, content_type, as_attachment, filename, etag)
+        if content_type is None:
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = HttpResponse(content_type=content_type)
+        response[self.header] = value
+        if etag:
+            response['ETag'] = etag
+        if as_attachment:
+            response['Content-Disposition'] = get_content_disposition(
+                filename or os.path.basename(path), as_attachment)
+        return response
+
+
+class XAccelRedirectFileDelivery(XSendfileFileDelivery):
+    """
+    Lets nginx send the file from the internal location of its directory (PROTECTED_FILES_X_ACCEL_LOCATIONS),
+    files out of them are sent from Django
+    """
+    header = 'X-Accel-Redirect'
+
+    def get_header_value(self, path):
+        path = os.path.realpath(path)
+        for root, location in settings.PROTECTED_FILES_X_ACCEL_LOCATIONS.items():
+            root = os.path.realpath(root)
+            if path.startswith(root + os.sep):
+                relative_path = os.path.relpath(path, root).replace(os.sep, '/')
+                return '%s/%s' % (location.rstrip('/'), quote(relative_path))
+
+
+def get_file_delivery():
+    return get_cls('PROTECTED_FILES_DELIVERY_CLASS', FileDelivery)()
+
+
+def serve_protected_file(request, path, content_type=None, as_attachment=False, filename=None, etag=None,
+                         cache_timeout=None):
+    """
+    Response that sends the file in path with the PROTECTED_FILES_DELIVERY_CLASS backend
+    """
+    response = get_file_delivery().serve(
+        request, path, content_type=content_type, as_attachment=as_attachment, filename=filename, etag=etag)
+    if cache_timeout is not None and response.status_code in (200, 206):
+        patch_response_headers(response, cache_timeout=cache_timeout)
+    return response
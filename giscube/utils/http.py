@@ -0,0 +1,100 @@
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    Returns (start, end) of a single byte range, None if the header can't be used (multiple ranges
+    or invalid) and False if the range is not satisfiable
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if start == '':
+        if end == '' or int(end) == 0:
+            return False
+        # Suffix range, last bytes of the file
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    end = size - 1 if end == '' else min(int(end), size - 1)
+    if start > end:
+        return False
+    return start, end
+
+
+def iter_file_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def get_file_etag(stat):
+    # Same strong validator nginx uses, files are replaced rather than changed in place
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def is_range_valid(request, etag, last_modified):
+    """
+    False if If-Range doesn't match the file, the whole file must be sent
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def range_file_response(request, path, content_type=None, as_attachment=False, filename=None, etag=None):
+    """
+    FileResponse of path that answers single byte Range requests with 206 Partial Content and
+    conditional requests (If-None-Match, If-Modified-Since) with 304 Not Modified. etag is
+    computed from the file modification time and size by default.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = etag or get_file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and is_range_valid(request, etag, last_modified):
+        byte_range = parse_range(request.META['HTTP_RANGE'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%s' % size
+        return response
+    if byte_range is None:
+        response = FileResponse(
+            open(path, 'rb'), as_attachment=as_attachment, filename=filename or os.path.basename(path))
+        if content_type:
+            response['Content-Type'] = content_type
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_file_range(open(path, 'rb'), start, end - start + 1), status=206,
+            content_type=content_type or 'application/octet-stream')
+        response['Content-Range'] = 'bytes %s-%s/%s' % (start, end, size)
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -3,12 +3,12 @@ import os
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, render
-from django.utils.cache import patch_response_headers
+from django.utils._os import safe_join
 from django.utils.encoding import force_str
 from django.views.decorators.cache import never_cache
-from django.views.static import serve
 
 from rest_framework.views import APIView
 
@@ -16,6 +16,15 @@ from geoportal.views import GeoportalMixin
 from giscube.api_search_views import FilterByUserMixin
 
 from .models import UserAsset
+from .utils import serve_protected_file
+
+
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    return serve_protected_file(request, full_path)
 
 
 def media_user_asset(request, user_id, filename):
@@ -24,21 +33,16 @@ def media_user_asset(request, user_id, filename):
         if request.user == user:
             path = 'user/assets/%s/%s' % (user_id, filename)
             asset = get_object_or_404(UserAsset, user_id=user_id, file=path)
-            full_path = asset.file.path
-            fd = open(full_path, 'rb')
-            file_mime = mimetypes.guess_type(asset.file.name.split('/')[-1])
-            response = FileResponse(fd, content_type=file_mime)
-            patch_response_headers(response, cache_timeout=60 * 60 * 24 * 7)
-            return response
+            file_mime = mimetypes.guess_type(asset.file.name.split('/')[-1])[0]
+            return serve_protected_file(
+                request, asset.file.path, content_type=file_mime, cache_timeout=60 * 60 * 24 * 7)
 
     raise Http404
 
 
 def private_serve(request, path):
-    document_root = settings.MEDIA_ROOT
-    show_indexes = False
     if request.user and request.user.is_superuser:
-        return serve(request, path, document_root, show_indexes)
+        return serve_media(request, path)
     return HttpResponseForbidden()
 
 
@@ -77,10 +81,8 @@ class ResourceFileServer(GeoportalMixin, FilterByUserMixin, APIView):
         if not qs.exists():
             return HttpResponseForbidden()
 
-        document_root = settings.MEDIA_ROOT
-        show_indexes = False
         path = os.path.join(module, model, force_str(pk), 'resource', file)
-        return serve(request, path, document_root, show_indexes)
+        return serve_media(request, path)
 
 
 @never_cache
@@ -10,7 +10,7 @@ from django_vue_tabs.admin import TabsMixin
 from giscube.admin_mixins import MetadataInlineMixin, ResourceAdminMixin
 from giscube.utils import unique_service_directory
 
-from .admin_actions import geojsonlayer_force_refresh_data
+from .admin_actions import dblayer_create_search_indexes, geojsonlayer_force_refresh_data
 from .admin_filters import DataBaseLayerGeomNullFilter
 from .admin_forms import (DataBaseLayerAddForm, DataBaseLayerChangeForm, DataBaseLayerFieldsInlineForm,
                           DataBaseLayerReferencesInlineForm, DataBaseLayerStyleRuleInlineForm,
@@ -366,6 +366,7 @@ class DataBaseLayerAdmin(ResourceAdminMixin, TabsMixin, admin.ModelAdmin):
                    DataBaseLayerGeomNullFilter, 'shapetype')
     search_fields = ('name', 'title', 'keywords')
     inlines = []
+    actions = admin.ModelAdmin.actions + [dblayer_create_search_indexes]
 
     add_fieldsets = (
         ('Layer', {
@@ -405,14 +406,14 @@ class DataBaseLayerAdmin(ResourceAdminMixin, TabsMixin, admin.ModelAdmin):
                 'category', 'name', 'title',
                 'description', 'keywords', 'active',
                 'visible_on_geoportal',
-                ('allow_page_size_0', 'page_size', 'max_page_size',),
+                ('allow_page_size_0', 'page_size', 'max_page_size', 'count_mode',),
             ],
             'classes': ('tab-information',),
         }),
         (None, {
             'fields': [
                 'db_connection', 'table', 'pk_field', 'data_filter',
-                'data_filter_status', 'data_filter_error'
+                'data_filter_status', 'data_filter_error', ('search_backend', 'search_config',),
             ],
             'classes': ('tab-data-base',),
         }),
@@ -436,14 +437,15 @@ class DataBaseLayerAdmin(ResourceAdminMixin, TabsMixin, admin.ModelAdmin):
                 'category', 'name', 'title',
                 'description', 'keywords', 'active',
                 'visible_on_geoportal',
-                ('allow_page_size_0', 'page_size', 'max_page_size',),
+                ('allow_page_size_0', 'page_size', 'max_page_size', 'count_mode',),
+                'tile_cache',
             ],
             'classes': ('tab-information',),
         }),
         (None, {
             'fields': [
                 'db_connection', 'table', 'pk_field', 'geom_field', 'srid',
-                'data_filter', 'data_filter_status', 'data_filter_error'
+                'data_filter', 'data_filter_status', 'data_filter_error', ('search_backend', 'search_config',),
             ],
             'classes': ('tab-data-base',),
         }),
@@ -2,7 +2,8 @@ from django.contrib import messages
 from django.core.exceptions import PermissionDenied
 from django.utils.translation import gettext as _
 
-from .tasks import async_geojsonlayer_refresh
+from .models import SEARCH_BACKEND_CHOICES
+from .tasks import async_create_search_indexes, async_geojsonlayer_refresh
 
 
 def geojsonlayer_force_refresh_data(modeladmin, request, queryset):
@@ -16,3 +17,17 @@ def geojsonlayer_force_refresh_data(modeladmin, request, queryset):
 
 
 geojsonlayer_force_refresh_data.short_description = _('Force refresh data files')
+
+
+def dblayer_create_search_indexes(modeladmin, request, queryset):
+    if not request.user.has_perm('layerserver.change_databaselayer'):
+        raise PermissionDenied
+
+    queryset = queryset.exclude(search_backend=SEARCH_BACKEND_CHOICES.icontains)
+    for obj in queryset.all():
+        async_create_search_indexes.delay(obj.pk)
+    n = queryset.count()
+    modeladmin.message_user(request, _('Creating search indexes of %s databaselayers') % n, messages.INFO)
+
+
+dblayer_create_search_indexes.short_description = _('Create search indexes')
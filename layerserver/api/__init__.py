@@ -1,7 +1,8 @@
 from .dblayer import DBLayerDetailViewSet, DBLayerViewSet
-from .dblayer_content import DBLayerContentBulkViewSet, DBLayerContentViewSet
+from .dblayer_content import DBLayerContentBulkViewSet, DBLayerContentIngestView, DBLayerContentViewSet
+from .dblayer_export import DBLayerExportViewSet
 from .geojson import GeoJSONLayerViewSet
 
 
-__all__ = ['DBLayerDetailViewSet', 'DBLayerViewSet', 'DBLayerContentBulkViewSet', 'DBLayerContentViewSet',
-           'GeoJSONLayerViewSet']
+__all__ = ['DBLayerDetailViewSet', 'DBLayerViewSet', 'DBLayerContentBulkViewSet', 'DBLayerContentIngestView',
+           'DBLayerContentViewSet', 'DBLayerExportViewSet', 'GeoJSONLayerViewSet']
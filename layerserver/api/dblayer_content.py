@@ -1,47 +1,92 @@
+import json
 import logging
 import mimetypes
 import os
 import warnings
 
-from functools import reduce
+from collections import OrderedDict
+from functools import partial, reduce
+from itertools import islice
 from operator import __or__ as OR
 
 from django.conf import settings
-from django.contrib.gis.gdal import CoordTransform, SpatialReference
+from django.contrib.gis.db.models.functions import AsWKB, SnapToGrid, Transform
 from django.contrib.gis.geos import GEOSGeometry, Polygon
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.files.uploadedfile import UploadedFile
-from django.db import transaction
-from django.db.models import Q
+from django.db import DatabaseError, transaction
+from django.db.models import F, IntegerField, Q
 from django.forms.models import model_to_dict
-from django.http import FileResponse, Http404, HttpResponseBadRequest
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.utils.cache import patch_response_headers
-from django.utils.functional import cached_property
+from django.template.response import SimpleTemplateResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.translation import gettext as _
 
 from rest_framework import filters, parsers, status, views, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+from rest_framework.utils.urls import replace_query_param
 
 from giscube.cache_utils import giscube_transaction_cache_response
 from giscube.models import UserAsset
+from giscube.utils import serve_protected_file
 
-from ..filters import filterset_factory
-from ..model_legacy import create_dblayer_model
-from ..models import DataBaseLayer, DBLayerGroup
-from ..pagination import create_geojson_pagination_class, create_json_pagination_class
-from ..permissions import BulkDBLayerIsValidUser, DBLayerIsValidUser
-from ..serializers import create_dblayer_serializer
+from ..arrow import (ARROW_STREAM_MEDIA_TYPE, ArrowColumn, ArrowRenderer, get_record_batch, get_schema,
+                     is_arrow_available, stream_record_batches)
+from ..compiled_layer import get_compiled_layer
+from ..conditional import get_generation_etag, get_queryset_etag
+from ..distinct_values import get_distinct_values, has_distinct_values
+from ..export import schedule_artifacts_refresh
+from ..functions import SimplifyPreserveTopology
+from ..ingest import ON_CONFLICT_CHOICES, ON_CONFLICT_ERROR, ON_CONFLICT_UPDATE, CopyIngestion, IngestError, get_reader
+from ..models import COUNT_MODE_CHOICES, DataBaseLayer, DataBaseLayerField
+from ..mvt import (MVTRenderer, clear_tile_cache, get_cached_tile, get_tile_cache_key, get_tile_queryset,
+                   is_valid_tile, render_tile, set_cached_tile)
+from ..permissions import BulkDBLayerIsValidUser, DBLayerIsValidUser, DBLayerPermissions
+from ..relation_counts import schedule_count_views_refresh
+from ..response_cache import (bump_data_generation, get_cached_response, get_response_cache_key,
+                              is_response_cache_enabled, set_cached_response)
+from ..search import fulltext_search
+from ..sqlchoices import filter_sqlchoices, get_sqlchoices
 
 
 logger = logging.getLogger(__name__)
 
 
+# Meters per pixel of web mercator zoom level 0 (256 pixels tiles)
+ZOOM_0_RESOLUTION = 156543.03392804097
+METERS_PER_DEGREE = 111319.49079327357
+
+
 class PageSize0NotAllowedException(Exception):
     pass
 
 
+def _stream_json_array(prefix, items, suffix, batch_size):
+    """
+    Yields prefix, items (JSON encoded) joined by commas in batches and suffix
+    """
+    yield prefix
+    separator = ''
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield separator + ','.join(batch)
+            separator = ','
+            batch = []
+    if batch:
+        yield separator + ','.join(batch)
+    yield suffix
+
+
 class DBLayerContentViewSetMixin(object):
-    def get_model_serializer_class(self):
+    def get_serializer_fields(self):
         fields = list(self._fields.keys())
         if self.request.method == 'GET':
             only_fields = self.request.GET.get('fields', None)
@@ -54,18 +99,30 @@ class DBLayerContentViewSetMixin(object):
                 if self.layer.geom_field in fields:
                     only_fields.append(self.layer.geom_field)
                 fields = list(set(only_fields))
-        return create_dblayer_serializer(self.model, fields, self.lookup_field, self._virtual_fields)
+        return fields
+
+    def get_model_serializer_class(self):
+        return self.compiled_layer.get_serializer_class(self.get_serializer_fields())
 
     def _virtual_fields_get_queryset(self, qs):
         for field in self._virtual_fields.values():
             qs = field.widget_class.get_queryset(qs, field, self.request)
         return qs
 
-    @cached_property
+    @property
     def _virtual_fields(self):
-        return {field.name: field for field in self.layer.virtual_fields.filter(enabled=True)}
+        return self.compiled_layer.virtual_fields
 
-    def filter_queryset_by_group_data_filter(self, qs):
+    def data_changed(self):
+        """
+        Called after layer data has been changed and committed
+        """
+        bump_data_generation(self.layer.pk)
+        clear_tile_cache(self.layer.pk)
+        schedule_artifacts_refresh(self.layer.pk)
+        schedule_count_views_refresh(self.layer)
+
+    def filter_queryset_by_group_data_filter(self, qs, permission=None):
         actions = {
             'get': 'view',
             'options': 'view',
@@ -75,16 +132,10 @@ class DBLayerContentViewSetMixin(object):
             'patch': 'update',
             'delete': 'delete'
         }
-        permission = actions.get(self.request.method.lower())
-        layer_groups = DBLayerGroup.objects.filter(
-            **{
-                'layer': self.layer,
-                'group__in': self.request.user.groups.all(),
-                'can_%s' % permission: True
-            }
-        ).exclude(data_filter={}, data_filter_status='disabled')
-        for layer_group in layer_groups:
-            qs = qs.filter(**layer_group.data_filter)
+        if permission is None:
+            permission = actions.get(self.request.method.lower())
+        for data_filter in DBLayerPermissions.get_data_filters(self.layer, self.request.user, permission):
+            qs = qs.filter(**data_filter)
         return qs
 
 
@@ -104,19 +155,14 @@ class DBLayerContentViewSet(DBLayerContentViewSetMixin, viewsets.ModelViewSet):
     _fields = {}
 
     def dispatch(self, request, *args, **kwargs):
-        self.layer = DataBaseLayer.objects.filter(name=kwargs['name']).first()
-        if self.layer is None:
+        self.compiled_layer = get_compiled_layer(kwargs['name'])
+        if self.compiled_layer is None:
             raise Http404
-        self.model = create_dblayer_model(self.layer)
+        self.layer = self.compiled_layer.layer
+        self.model = self.compiled_layer.model
         self.lookup_field = self.layer.pk_field
-        self.filter_fields = []
-        self._fields = {}
-        for field in self.layer.fields.filter(enabled=True):
-            if field.search is True:
-                self.filter_fields.append(field.name)
-            self._fields[field.name] = {
-                'fullsearch': field.fullsearch
-            }
+        self.filter_fields = self.compiled_layer.filter_fields
+        self._fields = self.compiled_layer.fields
         lookup_field_value = kwargs.get(self.lookup_url_kwarg)
         defaults = {}
         defaults[self.lookup_field] = lookup_field_value
@@ -131,22 +177,28 @@ class DBLayerContentViewSet(DBLayerContentViewSetMixin, viewsets.ModelViewSet):
     def get_serializer_class(self):
         return self.get_model_serializer_class()
 
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action == 'list' and is_arrow_available():
+            renderers.append(ArrowRenderer())
+        return renderers
+
     def bbox2wkt(self, bbox, srid):
+        """
+        EPSG:4326 polygon of the bbox, the database transforms it to the layer srid (ST_Transform)
+        """
         bbox = bbox.split(',')
         minx, miny, maxx, maxy = tuple(bbox)
         wkt = ('SRID=4326;'
                'POLYGON ('
                '(%s %s, %s %s, %s %s, %s %s, %s %s))' %
                (minx, miny, maxx, miny, maxx, maxy, minx, maxy, minx, miny))
-        geom = GEOSGeometry(wkt, srid=4326)
-        if srid != 4326:
-            srs_to = SpatialReference(srid)
-            srs_4326 = SpatialReference(4326)
-            trans = CoordTransform(srs_4326, srs_to)
-            geom.transform(trans)
-        return geom
+        return GEOSGeometry(wkt, srid=4326)
 
     def geom_from_intersects_param(self, intersects, srid):
+        """
+        EPSG:4326 polygon of the intersects parameter, the database transforms it to the layer srid
+        """
         if intersects.startswith('POLYGON'):
             geom = GEOSGeometry(intersects, srid=4326)
             warnings.warn(
@@ -156,11 +208,6 @@ class DBLayerContentViewSet(DBLayerContentViewSetMixin, viewsets.ModelViewSet):
             coordinates = list(map(float, intersects.split(',')))
             pairs = list(zip(coordinates[0::2], coordinates[1::2]))
             geom = Polygon(pairs, srid=4326)
-        if srid != 4326:
-            srs_to = SpatialReference(srid)
-            srs_4326 = SpatialReference(4326)
-            trans = CoordTransform(srs_4326, srs_to)
-            geom.transform(trans)
         return geom
 
     def _geom_filters(self, qs):
@@ -178,6 +225,8 @@ class DBLayerContentViewSet(DBLayerContentViewSetMixin, viewsets.ModelViewSet):
     def _fullsearch_filters(self, qs):
         q = self.request.query_params.get('q', None)
         if q:
+            if self.compiled_layer.fulltext_search:
+                return fulltext_search(self.compiled_layer, qs, q)
             lst = []
             for name, field in self._fields.items():
                 if field['fullsearch'] is True:
@@ -193,12 +242,88 @@ class DBLayerContentViewSet(DBLayerContentViewSetMixin, viewsets.ModelViewSet):
         qs = self._fullsearch_filters(qs)
         qs = self._geom_filters(qs)
         qs = self._virtual_fields_get_queryset(qs)
-        model_filter = filterset_factory(self.model, self.filter_fields, self._virtual_fields)
+        model_filter = self.compiled_layer.filterset_class
         qs = model_filter(data=self.request.query_params, queryset=qs)
         qs = qs.filter()
         qs = self.filter_queryset_by_group_data_filter(qs)
+        geom_expression = self.get_geom_expression()
+        if geom_expression is not None:
+            qs = qs.defer(self.layer.geom_field).annotate(_giscube_geom=geom_expression)
         return qs
 
+    def get_number_param(self, name, number_type, min_value=None, max_value=None):
+        value = self.request.query_params.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            value = number_type(value)
+        except ValueError:
+            raise ValidationError({name: _('Invalid value: %s') % value})
+        if (min_value is not None and value < min_value) or (max_value is not None and value > max_value):
+            raise ValidationError({name: _('Invalid value: %s') % value})
+        return value
+
+    def get_simplify_tolerance(self):
+        """
+        Simplification tolerance in layer units from the resolution (meters per pixel) or the
+        zoom (web mercator zoom level) parameters
+        """
+        resolution = self.get_number_param('resolution', float, min_value=0)
+        zoom = self.get_number_param('zoom', int, 0, 30)
+        if resolution is None and zoom is not None:
+            resolution = ZOOM_0_RESOLUTION / 2 ** zoom
+        if not resolution:
+            return None
+        if self.compiled_layer.geographic:
+            return resolution / METERS_PER_DEGREE
+        return resolution
+
+    def get_out_srid(self):
+        out_srid = self.get_number_param('out_srid', int, min_value=1)
+        if out_srid is None:
+            return 4326
+        if not self.compiled_layer.is_valid_srid(out_srid):
+            raise ValidationError({'out_srid': _('Invalid value: %s') % out_srid})
+        return out_srid
+
+    def get_output_crs(self):
+        """
+        GeoJSON crs member, only needed when the output isn't EPSG:4326
+        """
+        out_srid = self.get_out_srid()
+        if out_srid != 4326:
+            return OrderedDict([('type', 'name'), ('properties', {'name': 'EPSG:%s' % out_srid})])
+
+    def get_geom_expression(self):
+        """
+        Output geometry computed by the database, None when the layer geometry can be used as is.
+        It's simplified by zoom/resolution, transformed to out_srid (EPSG:4326 by default) and its
+        coordinates are rounded to precision decimals.
+        """
+        if self.action not in ('list', 'retrieve') or not self.compiled_layer.has_geom:
+            return None
+        tolerance = self.get_simplify_tolerance()
+        precision = self.get_number_param('precision', int, 0, 15)
+        out_srid = self.get_out_srid()
+        if tolerance is None and precision is None and out_srid == self.layer.srid:
+            return None
+
+        geom = F(self.layer.geom_field)
+        if tolerance:
+            geom = SimplifyPreserveTopology(geom, tolerance)
+        if out_srid != self.layer.srid:
+            geom = Transform(geom, out_srid)
+        if precision is not None:
+            geom = SnapToGrid(geom, 10 ** -precision)
+        return geom
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        crs = self.get_output_crs()
+        if crs is not None and 'features' in response.data:
+            response.data['crs'] = crs
+        return response
+
     def get_queryset(self):
         qs = None
         try:
@@ -208,16 +333,303 @@ class DBLayerContentViewSet(DBLayerContentViewSetMixin, viewsets.ModelViewSet):
             raise
         return qs
 
+    def get_etag(self, queryset, row_versions=False):
+        """
+        Quoted ETag of the response for the rows of queryset, None if responses can't be validated.
+        By default it only depends on the layer data generation, with row_versions the rows are read
+        to see changes made outside the API too. Views have none, their rows change outside the API.
+        """
+        if not settings.LAYERSERVER_CONDITIONAL_GET or not self.compiled_layer.has_row_versions():
+            return None
+        parts = (self.compiled_layer.version, self.request.get_full_path(), self.request.accepted_media_type)
+        if row_versions:
+            etag = get_queryset_etag(queryset, *parts)
+        else:
+            etag = get_generation_etag(self.layer.pk, queryset, *parts)
+        return quote_etag(etag)
+
+    def has_exact_count(self):
+        """
+        True if the list response counts all the rows, cursor pages, estimated or skipped counts and
+        streamed lists don't scan the whole queryset
+        """
+        paginator = self.paginator
+        return (
+            paginator is not None and hasattr(paginator, 'get_count_mode')
+            and paginator.get_count_mode(self.request) == COUNT_MODE_CHOICES.exact
+        )
+
+    def get_conditional_response(self, etag, get_response):
+        """
+        Returns 304 Not Modified if If-None-Match matches etag, the get_response() response otherwise
+        """
+        response = None
+        if etag is not None:
+            response = get_conditional_response(self.request, etag=etag)
+        if response is None:
+            response = get_response()
+        if etag is not None:
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_response_cache_token(self):
+        """
+        Image urls include the access token of the request, these responses are cached per token
+        """
+        if not self.compiled_layer.image_fields:
+            return None
+        return getattr(self.request.auth, 'token', None)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        cache_key = None
+        if is_response_cache_enabled():
+            cache_key = get_response_cache_key(
+                self.layer.pk, queryset, self.compiled_layer.version, sorted(request.query_params.lists()),
+                request.accepted_media_type, request.build_absolute_uri('/'), self.get_response_cache_token())
+            cached = get_cached_response(cache_key)
+            if cached is not None:
+                response, etag = cached
+                return self.get_conditional_response(etag, lambda: response)
+
+        # The exact count scans the rows anyway
+        etag = self.get_etag(queryset, self.has_exact_count())
+        response = self.get_conditional_response(etag, lambda: self.get_list_response(request, *args, **kwargs))
+        if cache_key is not None:
+            if isinstance(response, SimpleTemplateResponse) and not response.is_rendered:
+                response.add_post_render_callback(lambda r: set_cached_response(cache_key, r, etag))
+            else:
+                set_cached_response(cache_key, response, etag)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            etag = self.get_etag(
+                queryset.filter(**{self.lookup_field: kwargs[self.lookup_url_kwarg]}),
+                settings.LAYERSERVER_CONDITIONAL_GET_ROW_VERSIONS)
+        except (TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        return self.get_conditional_response(etag, lambda: super(DBLayerContentViewSet, self).retrieve(
+            request, *args, **kwargs))
+
+    def get_list_response(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == ArrowRenderer.format:
+            return self.get_arrow_response()
+        feature_expression = None
+        if settings.LAYERSERVER_SQL_GEOJSON:
+            fields = self.get_serializer_fields()
+            geometry = F('_giscube_geom') if self.get_geom_expression() is not None else None
+            feature_expression = self.compiled_layer.get_feature_expression(fields, geometry)
+        if self.paginator is None:
+            return self.get_streaming_response(feature_expression)
+        if feature_expression is None:
+            return super().list(request, *args, **kwargs)
+
+        # Features are built as text by the database, model fields are only used by cursor pagination
+        values = [field for field in fields if field != self.layer.geom_field]
+        queryset = self.filter_queryset(self.get_queryset())
+        if hasattr(self.paginator, 'get_ordering'):
+            # The cursor of the next page is read from the ordering fields of the last row
+            for name in self.paginator.get_ordering(request, queryset, self):
+                name = name.lstrip('-')
+                if name not in values:
+                    values.append(name)
+        queryset = queryset.annotate(_giscube_feature=feature_expression).values('_giscube_feature', *values)
+        page = self.paginate_queryset(queryset)
+        data = self.get_paginated_response({'features': []}).data
+        return self.get_raw_features_response(data, [item['_giscube_feature'] for item in page])
+
+    def get_streaming_response(self, feature_expression=None):
+        """
+        Unpaginated lists are streamed, rows are read from a server side cursor
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        chunk_size = settings.LAYERSERVER_STREAMING_CHUNK_SIZE
+        if feature_expression is not None:
+            queryset = queryset.annotate(_giscube_feature=feature_expression)
+            items = queryset.values_list('_giscube_feature', flat=True).iterator(chunk_size=chunk_size)
+        else:
+            serializer = self.get_serializer()
+            items = (
+                json.dumps(serializer.to_representation(obj), cls=encoders.JSONEncoder, ensure_ascii=False)
+                for obj in queryset.iterator(chunk_size=chunk_size)
+            )
+        if self.compiled_layer.has_geom:
+            prefix = '{"type": "FeatureCollection", "features": ['
+            crs = self.get_output_crs()
+            if crs is not None:
+                prefix = '{"type": "FeatureCollection", "crs": %s, "features": [' % json.dumps(crs)
+        else:
+            prefix = '{"data": ['
+        return StreamingHttpResponse(
+            _stream_json_array(prefix, items, ']}', chunk_size), content_type='application/json')
+
+    def get_arrow_response(self):
+        """
+        Content list as an Arrow IPC stream of record batches built from chunks of rows, geometries
+        are WKB in out_srid (EPSG:4326 by default). Virtual fields are not included.
+        """
+        geom_field = self.layer.geom_field
+        serializer_fields = self.get_serializer_fields()
+        names = [
+            field.name for field in self.model._meta.fields
+            if field.name in serializer_fields and field.name != geom_field
+        ]
+        columns = [ArrowColumn(name, self.model._meta.get_field(name)) for name in names]
+        expressions = {}
+        if self.compiled_layer.has_geom and geom_field in serializer_fields:
+            geometry = F('_giscube_geom') if self.get_geom_expression() is not None else F(geom_field)
+            expressions['_giscube_wkb'] = AsWKB(geometry)
+            columns.append(ArrowColumn(geom_field, self.model._meta.get_field(geom_field), geometry=True))
+        keys = names + list(expressions)
+        queryset = self.filter_queryset(self.get_queryset()).values(*names, **expressions)
+        if self.paginator is not None:
+            chunks = [self.paginate_queryset(queryset)]
+        else:
+            rows = queryset.iterator(chunk_size=settings.LAYERSERVER_STREAMING_CHUNK_SIZE)
+            chunks = iter(lambda: list(islice(rows, settings.LAYERSERVER_STREAMING_CHUNK_SIZE)), [])
+        schema = get_schema(columns, self.get_out_srid())
+        batches = (
+            get_record_batch(schema, columns, [[row[key] for key in keys] for row in chunk]) for chunk in chunks
+        )
+        return StreamingHttpResponse(stream_record_batches(schema, batches), content_type=ARROW_STREAM_MEDIA_TYPE)
+
+    def get_raw_features_response(self, data, features):
+        """
+        Returns data as JSON with features, a list of JSON encoded features, as its features member
+        """
+        data = OrderedDict(data)
+        del data['features']
+        content = json.dumps(data)
+        content = '%s%s"features": [%s]}' % (content[:-1], ', ' if data else '', ','.join(features))
+        return HttpResponse(content, content_type='application/json')
+
     def get_pagination_class(self, layer):
         page_size = layer.get_page_size()
-        max_page_size = layer.get_max_page_size()
         if not layer.allow_page_size_0 and self.request.GET.get('page_size', page_size) == '0':
             raise PageSize0NotAllowedException()
         if self.request.GET.get('page_size', page_size) != '0':
-            if self.layer.geom_field and self.layer.geom_field in self._fields:
-                return create_geojson_pagination_class(page_size=page_size, max_page_size=max_page_size)
+            if 'cursor' in self.request.GET:
+                if self.compiled_layer.has_geom:
+                    return self.compiled_layer.geojson_cursor_pagination_class
+                else:
+                    return self.compiled_layer.json_cursor_pagination_class
+            if self.compiled_layer.has_geom:
+                return self.compiled_layer.geojson_pagination_class
             else:
-                return create_json_pagination_class(page_size=page_size, max_page_size=max_page_size)
+                return self.compiled_layer.json_pagination_class
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.data_changed()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.data_changed()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        self.data_changed()
+
+    @action(detail=False, methods=['get'], renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [MVTRenderer])
+    def tiles(self, request, *args, **kwargs):
+        z, x, y = kwargs['z'], kwargs['x'], kwargs['y']
+        if not self.compiled_layer.has_geom or not is_valid_tile(z, x, y):
+            raise Http404
+
+        fields = self.get_tile_fields(self.get_serializer_fields())
+        queryset = get_tile_queryset(self.get_queryset(), self.layer, fields, z, x, y)
+        pk_field = self.model._meta.get_field(self.layer.pk_field)
+        id_field = self.layer.pk_field if isinstance(pk_field, IntegerField) else None
+
+        tile = None
+        key = self.get_tile_cache_key(queryset, z, x, y) if self.layer.tile_cache else None
+        if key is not None:
+            tile = get_cached_tile(self.layer.pk, key, z, x, y)
+        if tile is None:
+            tile = render_tile(queryset, self.layer.name, id_field)
+            if key is not None:
+                set_cached_tile(self.layer.pk, key, z, x, y, tile)
+        return HttpResponse(tile, content_type='application/vnd.mapbox-vector-tile')
+
+    def get_tile_fields(self, fields):
+        image_fields = self.compiled_layer.image_fields
+        return [field for field in fields if field != self.layer.geom_field and field not in image_fields]
+
+    def get_tile_cache_key(self, queryset, z, x, y):
+        """
+        Only tiles of the whole layer (the layer and user data filters apply, all the fields) are cached,
+        tiles filtered by the request parameters (filters, q, fields...) return None
+        """
+        whole_layer = self.filter_queryset_by_group_data_filter(
+            self._virtual_fields_get_queryset(self.model.objects.all()))
+        whole_layer = get_tile_queryset(whole_layer, self.layer, self.get_tile_fields(self._fields), z, x, y)
+        key = get_tile_cache_key(queryset)
+        if key == get_tile_cache_key(whole_layer):
+            return key
+
+    @action(detail=False, methods=['get'])
+    def distinct_values(self, request, *args, **kwargs):
+        """
+        Page of the distinct values of a field with the distinct values widget, q filters the values that
+        start with it and after is the last value of the previous page
+        """
+        field_name = kwargs['field']
+        if not has_distinct_values(self.compiled_layer, field_name):
+            raise Http404
+        limit = self.get_number_param('limit', int, 1, settings.LAYERSERVER_DISTINCT_VALUES_MAX_LIMIT)
+        q = request.query_params.get('q') or None
+        after = request.query_params.get('after')
+        if after is not None:
+            try:
+                after = self.model._meta.get_field(field_name).to_python(after)
+            except DjangoValidationError:
+                raise ValidationError({'after': _('Invalid value: %s') % after})
+        result = get_distinct_values(self.compiled_layer, field_name, q=q, after=after, limit=limit)
+        next_url = None
+        if result['has_next']:
+            next_url = replace_query_param(request.build_absolute_uri(), 'after', result['values'][-1])
+        return Response(OrderedDict((
+            ('values', result['values']),
+            ('next', next_url),
+        )))
+
+    @action(detail=False, methods=['get'])
+    def sqlchoices(self, request, *args, **kwargs):
+        """
+        Page of the result of the query of a field with the sqlchoices widget, q filters the rows with
+        some value that contains it
+        """
+        field = None
+        if kwargs['field'] in self._fields:
+            field = self.layer.fields.filter(
+                name=kwargs['field'], widget=DataBaseLayerField.WIDGET_CHOICES.sqlchoices).first()
+        if field is None:
+            raise Http404
+        limit = self.get_number_param('limit', int, 1, settings.LAYERSERVER_SQLCHOICES_MAX_LIMIT)
+        if limit is None:
+            limit = settings.LAYERSERVER_SQLCHOICES_LIMIT
+        offset = self.get_number_param('offset', int, 0) or 0
+        try:
+            result = get_sqlchoices(field)
+        except Exception as e:
+            logger.error('Error in sqlchoices query of %s.%s: %s', self.layer.name, field.name, e)
+            return Response({'error': 'ERROR WITH WIDGET OPTIONS'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        rows = result['rows']
+        q = request.query_params.get('q')
+        if q:
+            rows = filter_sqlchoices(rows, q)
+        next_url = None
+        if offset + limit < len(rows):
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+        return Response(OrderedDict((
+            ('count', len(rows)),
+            ('next', next_url),
+            ('headers', result['headers']),
+            ('values', rows[offset:offset + limit]),
+        )))
 
     # def delete_multiple(self, request, *args, **kwargs):
     #     queryset = self.filter_queryset(self.get_queryset())
@@ -234,12 +646,8 @@ class DBLayerContentViewSet(DBLayerContentViewSetMixin, viewsets.ModelViewSet):
         }
         obj = get_object_or_404(self.model, **filter)
         file = getattr(obj, attribute)
-        full_path = file.path
-        fd = open(full_path, 'rb')
-        file_mime = mimetypes.guess_type(file.name.split('/')[-1])
-        response = FileResponse(fd, content_type=file_mime)
-        patch_response_headers(response, cache_timeout=60 * 60 * 24 * 7)
-        return response
+        file_mime = mimetypes.guess_type(file.name.split('/')[-1])[0]
+        return serve_protected_file(request, file.path, content_type=file_mime, cache_timeout=60 * 60 * 24 * 7)
 
     @action(detail=True, methods=['get'])
     def thumbnail_value(self, request, *args, **kwargs):
@@ -251,13 +659,31 @@ class DBLayerContentViewSet(DBLayerContentViewSetMixin, viewsets.ModelViewSet):
         }
         obj = get_object_or_404(self.model, **filter)
         file = getattr(obj, attribute)
-        thumbnail = file.storage.get_thumbnail(file.name, create=True)
-        full_path = thumbnail['path']
-        fd = open(full_path, 'rb')
-        file_mime = mimetypes.guess_type(file.name.split('/')[-1])
-        response = FileResponse(fd, content_type=file_mime)
-        patch_response_headers(response, cache_timeout=60 * 60 * 24 * 7)
-        return response
+        if not file:
+            raise Http404
+        storage = file.storage
+        if not getattr(storage, 'thumbnail_location', None):
+            raise Http404
+        # The thumbnail name in the url tells its size
+        size = None
+        for name in storage.get_thumbnail_sizes():
+            if name is not None and kwargs.get('path') == storage.get_thumbnail_name(file.name, name):
+                size = name
+        if not storage.thumbnail_exists(file.name, size):
+            if not storage.is_thumbnail_async():
+                storage.save_thumbnail(file.name)
+            elif storage.is_thumbnail_error(file.name):
+                raise Http404
+            else:
+                storage.schedule_thumbnail(file.name)
+                response = HttpResponse(status=status.HTTP_202_ACCEPTED)
+                response['Retry-After'] = '2'
+                patch_cache_control(response, no_cache=True)
+                return response
+        thumbnail = storage.get_thumbnail(file.name, size=size)
+        file_mime = mimetypes.guess_type(thumbnail['name'].split('/')[-1])[0]
+        return serve_protected_file(
+            request, thumbnail['path'], content_type=file_mime, cache_timeout=60 * 60 * 24 * 7)
 
     class Meta:
         filter_overrides = ['geom']
@@ -286,13 +712,14 @@ class DBLayerContentBulkViewSet(DBLayerContentViewSetMixin, views.APIView):
         return super().dispatch(request, *args, **kwargs)
 
     def initial(self, request, *args, **kwargs):
-        self.layer = DataBaseLayer.objects.get(name=kwargs['name'])
-        self.model = create_dblayer_model(self.layer)
+        self.compiled_layer = get_compiled_layer(kwargs['name'])
+        if self.compiled_layer is None:
+            raise DataBaseLayer.DoesNotExist
+        self.layer = self.compiled_layer.layer
+        self.model = self.compiled_layer.model
         self.lookup_field = self.layer.pk_field
         self.geom_field = self.layer.geom_field
-        self._fields = {}
-        for field in self.layer.fields.filter(enabled=True):
-            self._fields[field.name] = {}
+        self._fields = self.compiled_layer.fields
         return super().initial(request, *args, **kwargs)
 
     def get_queryset(self):
@@ -312,13 +739,9 @@ class DBLayerContentBulkViewSet(DBLayerContentViewSetMixin, views.APIView):
             size = os.path.getsize(path)
             return UploadedFile(image_file, file_name, file_mime, size)
 
-    @cached_property
+    @property
     def _image_fields(self):
-        from ..models import DataBaseLayerField
-        image_fields = {}
-        for field in self.layer.fields.filter(widget=DataBaseLayerField.WIDGET_CHOICES.image):
-            image_fields[field.name] = field
-        return image_fields
+        return self.compiled_layer.image_fields
 
     def apply_widgets(self, items):
         image_fields = self._image_fields
@@ -366,9 +789,11 @@ class DBLayerContentBulkViewSet(DBLayerContentViewSetMixin, views.APIView):
     def add(self, items):
         self.apply_widgets(items)
         Serializer = self.get_model_serializer_class()
+        # Image files are stored by each row save
+        bulk_save = len(self._image_fields) == 0
         add_serializers = []
         for i, item in enumerate(items):
-            serializer = Serializer(data=item, context={'request': self.request})
+            serializer = Serializer(data=item, context={'request': self.request, 'bulk_save': bulk_save})
             if serializer.is_valid():
                 add_serializers.append(serializer)
             else:
@@ -380,6 +805,29 @@ class DBLayerContentBulkViewSet(DBLayerContentViewSetMixin, views.APIView):
             except Exception:
                 self.created_objects.append(serializer.instance)
                 return {i: self.ERROR_ON_SAVE}
+        if bulk_save:
+            return self.bulk_create(self.created_objects)
+
+    def bulk_create(self, objs):
+        """
+        Inserts objs with one INSERT ... RETURNING per batch, database generated primary keys are set
+        in order
+        """
+        db = self.model.objects.db
+        objs_without_pk = [obj for obj in objs if obj.pk is None]
+        try:
+            with transaction.atomic(using=db):
+                self.model.objects.bulk_create(objs, batch_size=settings.LAYERSERVER_BULK_BATCH_SIZE)
+        except Exception:
+            # Saved one by one to know which item fails
+            for obj in objs_without_pk:
+                obj.pk = None
+            for i, obj in enumerate(objs):
+                try:
+                    with transaction.atomic(using=db):
+                        obj.save(force_insert=True)
+                except Exception:
+                    return {i: self.ERROR_ON_SAVE}
 
     def add_result(self, result):
         result['ADD'] = []
@@ -411,39 +859,82 @@ class DBLayerContentBulkViewSet(DBLayerContentViewSetMixin, views.APIView):
     def update(self, items):
         self.apply_widgets(items)
         Serializer = self.get_model_serializer_class()
+        pk_field = self.model._meta.get_field(self.lookup_field)
+        lookup_values = []
+        for item in items:
+            try:
+                lookup_values.append(pk_field.to_python(self.get_lookup_field_value(item)))
+            except DjangoValidationError:
+                lookup_values.append(None)
+        filter = {}
+        filter['%s__in' % self.lookup_field] = [value for value in lookup_values if value is not None]
+        objects = {getattr(obj, self.lookup_field): obj for obj in self.model.objects.filter(**filter)}
+
         update_serializers = []
         for i, item in enumerate(items):
-            filter = {}
-            filter[self.lookup_field] = self.get_lookup_field_value(item)
-            obj = self.model.objects.filter(**filter).first()
+            obj = objects.get(lookup_values[i])
             if obj is None:
                 return {i: self.ERROR_NOT_EXIST}
 
-            self.original_updated_objects[list(filter.values())[0]] = model_to_dict(obj, exclude=['pk'])
-            serializer = Serializer(instance=obj, data=item, partial=True, context={'request': self.request})
+            if lookup_values[i] not in self.original_updated_objects:
+                self.original_updated_objects[lookup_values[i]] = model_to_dict(obj, exclude=['pk'])
+            serializer = Serializer(
+                instance=obj, data=item, partial=True, context={'request': self.request, 'bulk_save': True})
             if serializer.is_valid():
                 update_serializers.append(serializer)
             else:
                 return {i: serializer.errors}
 
+        fields = set()
         for i, serializer in enumerate(update_serializers):
             try:
                 self.updated_objects.append(serializer.save())
             except Exception:
                 self.updated_objects.append(serializer.instance)
                 return {i: self.ERROR_ON_SAVE}
+            fields.update(serializer.bulk_save_fields)
+        return self.bulk_update(update_serializers, fields)
+
+    def bulk_update(self, update_serializers, fields):
+        """
+        Saves the instances of update_serializers with one UPDATE per batch
+        """
+        model_fields = [self.model._meta.get_field(name) for name in sorted(fields) if name != self.lookup_field]
+        if len(model_fields) == 0:
+            return
+        objs = list({id(serializer.instance): serializer.instance for serializer in update_serializers}.values())
+        for obj in objs:
+            # Model.save does it: files are stored, auto_now fields are set...
+            for field in model_fields:
+                setattr(obj, field.attname, field.pre_save(obj, False))
+
+        db = self.model.objects.db
+        try:
+            with transaction.atomic(using=db):
+                self.model.objects.bulk_update(objs, model_fields, batch_size=settings.LAYERSERVER_BULK_BATCH_SIZE)
+        except Exception:
+            # Saved one by one to know which item fails
+            update_fields = [field.name for field in model_fields]
+            for i, serializer in enumerate(update_serializers):
+                try:
+                    with transaction.atomic(using=db):
+                        serializer.instance.save(update_fields=update_fields)
+                except Exception:
+                    return {i: self.ERROR_ON_SAVE}
 
     def delete(self, items):
         filter = {}
         filter['%s__in' % self.lookup_field] = items
         qs = self.get_queryset().filter(**filter)
-        image_fields = self._image_fields
-        for item in qs:
-            for field in image_fields:
-                file = getattr(item, field, None)
-                if file is not None:
-                    self._to_do.append(lambda: file.delete(save=False))
-            item.delete()
+        image_fields = list(self._image_fields.keys())
+        if len(image_fields) > 0:
+            for values in qs.values_list(*image_fields):
+                for field, name in zip(image_fields, values):
+                    if name:
+                        storage = self.model._meta.get_field(field).storage
+                        self._to_do.append(partial(storage.delete, name))
+        # Layer tables have no relations to collect, rows are deleted with a single statement
+        qs._raw_delete(qs.db)
 
     def delete_user_assets(self):
         if len(self.user_assets) > 0:
@@ -487,6 +978,7 @@ class DBLayerContentBulkViewSet(DBLayerContentViewSetMixin, views.APIView):
         else:
             response_status = status.HTTP_200_OK
             transaction.commit(using=conn)
+            self.data_changed()
             self.execute_to_do()
             self.delete_user_assets()
             self.add_result(result)
@@ -498,3 +990,54 @@ class DBLayerContentBulkViewSet(DBLayerContentViewSetMixin, views.APIView):
     def execute_to_do(self):
         for x in self._to_do:
             x()
+
+
+class DBLayerContentIngestView(DBLayerContentViewSetMixin, views.APIView):
+    """
+    Loads newline delimited GeoJSON (application/x-ndjson) or CSV with WKT geometries (text/csv)
+    streamed in the request body with COPY. on_conflict=error|ignore|update handles existing rows.
+    """
+    csrf_exempt = True
+    permission_classes = (DBLayerIsValidUser,)
+    queryset = []
+    model = None
+
+    def initial(self, request, *args, **kwargs):
+        self.compiled_layer = get_compiled_layer(kwargs['name'])
+        if self.compiled_layer is None:
+            raise Http404
+        self.layer = self.compiled_layer.layer
+        self.model = self.compiled_layer.model
+        self._fields = self.compiled_layer.fields
+        return super().initial(request, *args, **kwargs)
+
+    def get_queryset(self, permission):
+        qs = self.model.objects.all()
+        qs = self.filter_queryset_by_group_data_filter(qs, permission)
+        return qs
+
+    def post(self, request, name):
+        on_conflict = request.query_params.get('on_conflict', ON_CONFLICT_ERROR)
+        if on_conflict not in ON_CONFLICT_CHOICES:
+            raise ValidationError({'on_conflict': _('Invalid value: %s') % on_conflict})
+        if on_conflict == ON_CONFLICT_UPDATE and \
+                not DBLayerPermissions.get_permissions(self.layer, request.user)['update']:
+            raise PermissionDenied()
+
+        reader = get_reader((request.content_type or '').split(';')[0].strip())
+        if reader is None:
+            return Response(
+                {'error': _('Unsupported content type')}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        if request.stream is None:
+            return Response({'error': _('Empty request body')}, status=status.HTTP_400_BAD_REQUEST)
+
+        ingestion = CopyIngestion(self.compiled_layer, request, self.get_queryset, on_conflict)
+        try:
+            result = ingestion.run(reader(request.stream, self.layer.geom_field))
+        except IngestError as e:
+            return Response(e.as_dict(), status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError as e:
+            return Response({'error': str(e).strip()}, status=status.HTTP_400_BAD_REQUEST)
+
+        self.data_changed()
+        return Response(result)
@@ -0,0 +1,77 @@
+import os
+
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.http import quote_etag
+from django.utils.translation import gettext as _
+
+from rest_framework import parsers, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from giscube.utils import serve_protected_file
+
+from ..export import create_export, get_artifact, get_export_user, is_format_available
+from ..models import EXPORT_FORMAT_CHOICES, EXPORT_STATUS_CHOICES, DataBaseLayerExport
+from ..permissions import DBLayerIsValidViewer
+from ..serializers import DBLayerExportSerializer
+from .dblayer_content import DBLayerContentViewSet
+
+
+class DBLayerExportViewSet(DBLayerContentViewSet):
+    """
+    Export jobs of the layer content. The rows are filtered by the content list query parameters
+    (q, filters, in_bbox, intersects...) and the user group data filters.
+    """
+    parser_classes = (parsers.JSONParser, parsers.FormParser, parsers.MultiPartParser)
+    permission_classes = (DBLayerIsValidViewer,)
+
+    def filter_queryset_by_group_data_filter(self, qs, permission=None):
+        return super().filter_queryset_by_group_data_filter(qs, permission or 'view')
+
+    def get_export(self):
+        """
+        Exports are only seen by the user that requested them, their rows depend on the user data filters
+        """
+        return get_object_or_404(
+            DataBaseLayerExport, layer=self.layer, user=get_export_user(self.request.user),
+            uuid=self.kwargs['export_uuid'])
+
+    def get_export_response(self, export):
+        serializer = DBLayerExportSerializer(export, context={'request': self.request})
+        code = status.HTTP_200_OK if export.status == EXPORT_STATUS_CHOICES.done else status.HTTP_202_ACCEPTED
+        return Response(serializer.data, status=code)
+
+    def create(self, request, *args, **kwargs):
+        format = request.data.get('format')
+        if format not in EXPORT_FORMAT_CHOICES or not is_format_available(format):
+            raise ValidationError({'format': _('Invalid value: %s') % format})
+        out_srid = self.get_out_srid() if request.query_params.get('out_srid') else None
+        export, _created = create_export(self.compiled_layer, self.get_queryset(), format, out_srid, request.user)
+        return self.get_export_response(export)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_export_response(self.get_export())
+
+    def file(self, request, *args, **kwargs):
+        export = self.get_export()
+        path = export.get_file_path()
+        if export.status != EXPORT_STATUS_CHOICES.done or not os.path.exists(path):
+            raise Http404
+        return serve_protected_file(request, path, as_attachment=True)
+
+    def artifact(self, request, *args, **kwargs):
+        """
+        Artifact of the layer (data.fgb, FlatGeobuf with its spatial index, or data.parquet, GeoParquet)
+        served with range requests support
+        """
+        format = kwargs['artifact_format']
+        if not is_format_available(format):
+            raise Http404
+        export = get_artifact(self.compiled_layer, self.get_queryset(), format, request.user)
+        if export.status != EXPORT_STATUS_CHOICES.done:
+            response = self.get_export_response(export)
+            response['Retry-After'] = '5'
+            return response
+        return serve_protected_file(
+            request, export.get_file_path(), 'application/octet-stream', etag=quote_etag(export.key))
@@ -5,3 +5,6 @@ from django.utils.translation import gettext_lazy as _
 class LayerServerConfig(AppConfig):
     name = 'layerserver'
     verbose_name = _('Layer Manager')
+
+    def ready(self):
+        from . import checks  # noqa
@@ -0,0 +1,214 @@
+import json
+
+from django.contrib.gis.db import models
+from django.db import connections
+
+from rest_framework import renderers
+
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+# GeoParquet metadata version, geometries are WKB
+GEOPARQUET_VERSION = '1.0.0'
+
+
+class ArrowRenderer(renderers.BaseRenderer):
+    """
+    Lets clients ask for content lists as an Arrow IPC stream (?format=arrow or the Accept header),
+    the stream is returned as StreamingHttpResponse.
+    """
+    media_type = ARROW_STREAM_MEDIA_TYPE
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return b''
+
+
+def is_arrow_available():
+    return pyarrow is not None
+
+
+def get_arrow_type(field):
+    """
+    Arrow type of the values of a layer model field, the field class comes from the table introspection
+    """
+    if isinstance(field, models.GeometryField) or isinstance(field, models.BinaryField):
+        return pyarrow.binary()
+    if isinstance(field, models.BooleanField):
+        return pyarrow.bool_()
+    if isinstance(field, models.BigIntegerField):
+        return pyarrow.int64()
+    if isinstance(field, models.SmallIntegerField):
+        return pyarrow.int16()
+    if isinstance(field, models.IntegerField):
+        return pyarrow.int32()
+    if isinstance(field, (models.FloatField, models.DecimalField)):
+        # Introspection guesses the precision of unconstrained numeric columns, it can't be a decimal type
+        return pyarrow.float64()
+    if isinstance(field, models.DateTimeField):
+        return pyarrow.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pyarrow.date32()
+    if isinstance(field, models.TimeField):
+        return pyarrow.time64('us')
+    return pyarrow.string()
+
+
+class ArrowColumn(object):
+    def __init__(self, name, field, geometry=False):
+        self.name = name
+        self.field = field
+        self.geometry = geometry
+        self.type = get_arrow_type(field)
+
+    def get_arrow_field(self):
+        metadata = {'ARROW:extension:name': 'geoarrow.wkb'} if self.geometry else None
+        return pyarrow.field(self.name, self.type, nullable=True, metadata=metadata)
+
+    def to_array(self, values):
+        if self.type == pyarrow.binary():
+            values = [bytes(value) if value is not None else None for value in values]
+        elif isinstance(self.field, models.DecimalField):
+            values = [float(value) if value is not None else None for value in values]
+        elif self.type == pyarrow.string():
+            if isinstance(self.field, models.JSONField):
+                values = [json.dumps(value) if value is not None else None for value in values]
+            else:
+                values = [str(value) if value is not None else None for value in values]
+        return pyarrow.array(values, type=self.type)
+
+
+def get_projjson(srid):
+    try:
+        from osgeo import osr
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(srid)
+        return json.loads(srs.ExportToPROJJSON())
+    except Exception:
+        return {'id': {'authority': 'EPSG', 'code': srid}}
+
+
+def get_schema(columns, srid=4326):
+    """
+    Arrow schema of columns with GeoParquet metadata, EPSG:4326 geometries use the default crs (OGC:CRS84)
+    """
+    metadata = None
+    geometry_columns = [column for column in columns if column.geometry]
+    if geometry_columns:
+        geo_columns = {}
+        for column in geometry_columns:
+            geo_columns[column.name] = {'encoding': 'WKB', 'geometry_types': []}
+            if srid != 4326:
+                geo_columns[column.name]['crs'] = get_projjson(srid)
+        geo = {
+            'version': GEOPARQUET_VERSION,
+            'primary_column': geometry_columns[0].name,
+            'columns': geo_columns,
+        }
+        metadata = {'geo': json.dumps(geo)}
+    return pyarrow.schema([column.get_arrow_field() for column in columns], metadata=metadata)
+
+
+def get_record_batch(schema, columns, rows):
+    """
+    Record batch of a chunk of rows (sequences of values in columns order), built column by column
+    """
+    values = list(zip(*rows)) if rows else [[] for _ in columns]
+    arrays = [column.to_array(column_values) for column, column_values in zip(columns, values)]
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_chunks(cursor, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+class BytesSink(object):
+    """
+    File like object where the Arrow stream writer writes, its content is taken after every batch
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_record_batches(schema, batches):
+    """
+    Yields the Arrow IPC stream of batches, a message at a time
+    """
+    sink = BytesSink()
+    writer = pyarrow.ipc.new_stream(sink, schema)
+    for batch in batches:
+        writer.write_batch(batch)
+        data = sink.pop()
+        if data:
+            yield data
+    writer.close()
+    yield sink.pop()
+
+
+def get_sql_columns(compiled, description):
+    """
+    Arrow columns of a cursor description, the layer model fields are found by their column
+    """
+    fields = {field.column: field for field in compiled.model._meta.fields}
+    columns = []
+    for item in description:
+        field = fields.get(item[0], models.TextField())
+        columns.append(ArrowColumn(item[0], field, geometry=field.name == compiled.layer.geom_field))
+    return columns
+
+
+def write_parquet(compiled, sql, path, chunk_size, callback=None, srid=4326):
+    """
+    Writes the rows of sql (geometries as srid WKB) to a GeoParquet file, a row group per chunk
+    """
+    connection = connections[compiled.model.objects.db]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT count(*) FROM (%s) export_rows' % sql)
+        total = cursor.fetchone()[0]
+    written = 0
+    # Server side cursor, rows are read in chunks
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql)
+        columns = get_sql_columns(compiled, cursor.description)
+        schema = get_schema(columns, srid)
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+        try:
+            for rows in iter_chunks(cursor, chunk_size):
+                writer.write_table(pyarrow.Table.from_batches([get_record_batch(schema, columns, rows)]))
+                written += len(rows)
+                if callback is not None and total:
+                    callback(written / total, None, None)
+        finally:
+            writer.close()
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+# Each process has its own cache with these backends
+PROCESS_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_layerserver_cache(app_configs, **kwargs):
+    """
+    Compiled layer versions, data generations and thumbnails status written by celery workers and
+    management commands must be seen by the web processes
+    """
+    backend = settings.CACHES.get(settings.LAYERSERVER_CACHE, {}).get('BACKEND')
+    if backend in PROCESS_CACHE_BACKENDS and not getattr(settings, 'CELERY_ALWAYS_EAGER', False):
+        return [Error(
+            'LAYERSERVER_CACHE (%s) uses %s, it is not shared by the web and celery processes' % (
+                settings.LAYERSERVER_CACHE, backend),
+            hint='Use a shared cache backend (redis, memcached) for the LAYERSERVER_CACHE alias',
+            id='layerserver.E001',
+        )]
+    return []
@@ -0,0 +1,234 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.gis.db import models
+from django.contrib.gis.db.models.functions import AsGeoJSON, Transform
+from django.contrib.gis.gdal import SpatialReference
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import F, TextField, Value
+from django.db.models.functions import Cast
+
+from .conditional import is_table
+from .filters import filterset_factory
+from .functions import JSONBuildObject, json_build_object
+from .model_legacy import ModelFactory, create_dblayer_model
+from .models import SEARCH_BACKEND_CHOICES, DataBaseLayer, DataBaseLayerField
+from .pagination import (create_geojson_cursor_pagination_class, create_geojson_pagination_class,
+                         create_json_cursor_pagination_class, create_json_pagination_class)
+from .relation_counts import get_count_view
+from .search import has_search_indexes
+from .serializers import create_dblayer_serializer
+
+
+_compiled_layers = {}
+
+
+def _version_key(layer_pk):
+    return 'layerserver:compiled_layer:%s' % layer_pk
+
+
+def _get_version(layer_pk):
+    cache = caches[settings.LAYERSERVER_CACHE]
+    key = _version_key(layer_pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+# Model fields that PostgreSQL JSON functions encode as the content serializers do
+SQL_SERIALIZABLE_FIELDS = (
+    models.BooleanField, models.CharField, models.FloatField, models.IntegerField, models.JSONField,
+    models.TextField, models.UUIDField
+)
+
+
+def is_sql_serializable_field(field):
+    if isinstance(field, models.DateTimeField):
+        return False
+    return isinstance(field, SQL_SERIALIZABLE_FIELDS + (models.DateField,))
+
+
+class CompiledLayer(object):
+    """
+    Everything DBLayerContentViewSet needs from a DataBaseLayer that only changes when the layer
+    configuration changes: the layer row, its dynamic model, fields, virtual fields and the dynamic
+    filterset, pagination and serializer classes and whether the full text search index exists.
+    """
+
+    def __init__(self, layer, version):
+        self.layer = layer
+        self.version = version
+        self.model = create_dblayer_model(layer)
+
+        self.fields = {}
+        self.filter_fields = []
+        self.image_fields = {}
+        for field in layer.fields.all():
+            if field.widget == DataBaseLayerField.WIDGET_CHOICES.image:
+                self.image_fields[field.name] = field
+            if not field.enabled:
+                continue
+            if field.search is True:
+                self.filter_fields.append(field.name)
+            self.fields[field.name] = {
+                'fullsearch': field.fullsearch
+            }
+        self.virtual_fields = {field.name: field for field in layer.virtual_fields.filter(enabled=True)}
+
+        self.filterset_class = filterset_factory(self.model, self.filter_fields, self.virtual_fields)
+        page_size = layer.get_page_size()
+        max_page_size = layer.get_max_page_size()
+        self.geojson_pagination_class = create_geojson_pagination_class(
+            page_size=page_size, max_page_size=max_page_size, count_mode=layer.count_mode)
+        self.json_pagination_class = create_json_pagination_class(
+            page_size=page_size, max_page_size=max_page_size, count_mode=layer.count_mode)
+        self.geojson_cursor_pagination_class = create_geojson_cursor_pagination_class(
+            page_size=page_size, max_page_size=max_page_size, pk_field=layer.pk_field)
+        self.json_cursor_pagination_class = create_json_cursor_pagination_class(
+            page_size=page_size, max_page_size=max_page_size, pk_field=layer.pk_field)
+        self._serializer_classes = {}
+        self._feature_properties = {}
+        self.geographic = bool(layer.srid) and SpatialReference(layer.srid).geographic
+        self._valid_srids = {}
+        self._has_row_versions = None
+        self._count_views = {}
+        self._fulltext_search = False
+
+    @property
+    def has_geom(self):
+        return bool(self.layer.geom_field) and self.layer.geom_field in self.fields
+
+    @property
+    def fulltext_search(self):
+        """
+        True if searches use the full text indexes. They are created by a celery task, until they are
+        valid they are checked again.
+        """
+        if not self._fulltext_search and self.layer.search_backend == SEARCH_BACKEND_CHOICES.fulltext:
+            self._fulltext_search = has_search_indexes(self)
+        return self._fulltext_search
+
+    def get_serializer_class(self, fields):
+        key = frozenset(fields)
+        serializer_class = self._serializer_classes.get(key)
+        if serializer_class is None:
+            serializer_class = create_dblayer_serializer(
+                self.model, list(fields), self.layer.pk_field, self.virtual_fields)
+            self._serializer_classes[key] = serializer_class
+        return serializer_class
+
+    def get_feature_expression(self, fields, geometry=None):
+        """
+        Database expression that returns, as text, the GeoJSON feature Geom4326Serializer returns
+        for fields. None if some field or virtual field can only be serialized in python.
+        geometry is the EPSG:4326 geometry expression, the layer geometry by default.
+        """
+        key = frozenset(fields)
+        if key not in self._feature_properties:
+            self._feature_properties[key] = self._build_feature_properties(fields)
+        properties = self._feature_properties[key]
+        if properties is None:
+            return None
+
+        if geometry is None:
+            geometry = F(self.layer.geom_field)
+            if self.layer.srid != 4326:
+                geometry = Transform(geometry, 4326)
+        feature = JSONBuildObject([
+            ('id', F(self.layer.pk_field)),
+            ('type', Value('Feature')),
+            ('geometry', Cast(AsGeoJSON(geometry, precision=15), models.JSONField())),
+            ('properties', properties),
+        ])
+        return Cast(feature, TextField())
+
+    def _build_feature_properties(self, fields):
+        geom_field = self.layer.geom_field
+        if not self.has_geom or geom_field not in fields:
+            return None
+
+        properties = []
+        for name in fields:
+            if name == geom_field:
+                continue
+            if not is_sql_serializable_field(self.model._meta.get_field(name)):
+                return None
+            properties.append((name, F(name)))
+        for field in self.virtual_fields.values():
+            try:
+                expression = field.widget_class.serialize_value_expression(field)
+            except NotImplementedError:
+                return None
+            if expression is not None:
+                properties.append((field.name, expression))
+        return json_build_object(properties)
+
+    def is_valid_srid(self, srid):
+        """
+        Returns True if srid is in the spatial_ref_sys table of the layer database
+        """
+        if srid not in self._valid_srids:
+            db = self.model.objects.db
+            SpatialRefSys = connections[db].ops.spatial_ref_sys()
+            self._valid_srids[srid] = SpatialRefSys.objects.using(db).filter(srid=srid).exists()
+        return self._valid_srids[srid]
+
+    def has_row_versions(self):
+        """
+        True if the layer rows have a version (xmin) that can be used to validate responses
+        """
+        if self._has_row_versions is None:
+            self._has_row_versions = is_table(self.model.objects_default.all())
+        return self._has_row_versions
+
+    def get_count_view(self, dblayer_fk):
+        """
+        Materialized view with the number of rows by dblayer_fk, None if it isn't available. Views are
+        created by a celery task, until they exist they are checked again.
+        """
+        view = self._count_views.get(dblayer_fk)
+        if view is None:
+            view = get_count_view(self, dblayer_fk)
+            if view is not None:
+                self._count_views[dblayer_fk] = view
+        return view
+
+    def is_current(self):
+        return self.version == _get_version(self.layer.pk)
+
+
+def get_compiled_layer(name):
+    """
+    Returns the CompiledLayer of the DataBaseLayer called name or None if it doesn't exist.
+    Compiled layers live for the whole process and are rebuilt when their version changes.
+    """
+    compiled = _compiled_layers.get(name)
+    if compiled is not None and compiled.is_current():
+        return compiled
+
+    layer = DataBaseLayer.objects.select_related('db_connection').filter(name=name).first()
+    if layer is None:
+        _compiled_layers.pop(name, None)
+        return None
+    # Version is read before compiling, concurrent changes will force a new compilation
+    version = _get_version(layer.pk)
+    # The registered model may have been built from an outdated configuration
+    ModelFactory(layer).try_unregister_model()
+    compiled = CompiledLayer(layer, version)
+    _compiled_layers[name] = compiled
+    return compiled
+
+
+def invalidate_compiled_layer(layer_pk):
+    cache = caches[settings.LAYERSERVER_CACHE]
+    cache.set(_version_key(layer_pk), uuid.uuid4().hex, timeout=None)
+    for name, compiled in list(_compiled_layers.items()):
+        if compiled.layer.pk == layer_pk:
+            _compiled_layers.pop(name, None)
+
+
+def clear_compiled_layers():
+    _compiled_layers.clear()
@@ -0,0 +1,59 @@
+import hashlib
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import BigIntegerField, Count, Max
+from django.db.models.expressions import RawSQL
+
+from .response_cache import get_data_generation
+
+
+ROW_VERSION_FIELD = '_giscube_row_version'
+
+
+def is_table(queryset):
+    """
+    True if the queryset model is a table, views rows have no xmin
+    """
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)',
+            [connection.ops.quote_name(queryset.model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] in ('r', 'p')
+
+
+def _get_sql(queryset):
+    try:
+        return queryset.query.get_compiler(using=queryset.db).as_sql()
+    except EmptyResultSet:
+        return '', ()
+
+
+def get_generation_etag(layer_pk, queryset, *parts):
+    """
+    Validator of the rows returned by queryset without reading them, it changes with the layer data
+    generation (bumped by every change made through the API), parts are other things the response depends on.
+    """
+    sql, params = _get_sql(queryset)
+    key = repr((parts, sql, params, get_data_generation(layer_pk)))
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+def get_queryset_etag(queryset, *parts):
+    """
+    Validator of the rows returned by queryset. Every insert, update or delete changes the
+    number of rows or the newest row version (xmin), parts are other things the response depends on.
+    """
+    connection = connections[queryset.db]
+    sql, params = _get_sql(queryset)
+    row_version = RawSQL(
+        '%s.xmin::text::bigint' % connection.ops.quote_name(queryset.model._meta.db_table), [],
+        output_field=BigIntegerField()
+    )
+    versions = queryset.order_by().annotate(**{ROW_VERSION_FIELD: row_version}).aggregate(
+        count=Count('*'), version=Max(ROW_VERSION_FIELD))
+    key = repr((parts, sql, params, versions['count'], versions['version']))
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
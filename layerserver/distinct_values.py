@@ -0,0 +1,103 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from .models import DataBaseLayerField
+from .response_cache import get_data_generation
+
+
+def has_distinct_values(compiled, field_name):
+    """
+    True if field_name is an enabled field of the compiled layer with the distinct values widget
+    """
+    if field_name not in compiled.fields:
+        return False
+    giscube_field = getattr(compiled.model._meta.get_field(field_name), '_giscube_field', None) or {}
+    return giscube_field.get('widget') == DataBaseLayerField.WIDGET_CHOICES.distinctvalues
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def get_distinct_values_sql(compiled, field_name, q=None, after=None):
+    """
+    Loose index scan: each value is read as the first value greater than the previous one, an index on
+    the column is walked once per distinct value instead of scanning the table. Values start with q and
+    are greater than after.
+    """
+    connection = connections[compiled.model.objects.db]
+    quote = connection.ops.quote_name
+    model_field = compiled.model._meta.get_field(field_name)
+    column = quote(model_field.column)
+    table = quote(compiled.model._meta.db_table)
+    conditions = ['%s IS NOT NULL' % column]
+    params = []
+    if q:
+        # PostgreSQL turns the prefix into an index range itself when the column has a text_pattern_ops
+        # or C collation index, comparisons in the column collation would miss values
+        conditions.append('CAST(%s AS text) LIKE %%s' % column)
+        params.append('%s%%' % _escape_like(q))
+    where = ' AND '.join(conditions)
+    first_where = where
+    first_params = list(params)
+    if after is not None:
+        first_where = '%s AND %s > %%s' % (where, column)
+        first_params.append(after)
+    sql = (
+        'WITH RECURSIVE t AS ('
+        '(SELECT %(column)s AS value FROM %(table)s WHERE %(first_where)s ORDER BY %(column)s LIMIT 1) '
+        'UNION ALL '
+        'SELECT (SELECT %(column)s FROM %(table)s WHERE %(where)s AND %(column)s > t.value '
+        'ORDER BY %(column)s LIMIT 1) FROM t WHERE t.value IS NOT NULL'
+        ') SELECT value FROM t WHERE value IS NOT NULL LIMIT %%s'
+    ) % {'column': column, 'table': table, 'first_where': first_where, 'where': where}
+    return sql, first_params + params
+
+
+def _get_distinct_values(compiled, field_name, q, after, limit):
+    connection = connections[compiled.model.objects.db]
+    sql, params = get_distinct_values_sql(compiled, field_name, q, after)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit + 1])
+        values = [row[0] for row in cursor.fetchall()]
+        has_next = len(values) > limit
+        values = values[:limit]
+        if not q and not has_next:
+            # None sorts last, it's counted in the limit of the last page
+            model_field = compiled.model._meta.get_field(field_name)
+            cursor.execute('SELECT EXISTS (SELECT 1 FROM %s WHERE %s IS NULL)' % (
+                connection.ops.quote_name(compiled.model._meta.db_table),
+                connection.ops.quote_name(model_field.column)))
+            if cursor.fetchone()[0]:
+                if len(values) < limit:
+                    values.append(None)
+                else:
+                    has_next = True
+    return {'values': values, 'has_next': has_next}
+
+
+def get_distinct_values_cache_key(compiled, field_name, q, after, limit):
+    """
+    Values are cached by the layer data generation, writes to the layer invalidate them
+    """
+    key = repr((get_data_generation(compiled.layer.pk), field_name, q, after, limit))
+    return 'layerserver:distinct_values:%s:%s' % (compiled.layer.pk, hashlib.md5(key.encode('utf-8')).hexdigest())
+
+
+def get_distinct_values(compiled, field_name, q=None, after=None, limit=None):
+    """
+    Returns {'values': [...], 'has_next': bool} with up to limit sorted distinct values of field_name. None
+    is the last value of the last page when the column has nulls.
+    """
+    if limit is None:
+        limit = settings.LAYERSERVER_DISTINCT_VALUES_LIMIT
+    cache = caches[settings.LAYERSERVER_CACHE]
+    key = get_distinct_values_cache_key(compiled, field_name, q, after, limit)
+    result = cache.get(key)
+    if result is None:
+        result = _get_distinct_values(compiled, field_name, q, after, limit)
+        cache.set(key, result, timeout=settings.LAYERSERVER_DISTINCT_VALUES_CACHE_TIMEOUT)
+    return result
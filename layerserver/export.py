@@ -0,0 +1,307 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .arrow import is_arrow_available, write_parquet
+from .compiled_layer import get_compiled_layer
+from .conditional import get_queryset_etag
+from .models import EXPORT_FORMAT_CHOICES, EXPORT_STATUS_CHOICES, DataBaseLayer, DataBaseLayerExport
+from .response_cache import get_data_generation
+
+
+logger = logging.getLogger(__name__)
+
+
+# OGR driver, file extension and layer creation options of each export format
+EXPORT_DRIVERS = {
+    EXPORT_FORMAT_CHOICES.gpkg: ('GPKG', 'gpkg', []),
+    EXPORT_FORMAT_CHOICES.shp: ('ESRI Shapefile', 'shp', ['ENCODING=UTF-8']),
+    EXPORT_FORMAT_CHOICES.csv: ('CSV', 'csv', ['GEOMETRY=AS_WKT']),
+    EXPORT_FORMAT_CHOICES.fgb: ('FlatGeobuf', 'fgb', ['SPATIAL_INDEX=YES']),
+    # Written with pyarrow
+    EXPORT_FORMAT_CHOICES.parquet: (None, 'parquet', []),
+}
+
+# Progress is saved when it grows at least this percentage
+PROGRESS_STEP = 5
+
+
+class ExportError(Exception):
+    pass
+
+
+def is_format_available(format):
+    """
+    True if the OGR driver of the format is available (FlatGeobuf needs GDAL >= 3.1), GeoParquet
+    is written with pyarrow
+    """
+    if format == EXPORT_FORMAT_CHOICES.parquet:
+        return is_arrow_available()
+    try:
+        from osgeo import gdal
+    except ImportError:
+        return False
+    return gdal.GetDriverByName(EXPORT_DRIVERS[format][0]) is not None
+
+
+def get_export_fields(compiled):
+    """
+    Enabled model fields of the layer, in table order
+    """
+    return [field for field in compiled.model._meta.fields if field.name in compiled.fields]
+
+
+def get_export_column(compiled, connection, field, format, out_srid=None):
+    column = connection.ops.quote_name(field.column)
+    if format != EXPORT_FORMAT_CHOICES.parquet or field.name != compiled.layer.geom_field:
+        return column
+    geometry = column
+    srid = out_srid or 4326
+    if compiled.layer.srid != srid:
+        geometry = 'ST_Transform(%s, %s)' % (geometry, int(srid))
+    return 'ST_AsBinary(%s) AS %s' % (geometry, column)
+
+
+def get_export_sql(compiled, queryset, format=None, out_srid=None):
+    """
+    SELECT of the exported columns of the rows of queryset, with its parameters inlined so OGR
+    can run it. Geometries are selected as is, the PostGIS driver reads them natively, GeoParquet
+    exports select them as out_srid (EPSG:4326 by default) WKB.
+    """
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    pk = compiled.model._meta.get_field(compiled.layer.pk_field)
+    try:
+        sql, params = queryset.order_by().values(pk.name).query.get_compiler(using=queryset.db).as_sql()
+        where = '%s IN (%s)' % (quote(pk.column), sql)
+    except EmptyResultSet:
+        where, params = 'false', ()
+    sql = 'SELECT %s FROM %s WHERE %s ORDER BY %s' % (
+        ', '.join(
+            get_export_column(compiled, connection, field, format, out_srid) for field in get_export_fields(compiled)),
+        quote(compiled.model._meta.db_table), where, quote(pk.column))
+    with connection.cursor() as cursor:
+        sql = cursor.mogrify(sql, params)
+    return sql.decode('utf-8') if isinstance(sql, bytes) else sql
+
+
+def get_export_key(compiled, queryset, sql, format, out_srid, generation, row_versions=True):
+    """
+    Exports with the same key have the same content: the same rows, columns and data. Without
+    row_versions the rows aren't read, only changes made through the API change the key.
+    """
+    layer = compiled.layer
+    parts = (layer.pk, format, out_srid, sql, generation)
+    if row_versions and compiled.has_row_versions():
+        # Detects changes not made through the API
+        parts += (get_queryset_etag(queryset),)
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def get_expire_date():
+    return timezone.now() - timedelta(seconds=settings.LAYERSERVER_EXPORT_EXPIRE)
+
+
+def get_export_user(user):
+    """
+    Owner of the exports requested by user, exports of anonymous users have none
+    """
+    return user if user is not None and user.is_authenticated else None
+
+
+def create_export(compiled, queryset, format, out_srid=None, user=None, artifact=False, generation=None):
+    """
+    Returns (export, created). A pending, running or finished export of the user with the same content
+    is reused, new exports are run by a celery task. Artifacts are shared by every user and requested
+    often (a range request per read), their key only depends on the layer data generation. Celery tasks
+    pass the generation of the process that changed the data.
+    """
+    from .tasks import async_dblayer_export
+
+    sql = get_export_sql(compiled, queryset, format, out_srid)
+    if generation is None:
+        generation = get_data_generation(compiled.layer.pk)
+    key = get_export_key(compiled, queryset, sql, format, out_srid, generation, row_versions=not artifact)
+    user = get_export_user(user)
+    exports = DataBaseLayerExport.objects.filter(layer=compiled.layer, key=key, created__gte=get_expire_date())
+    if not artifact:
+        exports = exports.filter(user=user)
+    export = exports.exclude(status=EXPORT_STATUS_CHOICES.error).first()
+    if export is not None:
+        if export.status != EXPORT_STATUS_CHOICES.done or os.path.exists(export.get_file_path()):
+            if artifact and not export.artifact:
+                export.artifact = True
+                export.save(update_fields=['artifact'])
+            return export, False
+
+    export = DataBaseLayerExport.objects.create(
+        layer=compiled.layer, user=user, format=format, out_srid=out_srid, key=key, sql=sql, artifact=artifact)
+    transaction.on_commit(lambda: async_dblayer_export.delay(export.pk))
+    return export, True
+
+
+def get_artifact(compiled, queryset, format, user=None):
+    """
+    Layer artifact of the rows of queryset. While it's written the previous artifact of the same rows
+    is returned, the new one otherwise (pending or running).
+    """
+    export, _created = create_export(compiled, queryset, format, user=user, artifact=True)
+    if export.status == EXPORT_STATUS_CHOICES.done:
+        return export
+    previous = DataBaseLayerExport.objects.filter(
+        layer=compiled.layer, format=format, out_srid=None, status=EXPORT_STATUS_CHOICES.done, sql=export.sql
+    ).exclude(pk=export.pk).first()
+    if previous is not None and os.path.exists(previous.get_file_path()):
+        return previous
+    return export
+
+
+def schedule_artifacts_refresh(layer_pk):
+    """
+    Called when the layer data changes, the artifacts of the layer that have been requested are written
+    again after LAYERSERVER_ARTIFACT_REFRESH_DELAY seconds
+    """
+    from .tasks import async_dblayer_refresh_artifacts
+
+    if DataBaseLayerExport.objects.filter(layer_id=layer_pk, artifact=True).exists():
+        async_dblayer_refresh_artifacts.apply_async(
+            (layer_pk, get_data_generation(layer_pk)), countdown=settings.LAYERSERVER_ARTIFACT_REFRESH_DELAY)
+
+
+def refresh_artifacts(layer_pk, generation=None):
+    """
+    Creates the export of the artifacts of the whole layer (its data filter applies), artifacts of users
+    with group data filters are written when they are requested. Their key is built with generation, the
+    data generation seen by the process that changed the data, so requests find them.
+    """
+    if generation is not None and generation != get_data_generation(layer_pk):
+        # The data changed again, its own refresh writes them
+        return
+    layer = DataBaseLayer.objects.filter(pk=layer_pk).first()
+    compiled = get_compiled_layer(layer.name) if layer is not None else None
+    if compiled is None:
+        return
+    queryset = compiled.model.objects.all()
+    formats = DataBaseLayerExport.objects.filter(
+        layer=layer, artifact=True, out_srid=None).order_by().values_list('format', flat=True).distinct()
+    for format in formats:
+        if DataBaseLayerExport.objects.filter(
+                layer=layer, artifact=True, format=format, sql=get_export_sql(compiled, queryset, format)).exists():
+            create_export(compiled, queryset, format, artifact=True, generation=generation)
+
+
+def get_ogr_connection_string(db_connection):
+    values = [
+        ('dbname', db_connection.name), ('host', db_connection.host), ('port', db_connection.port),
+        ('user', db_connection.user), ('password', db_connection.password)
+    ]
+    return 'PG:%s' % ' '.join(
+        "%s='%s'" % (name, str(value).replace('\\', '\\\\').replace("'", "\\'")) for name, value in values if value)
+
+
+def zip_directory(path, zip_path):
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            if file_path != zip_path:
+                zip_file.write(file_path, name)
+                os.remove(file_path)
+
+
+def write_ogr(export, path, driver, layer_options, callback=None):
+    from osgeo import gdal
+
+    gdal.UseExceptions()
+    layer = export.layer
+    options = {
+        'format': driver,
+        'SQLStatement': export.sql,
+        'layerName': layer.name,
+        'layerCreationOptions': layer_options,
+        'callback': callback,
+    }
+    if export.out_srid:
+        options['dstSRS'] = 'EPSG:%s' % export.out_srid
+    dataset = gdal.VectorTranslate(
+        path, get_ogr_connection_string(layer.db_connection), options=gdal.VectorTranslateOptions(**options))
+    if dataset is None:
+        raise ExportError(gdal.GetLastErrorMsg())
+    # Closing the dataset flushes it
+    dataset = None
+
+
+def write_export(export, callback=None):
+    """
+    Writes the rows of the export sql with OGR or pyarrow (GeoParquet), returns the file path relative
+    to LAYERSERVER_EXPORT_ROOT
+    """
+    layer = export.layer
+    driver, extension, layer_options = EXPORT_DRIVERS[export.format]
+    os.makedirs(settings.LAYERSERVER_EXPORT_ROOT, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=settings.LAYERSERVER_EXPORT_ROOT)
+    try:
+        filename = '%s.%s' % (layer.name, extension)
+        path = os.path.join(tmp, filename)
+        if export.format == EXPORT_FORMAT_CHOICES.parquet:
+            compiled = get_compiled_layer(layer.name)
+            write_parquet(
+                compiled, export.sql, path, settings.LAYERSERVER_STREAMING_CHUNK_SIZE, callback,
+                srid=export.out_srid or 4326)
+        else:
+            write_ogr(export, path, driver, layer_options, callback)
+        if export.format == EXPORT_FORMAT_CHOICES.shp:
+            filename = '%s.zip' % layer.name
+            zip_directory(tmp, os.path.join(tmp, filename))
+        os.rename(tmp, export.get_directory())
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return os.path.join(str(export.uuid), filename)
+
+
+def get_progress_callback(export):
+    saved = {'progress': 0}
+
+    def callback(complete, message, data):
+        progress = int(complete * 100)
+        if progress >= saved['progress'] + PROGRESS_STEP:
+            DataBaseLayerExport.objects.filter(pk=export.pk).update(progress=progress)
+            saved['progress'] = progress
+        return 1
+
+    return callback
+
+
+def run_export(pk):
+    # Several workers may receive the same job, only the one that changes its status runs it
+    started = DataBaseLayerExport.objects.filter(pk=pk, status=EXPORT_STATUS_CHOICES.pending).update(
+        status=EXPORT_STATUS_CHOICES.running)
+    if not started:
+        return
+    export = DataBaseLayerExport.objects.select_related('layer__db_connection').get(pk=pk)
+    try:
+        export.file = write_export(export, get_progress_callback(export))
+        export.status = EXPORT_STATUS_CHOICES.done
+        export.progress = 100
+    except Exception as e:
+        logger.error('Export %s of %s failed: %s', export.uuid, export.layer.name, e, exc_info=True)
+        export.status = EXPORT_STATUS_CHOICES.error
+        export.error = str(e)
+    export.finished = timezone.now()
+    export.save(update_fields=['file', 'status', 'progress', 'error', 'finished'])
+    delete_expired_exports()
+
+
+def delete_expired_exports():
+    for export in DataBaseLayerExport.objects.filter(created__lt=get_expire_date()):
+        export.delete()
@@ -0,0 +1,64 @@
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import GeomOutputGeoFunc
+from django.db.models import BooleanField, Field, FloatField, Func, IntegerField, JSONField, Value
+
+
+# PostgreSQL functions accept at most 100 arguments
+JSON_BUILD_OBJECT_MAX_PAIRS = 50
+
+
+class JSONBuildObject(Func):
+    function = 'json_build_object'
+    output_field = JSONField()
+
+    def __init__(self, pairs, **extra):
+        expressions = []
+        for key, value in pairs:
+            expressions.extend([Value(key), value])
+        super().__init__(*expressions, **extra)
+
+
+def json_build_object(pairs):
+    """
+    JSONBuildObject without the function arguments limit, big objects are built by parts and
+    concatenated as jsonb.
+    """
+    pairs = list(pairs)
+    if len(pairs) <= JSON_BUILD_OBJECT_MAX_PAIRS:
+        return JSONBuildObject(pairs)
+    parts = [
+        JSONBuildObject(pairs[i:i + JSON_BUILD_OBJECT_MAX_PAIRS], function='jsonb_build_object')
+        for i in range(0, len(pairs), JSON_BUILD_OBJECT_MAX_PAIRS)
+    ]
+    return Func(*parts, function='', arg_joiner=' || ', output_field=JSONField())
+
+
+class MakeEnvelope(Func):
+    function = 'ST_MakeEnvelope'
+    output_field = GeometryField()
+
+    def __init__(self, bounds, srid, **extra):
+        expressions = [Value(value, output_field=FloatField()) for value in bounds]
+        expressions.append(Value(srid, output_field=IntegerField()))
+        super().__init__(*expressions, **extra)
+
+
+class AsMVTGeom(Func):
+    """
+    Geometry in tile coordinate space, expression must be in the same srid as bounds (3857).
+    The output field isn't a GeometryField because it's selected as is for ST_AsMVT (no ::bytea).
+    """
+    function = 'ST_AsMVTGeom'
+    output_field = Field()
+
+    def __init__(self, expression, bounds, extent=4096, buffer=256, clip_geom=True, **extra):
+        super().__init__(
+            expression, MakeEnvelope(bounds, 3857), Value(extent, output_field=IntegerField()),
+            Value(buffer, output_field=IntegerField()), Value(clip_geom, output_field=BooleanField()), **extra)
+
+
+class SimplifyPreserveTopology(GeomOutputGeoFunc):
+    function = 'ST_SimplifyPreserveTopology'
+
+    def __init__(self, expression, tolerance, **extra):
+        super().__init__(expression, Value(tolerance, output_field=FloatField()), **extra)
@@ -0,0 +1,323 @@
+import codecs
+import csv
+import json
+import uuid
+
+from django.contrib.gis.db import models
+from django.db import connections, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.translation import gettext as _
+
+from .widgets import widgets_types
+
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/geo+json-seq', 'application/json-seq')
+CSV_CONTENT_TYPES = ('text/csv',)
+
+ON_CONFLICT_ERROR = 'error'
+ON_CONFLICT_IGNORE = 'ignore'
+ON_CONFLICT_UPDATE = 'update'
+ON_CONFLICT_CHOICES = (ON_CONFLICT_ERROR, ON_CONFLICT_IGNORE, ON_CONFLICT_UPDATE)
+
+# Staging geometries are GeoJSON or (E)WKT text, WKT without SRID is EPSG:4326 as in the content API
+GEOMETRY_EXPRESSION = """
+    CASE WHEN left({column}, 1) = '{{' THEN ST_SetSRID(ST_GeomFromGeoJSON({column}), 4326)
+    ELSE ST_GeomFromEWKT(CASE WHEN {column} LIKE 'SRID=%%' THEN {column} ELSE 'SRID=4326;' || {column} END) END
+"""
+
+
+class IngestError(Exception):
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.message = message
+        self.line = line
+
+    def as_dict(self):
+        error = {'error': self.message}
+        if self.line is not None:
+            error['line'] = self.line
+        return error
+
+
+def get_ingest_fields(compiled):
+    """
+    Model fields that can be written: enabled, not readonly and not files, in table order
+    """
+    fields = []
+    for field in compiled.model._meta.fields:
+        if field.name not in compiled.fields or isinstance(field, (models.AutoField, models.FileField)):
+            continue
+        if field._giscube_field['readonly']:
+            continue
+        fields.append(field)
+    return fields
+
+
+def get_widget_values(compiled, request, action):
+    """
+    Values set by the widgets of the layer fields (creation user, modification date...)
+    """
+    values = {}
+    for field in compiled.model._meta.fields:
+        if field.name not in compiled.fields:
+            continue
+        giscube_field = field._giscube_field
+        widget_class = widgets_types[giscube_field['widget']]
+        if action == 'create':
+            widget_class.create(request, values, giscube_field)
+        else:
+            widget_class.update(request, None, values, giscube_field)
+    return values
+
+
+def read_ndjson(stream, geom_field):
+    """
+    Yields (line, properties, geometry) of newline delimited GeoJSON features or JSON objects
+    """
+    for i, line in enumerate(stream, 1):
+        line = line.strip().lstrip(b'\x1e')
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            raise IngestError(_('Invalid JSON'), i)
+        if not isinstance(data, dict):
+            raise IngestError(_('Invalid feature'), i)
+        if isinstance(data.get('properties'), dict):
+            yield i, data['properties'], data.get('geometry')
+        else:
+            yield i, data, data.get(geom_field) if geom_field else None
+
+
+def read_csv(stream, geom_field):
+    """
+    Yields (line, properties, geometry) of CSV rows with a header, geometries are (E)WKT
+    """
+    reader = csv.reader(codecs.iterdecode(stream, 'utf-8'))
+    header = next(reader, None)
+    if header is None:
+        return
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != len(header):
+            raise IngestError(_('Invalid number of columns'), reader.line_num)
+        properties = {name: value if value != '' else None for name, value in zip(header, row)}
+        yield reader.line_num, properties, properties.get(geom_field) if geom_field else None
+
+
+def get_reader(content_type):
+    if content_type in NDJSON_CONTENT_TYPES:
+        return read_ndjson
+    if content_type in CSV_CONTENT_TYPES:
+        return read_csv
+
+
+def to_copy_value(value):
+    """
+    Value in COPY CSV format, NULL is an empty unquoted value
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    else:
+        value = str(value)
+    return '"%s"' % value.replace('"', '""')
+
+
+class CopyRowsFile(object):
+    """
+    File like object that COPY ... FROM STDIN reads, rows are converted as they are read
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+        self.error = None
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                row = next(self.rows, None)
+            except IngestError as e:
+                # Raised once COPY ends, exceptions raised by read() are not kept by every driver version
+                self.error = e
+                row = None
+            if row is None:
+                break
+            self.buffer += ','.join(to_copy_value(value) for value in row) + '\n'
+        if size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class CopyIngestion(object):
+    """
+    Loads a stream of features into the layer table: rows are copied (COPY FROM STDIN) into a
+    temporary staging table and merged with INSERT ... SELECT, optionally ON CONFLICT.
+    get_queryset(permission) returns the rows the user can add or update, merged rows must be in it.
+    """
+
+    def __init__(self, compiled, request, get_queryset, on_conflict=ON_CONFLICT_ERROR):
+        self.compiled = compiled
+        self.layer = compiled.layer
+        self.model = compiled.model
+        self.request = request
+        self.get_queryset = get_queryset
+        self.on_conflict = on_conflict
+        self.db = self.model.objects.db
+        self.connection = connections[self.db]
+        # Layer primary key, conflicts are detected on it
+        self.pk = self.model._meta.get_field(self.layer.pk_field)
+        self.fields = get_ingest_fields(compiled)
+        self.field_names = [field.name for field in self.fields]
+        self.seen_fields = set()
+        suffix = uuid.uuid4().hex[:12]
+        self.staging_table = 'giscube_ingest_%s' % suffix
+        self.result_table = 'giscube_ingest_result_%s' % suffix
+
+    def quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def get_rows(self, records):
+        geom_field = self.layer.geom_field
+        for line, properties, geometry in records:
+            row = []
+            for name in self.field_names:
+                if name == geom_field:
+                    value = geometry
+                    if isinstance(value, dict):
+                        value = json.dumps(value)
+                    if geom_field in properties or geometry is not None:
+                        self.seen_fields.add(name)
+                else:
+                    value = properties.get(name)
+                    if name in properties:
+                        self.seen_fields.add(name)
+                row.append(value)
+            yield row
+
+    def create_tables(self, cursor):
+        columns = []
+        for field in self.fields:
+            if field.name == self.layer.geom_field:
+                columns.append('NULL::text AS %s' % self.quote(field.column))
+            else:
+                columns.append(self.quote(field.column))
+        table = self.quote(self.model._meta.db_table)
+        pk_column = self.quote(self.pk.column)
+        cursor.execute('CREATE TEMPORARY TABLE %s ON COMMIT DROP AS SELECT %s FROM %s WITH NO DATA' % (
+            self.quote(self.staging_table), ', '.join(columns), table))
+        cursor.execute(
+            'CREATE TEMPORARY TABLE %s ON COMMIT DROP AS SELECT %s AS pk, true AS inserted FROM %s WITH NO DATA' % (
+                self.quote(self.result_table), pk_column, table))
+
+    def copy(self, cursor, records):
+        columns = ', '.join(self.quote(field.column) for field in self.fields)
+        sql = 'COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (self.quote(self.staging_table), columns)
+        rows_file = CopyRowsFile(self.get_rows(records))
+        cursor.copy_expert(sql, rows_file)
+        if rows_file.error is not None:
+            raise rows_file.error
+
+    def get_column_expression(self, field):
+        column = self.quote(field.column)
+        if field.name != self.layer.geom_field:
+            return column
+        expression = GEOMETRY_EXPRESSION.format(column=column).strip()
+        if self.layer.srid and self.layer.srid != 4326:
+            expression = 'ST_Transform(%s, %s)' % (expression, int(self.layer.srid))
+        return expression
+
+    def merge(self, cursor):
+        fields = [field for field in self.fields if field.name in self.seen_fields]
+        pk = self.pk
+        if self.on_conflict == ON_CONFLICT_UPDATE and pk not in fields:
+            raise IngestError(_('%s is required to update existing rows') % pk.name)
+
+        create_values = get_widget_values(self.compiled, self.request, 'create')
+        update_values = get_widget_values(self.compiled, self.request, 'update')
+        columns = [self.quote(field.column) for field in fields]
+        expressions = [self.get_column_expression(field) for field in fields]
+        params = []
+        for name, value in create_values.items():
+            if name in self.seen_fields:
+                continue
+            columns.append(self.quote(self.model._meta.get_field(name).column))
+            expressions.append('%s')
+            params.append(value)
+
+        sql = 'INSERT INTO %s (%s) SELECT %s FROM %s' % (
+            self.quote(self.model._meta.db_table), ', '.join(columns), ', '.join(expressions),
+            self.quote(self.staging_table))
+        if self.on_conflict == ON_CONFLICT_IGNORE:
+            sql += ' ON CONFLICT DO NOTHING'
+        elif self.on_conflict == ON_CONFLICT_UPDATE:
+            assignments = ['%s = EXCLUDED.%s' % (self.quote(field.column), self.quote(field.column))
+                           for field in fields if field != pk]
+            for name, value in update_values.items():
+                if name in self.seen_fields:
+                    continue
+                assignments.append('%s = %%s' % self.quote(self.model._meta.get_field(name).column))
+                params.append(value)
+            if assignments:
+                sql += ' ON CONFLICT (%s) DO UPDATE SET %s' % (self.quote(pk.column), ', '.join(assignments))
+            else:
+                sql += ' ON CONFLICT DO NOTHING'
+        sql = 'WITH merged AS (%s RETURNING %s, xmax = 0) INSERT INTO %s SELECT * FROM merged' % (
+            sql, self.quote(pk.column), self.quote(self.result_table))
+        cursor.execute(sql, params)
+
+    def count_visible(self, permission, sql):
+        """
+        Rows of the layer queryset for permission whose pk is returned by sql
+        """
+        filter = {'%s__in' % self.pk.name: RawSQL(sql, [])}
+        return self.get_queryset(permission).filter(**filter).count()
+
+    def check_permissions(self, cursor):
+        pk_column = self.quote(self.pk.column)
+        staging = self.quote(self.staging_table)
+        if self.on_conflict == ON_CONFLICT_UPDATE:
+            # Existing rows must be updatable before they are changed
+            sql = 'SELECT s.%s FROM %s s JOIN %s t ON t.%s = s.%s' % (
+                pk_column, staging, self.quote(self.model._meta.db_table), pk_column, pk_column)
+            cursor.execute('SELECT count(*) FROM (%s) existing' % sql)
+            if cursor.fetchone()[0] != self.count_visible('update', sql):
+                raise IngestError(_('Some rows can not be updated'))
+
+    def check_results(self, cursor):
+        result = self.quote(self.result_table)
+        counts = {}
+        for inserted, permission in ((True, 'add'), (False, 'update')):
+            sql = 'SELECT pk FROM %s WHERE inserted = %s' % (result, 'true' if inserted else 'false')
+            cursor.execute('SELECT count(*) FROM (%s) result_rows' % sql)
+            counts[permission] = cursor.fetchone()[0]
+            if counts[permission] and counts[permission] != self.count_visible(permission, sql):
+                raise IngestError(_('Some rows are out of the layer data filter'))
+        return counts
+
+    def run(self, records):
+        """
+        Returns the number of inserted and updated rows, nothing is written if something fails
+        """
+        with transaction.atomic(using=self.db):
+            with self.connection.cursor() as cursor:
+                self.create_tables(cursor)
+                self.copy(cursor, records)
+                cursor.execute('SELECT count(*) FROM %s' % self.quote(self.staging_table))
+                total = cursor.fetchone()[0]
+                self.check_permissions(cursor)
+                self.merge(cursor)
+                counts = self.check_results(cursor)
+        return {
+            'inserted': counts['add'],
+            'updated': counts['update'],
+            'skipped': total - counts['add'] - counts['update'],
+        }
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from layerserver.models import DataBaseLayerField
+from layerserver.sqlchoices import invalidate_sqlchoices
+
+
+class Command(BaseCommand):
+    help = 'Clears the cached results of the sqlchoices fields of DataBaseLayers, run it when their lookup ' \
+           'tables change'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='DataBaseLayer names, all of them by default')
+
+    def handle(self, *args, **options):
+        qs = DataBaseLayerField.objects.filter(widget=DataBaseLayerField.WIDGET_CHOICES.sqlchoices)
+        if options['names']:
+            qs = qs.filter(layer__name__in=options['names'])
+        for field in qs.select_related('layer'):
+            invalidate_sqlchoices(field.pk)
+            print('Clear sqlchoices cache of %s.%s' % (field.layer.name, field.name))
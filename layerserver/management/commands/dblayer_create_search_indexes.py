@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from layerserver.models import SEARCH_BACKEND_CHOICES, DataBaseLayer
+from layerserver.search import create_search_indexes
+
+
+class Command(BaseCommand):
+    help = 'Creates the search indexes of DataBaseLayers with a trigram or full text search backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='DataBaseLayer names, all of them by default')
+
+    def handle(self, *args, **options):
+        qs = DataBaseLayer.objects.exclude(search_backend=SEARCH_BACKEND_CHOICES.icontains)
+        if options['names']:
+            qs = qs.filter(name__in=options['names'])
+        for layer in qs:
+            print('Create search indexes of %s' % layer.name)
+            for name in create_search_indexes(layer):
+                print('  %s' % name)
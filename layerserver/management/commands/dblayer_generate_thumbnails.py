@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from layerserver.compiled_layer import get_compiled_layer
+from layerserver.storage import get_layer_field_storage
+from layerserver.tasks import async_dblayer_save_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Saves again every thumbnail of the image fields of a DataBaseLayer, chunks of files are ' \
+           'converted in parallel by the celery workers of LAYERSERVER_THUMBNAIL_QUEUE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='DataBaseLayer name')
+        parser.add_argument('--field', action='append', dest='fields', help='Image field, all of them by default')
+        parser.add_argument('--chunk-size', type=int, default=50, help='Files converted by each task')
+
+    def handle(self, *args, **options):
+        compiled = get_compiled_layer(options['name'])
+        if compiled is None:
+            raise CommandError('DataBaseLayer %s doesn\'t exist' % options['name'])
+        chunk_size = max(options['chunk_size'], 1)
+        for field_name in compiled.image_fields:
+            if options['fields'] and field_name not in options['fields']:
+                continue
+            storage = get_layer_field_storage(compiled.layer.name, field_name)
+            if storage is None or not storage.thumbnail_location:
+                continue
+            names = compiled.model.objects_default.exclude(**{'%s__isnull' % field_name: True}).exclude(
+                **{field_name: ''}).order_by().values_list(field_name, flat=True)
+            count = 0
+            chunk = []
+            for name in names.iterator():
+                chunk.append(name)
+                if len(chunk) == chunk_size:
+                    self.schedule(compiled, field_name, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                self.schedule(compiled, field_name, chunk)
+                count += len(chunk)
+            print('Save thumbnails of %s.%s: %s files' % (compiled.layer.name, field_name, count))
+
+    def schedule(self, compiled, field_name, names):
+        async_dblayer_save_thumbnails.apply_async(
+            (compiled.layer.name, field_name, names), queue=settings.LAYERSERVER_THUMBNAIL_QUEUE)
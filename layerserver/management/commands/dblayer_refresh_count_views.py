@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from layerserver.models import DataBaseLayer
+from layerserver.relation_counts import get_count_fields, refresh_count_views, update_count_views
+
+
+class Command(BaseCommand):
+    help = 'Creates and refreshes the materialized relation1n counts of DataBaseLayers, run it periodically ' \
+           'when their data is changed out of the API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='DataBaseLayer names, all of them by default')
+
+    def handle(self, *args, **options):
+        qs = DataBaseLayer.objects.all()
+        if options['names']:
+            qs = qs.filter(name__in=options['names'])
+        for layer in qs:
+            if not get_count_fields(layer):
+                continue
+            print('Refresh count views of %s' % layer.name)
+            update_count_views(layer)
+            for name in refresh_count_views(layer.pk):
+                print('  %s' % name)
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('layerserver', '0032_geojsonfilter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaselayer',
+            name='count_mode',
+            field=models.CharField(choices=[('exact', 'Exact'), ('estimate', 'Estimate'), ('none', 'None')], default='exact', help_text='How paginated responses count the features. Estimate uses the database planner statistics, none skips the count. It can be changed with the count parameter.', max_length=20, verbose_name='count mode'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('layerserver', '0033_databaselayer_count_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaselayer',
+            name='tile_cache',
+            field=models.BooleanField(default=False, help_text='Vector tiles are cached on disk until the layer or its data changes', verbose_name='cache vector tiles'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.16 on 2026-10-18 11:20
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('layerserver', '0034_databaselayer_tile_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaselayer',
+            name='search_backend',
+            field=models.CharField(choices=[('icontains', 'Contains (no index)'), ('trigram', 'Trigram indexes (pg_trgm)'), ('fulltext', 'Full text search index')], default='icontains', help_text='Indexes used by the q parameter, they are created with the "Create search indexes" action. Full text search matches words prefixes of text and integer full search fields.', max_length=20, verbose_name='search backend'),
+        ),
+        migrations.AddField(
+            model_name='databaselayer',
+            name='search_config',
+            field=models.CharField(default='simple', help_text='PostgreSQL text search configuration used by full text search (simple, english, spanish...)', max_length=63, validators=[django.core.validators.RegexValidator('^[a-z_][a-z0-9_]*$')], verbose_name='text search configuration'),
+        ),
+    ]
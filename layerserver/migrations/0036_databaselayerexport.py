@@ -0,0 +1,42 @@
+# Generated by Django 3.2.16 on 2026-10-18 15:05
+
+import uuid
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('layerserver', '0035_databaselayer_search_backend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataBaseLayerExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('format', models.CharField(choices=[('gpkg', 'GeoPackage'), ('shp', 'Shapefile (zip)'), ('csv', 'CSV'), ('fgb', 'FlatGeobuf')], max_length=10, verbose_name='format')),
+                ('out_srid', models.IntegerField(blank=True, null=True, verbose_name='output srid')),
+                ('key', models.CharField(db_index=True, editable=False, max_length=32, verbose_name='key')),
+                ('sql', models.TextField(editable=False, verbose_name='sql')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('error', 'Error')], default='pending', max_length=10, verbose_name='status')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='progress')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='error')),
+                ('file', models.CharField(blank=True, max_length=255, null=True, verbose_name='file')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='finished')),
+                ('layer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exports', to='layerserver.databaselayer')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Export',
+                'verbose_name_plural': 'Exports',
+                'ordering': ('-created',),
+            },
+        ),
+    ]
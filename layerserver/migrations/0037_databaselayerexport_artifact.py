@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('layerserver', '0036_databaselayerexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaselayerexport',
+            name='artifact',
+            field=models.BooleanField(default=False, help_text='Regenerated in the background when the layer data changes', verbose_name='artifact'),
+        ),
+    ]
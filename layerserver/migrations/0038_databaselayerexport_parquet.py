@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('layerserver', '0037_databaselayerexport_artifact'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='databaselayerexport',
+            name='format',
+            field=models.CharField(choices=[('gpkg', 'GeoPackage'), ('shp', 'Shapefile (zip)'), ('csv', 'CSV'), ('fgb', 'FlatGeobuf'), ('parquet', 'GeoParquet')], max_length=10, verbose_name='format'),
+        ),
+    ]
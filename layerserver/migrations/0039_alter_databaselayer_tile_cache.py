@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('layerserver', '0038_databaselayerexport_parquet'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='databaselayer',
+            name='tile_cache',
+            field=models.BooleanField(default=False, help_text='Vector tiles are cached on disk until the layer or its data changes through the API, edits made outside the API are served stale until the tiles expire (LAYERSERVER_TILE_CACHE_TIMEOUT)', verbose_name='cache vector tiles'),
+        ),
+    ]
@@ -2,6 +2,7 @@ import json
 import logging
 import os
 import shutil
+import uuid
 
 from model_utils import Choices
 
@@ -9,8 +10,9 @@ from django.conf import settings
 from django.contrib.auth.models import Group, User
 from django.contrib.gis.db import models
 from django.core.exceptions import ValidationError
+from django.core.validators import RegexValidator
 from django.db import transaction
-from django.db.models.signals import post_delete, post_save, pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.forms.models import model_to_dict
 from django.utils.functional import cached_property
@@ -27,7 +29,9 @@ from . import model_legacy
 from .fields import ImageWithThumbnailField
 from .mapserver import SUPORTED_SHAPE_TYPES
 from .models_mixins import BaseLayerMixin, ClusterMixin, PopupMixin, ShapeStyleMixin, StyleMixin, TooltipMixin
-from .tasks import async_generate_mapfile
+from .permission_cache import invalidate_layer_permissions, invalidate_user_permissions
+from .sqlchoices import invalidate_sqlchoices
+from .tasks import async_dblayer_update_count_views, async_generate_mapfile
 from .widgets import widgets_types
 
 
@@ -259,6 +263,37 @@ DATA_FILTER_STATUS_CHOICES = Choices(
 )
 
 
+COUNT_MODE_CHOICES = Choices(
+    ('exact', _('Exact'),),
+    ('estimate', _('Estimate'),),
+    ('none', _('None'),),
+)
+
+
+SEARCH_BACKEND_CHOICES = Choices(
+    ('icontains', _('Contains (no index)'),),
+    ('trigram', _('Trigram indexes (pg_trgm)'),),
+    ('fulltext', _('Full text search index'),),
+)
+
+
+EXPORT_FORMAT_CHOICES = Choices(
+    ('gpkg', _('GeoPackage'),),
+    ('shp', _('Shapefile (zip)'),),
+    ('csv', _('CSV'),),
+    ('fgb', _('FlatGeobuf'),),
+    ('parquet', _('GeoParquet'),),
+)
+
+
+EXPORT_STATUS_CHOICES = Choices(
+    ('pending', _('Pending'),),
+    ('running', _('Running'),),
+    ('done', _('Done'),),
+    ('error', _('Error'),),
+)
+
+
 class DataBaseLayer(BaseLayerMixin, ShapeStyleMixin, PopupMixin, TooltipMixin, ClusterMixin, models.Model):
     db_connection = models.ForeignKey(
         DBConnection, null=False, blank=False, on_delete=models.PROTECT,
@@ -280,6 +315,22 @@ class DataBaseLayer(BaseLayerMixin, ShapeStyleMixin, PopupMixin, TooltipMixin, C
     max_page_size = models.IntegerField(
         _('maximum page size'), blank=True, null=True, help_text=_('Default value is %s') %
         settings.LAYERSERVER_MAX_PAGE_SIZE)
+    count_mode = models.CharField(
+        _('count mode'), max_length=20, choices=COUNT_MODE_CHOICES, default=COUNT_MODE_CHOICES.exact,
+        help_text=_('How paginated responses count the features. Estimate uses the database planner statistics, '
+                    'none skips the count. It can be changed with the count parameter.'))
+    search_backend = models.CharField(
+        _('search backend'), max_length=20, choices=SEARCH_BACKEND_CHOICES, default=SEARCH_BACKEND_CHOICES.icontains,
+        help_text=_('Indexes used by the q parameter, they are created with the "Create search indexes" action. '
+                    'Full text search matches words prefixes of text and integer full search fields.'))
+    search_config = models.CharField(
+        _('text search configuration'), max_length=63, default='simple',
+        validators=[RegexValidator(r'^[a-z_][a-z0-9_]*$')],
+        help_text=_('PostgreSQL text search configuration used by full text search (simple, english, spanish...)'))
+    tile_cache = models.BooleanField(
+        _('cache vector tiles'), default=False,
+        help_text=_('Vector tiles are cached on disk until the layer or its data changes through the API, edits '
+                    'made outside the API are served stale until the tiles expire (LAYERSERVER_TILE_CACHE_TIMEOUT)'))
 
     list_fields = models.TextField(_('list fields'), blank=True, null=True)
     form_fields = models.TextField(_('form fields'), blank=True, null=True)
@@ -592,6 +643,59 @@ class DataBaseLayerVirtualField(models.Model):
         ordering = ['layer', 'name']
 
 
+def _invalidate_compiled_layer(layer_pk):
+    from .compiled_layer import invalidate_compiled_layer
+    from .mvt import clear_tile_cache
+
+    def invalidate():
+        invalidate_compiled_layer(layer_pk)
+        clear_tile_cache(layer_pk)
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=DataBaseLayer)
+@receiver(post_delete, sender=DataBaseLayer)
+def dblayer_invalidate_compiled_layer(sender, instance, **kwargs):
+    _invalidate_compiled_layer(instance.pk)
+
+
+@receiver(post_save, sender=DataBaseLayerField)
+@receiver(post_delete, sender=DataBaseLayerField)
+@receiver(post_save, sender=DataBaseLayerVirtualField)
+@receiver(post_delete, sender=DataBaseLayerVirtualField)
+def dblayer_field_invalidate_compiled_layer(sender, instance, **kwargs):
+    _invalidate_compiled_layer(instance.layer_id)
+
+
+@receiver(post_save, sender=DataBaseLayerField)
+@receiver(post_delete, sender=DataBaseLayerField)
+def dblayer_field_invalidate_sqlchoices(sender, instance, **kwargs):
+    if instance.widget == DataBaseLayerField.WIDGET_CHOICES.sqlchoices:
+        invalidate_sqlchoices(instance.pk)
+
+
+@receiver(post_save, sender=DataBaseLayerVirtualField)
+@receiver(post_delete, sender=DataBaseLayerVirtualField)
+def dblayer_virtualfield_update_count_views(sender, instance, **kwargs):
+    if instance.widget != DataBaseLayerVirtualField.WIDGET_CHOICES.relation1n:
+        return
+    try:
+        dblayer = instance.config.get('dblayer')
+    except Exception:
+        return
+    # Count views are created or dropped in the database of the related layer
+    related_layer = DataBaseLayer.objects.filter(name=dblayer).first() if dblayer else None
+    if related_layer is not None:
+        transaction.on_commit(lambda: async_dblayer_update_count_views.delay(related_layer.pk))
+
+
+@receiver(post_save, sender=DBConnection)
+def dbconnection_invalidate_compiled_layers(sender, instance, created, **kwargs):
+    if not created:
+        for layer_pk in instance.layers.values_list('pk', flat=True):
+            _invalidate_compiled_layer(layer_pk)
+
+
 class DataBaseLayerStyleRule(StyleMixin, models.Model):
     layer = models.ForeignKey(DataBaseLayer, related_name='rules', on_delete=models.CASCADE)
     field = models.CharField(_('field'), max_length=50, blank=False, null=False)
@@ -668,3 +772,79 @@ class DBLayerUser(models.Model):
     class Meta:
         verbose_name = _('User')
         verbose_name_plural = _('Users')
+
+
+def _invalidate_layer_permissions(layer_pk):
+    transaction.on_commit(lambda: invalidate_layer_permissions(layer_pk))
+
+
+@receiver(post_save, sender=DataBaseLayer)
+@receiver(post_delete, sender=DataBaseLayer)
+def dblayer_invalidate_permissions(sender, instance, **kwargs):
+    _invalidate_layer_permissions(instance.pk)
+
+
+@receiver(post_save, sender=DBLayerGroup)
+@receiver(post_delete, sender=DBLayerGroup)
+@receiver(post_save, sender=DBLayerUser)
+@receiver(post_delete, sender=DBLayerUser)
+def dblayer_permission_invalidate_permissions(sender, instance, **kwargs):
+    _invalidate_layer_permissions(instance.layer_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_invalidate_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        user_pks = [instance.pk]
+    elif action == 'pre_clear':
+        user_pks = list(instance.user_set.values_list('pk', flat=True))
+    else:
+        user_pks = list(pk_set)
+    transaction.on_commit(lambda: [invalidate_user_permissions(pk) for pk in user_pks])
+
+
+class DataBaseLayerExport(models.Model):
+    """
+    Export job of the layer content, key identifies the exported rows and their data so finished
+    exports are reused while the layer data doesn't change
+    """
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    layer = models.ForeignKey(DataBaseLayer, related_name='exports', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, verbose_name=_('User'), null=True, blank=True, on_delete=models.SET_NULL)
+    format = models.CharField(_('format'), max_length=10, choices=EXPORT_FORMAT_CHOICES)
+    out_srid = models.IntegerField(_('output srid'), blank=True, null=True)
+    key = models.CharField(_('key'), max_length=32, db_index=True, editable=False)
+    sql = models.TextField(_('sql'), editable=False)
+    artifact = models.BooleanField(
+        _('artifact'), default=False, help_text=_('Regenerated in the background when the layer data changes'))
+    status = models.CharField(
+        _('status'), max_length=10, choices=EXPORT_STATUS_CHOICES, default=EXPORT_STATUS_CHOICES.pending)
+    progress = models.PositiveSmallIntegerField(_('progress'), default=0)
+    error = models.TextField(_('error'), null=True, blank=True)
+    file = models.CharField(_('file'), max_length=255, null=True, blank=True)
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+    finished = models.DateTimeField(_('finished'), null=True, blank=True)
+
+    def get_directory(self):
+        return os.path.join(settings.LAYERSERVER_EXPORT_ROOT, str(self.uuid))
+
+    def get_file_path(self):
+        if self.file:
+            return os.path.join(settings.LAYERSERVER_EXPORT_ROOT, self.file)
+
+    def __str__(self):
+        return '%s (%s)' % (self.layer.name, self.format)
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = _('Export')
+        verbose_name_plural = _('Exports')
+
+
+@receiver(post_delete, sender=DataBaseLayerExport)
+def dblayer_export_delete(sender, instance, **kwargs):
+    path = instance.get_directory()
+    if os.path.exists(path):
+        shutil.rmtree(path)
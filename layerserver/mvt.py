@@ -0,0 +1,133 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.geos import Polygon
+from django.db import connections
+from django.db.models import F
+
+from rest_framework import renderers
+
+from .functions import AsMVTGeom
+
+
+# Half the side of the web mercator (EPSG:3857) square
+MERCATOR_MAX = 20037508.342789244
+MAX_ZOOM = 30
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+TILE_GEOM_FIELD = '_giscube_mvt_geom'
+
+
+class MVTRenderer(renderers.BaseRenderer):
+    """
+    Lets clients ask for tiles in the Accept header, tiles are returned as HttpResponse.
+    """
+    media_type = 'application/vnd.mapbox-vector-tile'
+    format = 'pbf'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return b''
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z, x, y):
+    """
+    Returns the EPSG:3857 bounds (minx, miny, maxx, maxy) of an XYZ tile
+    """
+    size = 2 * MERCATOR_MAX / 2 ** z
+    minx = -MERCATOR_MAX + x * size
+    maxy = MERCATOR_MAX - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def get_tile_queryset(queryset, layer, fields, z, x, y):
+    """
+    Filters queryset by the tile (buffer included) and selects fields and the geometry in tile
+    coordinates
+    """
+    bounds = tile_bounds(z, x, y)
+    margin = (bounds[2] - bounds[0]) * TILE_BUFFER / TILE_EXTENT
+    bbox = Polygon.from_bbox((bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin))
+    bbox.srid = 3857
+    qs = queryset.filter(**{'%s__bboverlaps' % layer.geom_field: bbox})
+
+    geom = F(layer.geom_field)
+    if layer.srid != 3857:
+        geom = Transform(geom, 3857)
+    qs = qs.annotate(**{TILE_GEOM_FIELD: AsMVTGeom(geom, bounds, TILE_EXTENT, TILE_BUFFER)})
+    return qs.order_by().values(*fields, TILE_GEOM_FIELD)
+
+
+def get_tile_sql(queryset, name, id_field=None):
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    args = [name, TILE_EXTENT, TILE_GEOM_FIELD]
+    if id_field:
+        args.append(id_field)
+    function = 'ST_AsMVT(q, %s)' % ', '.join(['%s'] * len(args))
+    return 'SELECT %s FROM (%s) AS q' % (function, sql), args + list(params)
+
+
+def render_tile(queryset, name, id_field=None):
+    """
+    Returns the Mapbox Vector Tile (one layer called name) of a queryset built by get_tile_queryset
+    """
+    sql, params = get_tile_sql(queryset, name, id_field)
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return b''
+    return bytes(row[0])
+
+
+def get_tile_cache_key(queryset):
+    """
+    Tiles are cached by their query, it includes the layer and user data filters and the fields
+    """
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    return hashlib.md5(('%s%s' % (sql, params)).encode('utf-8')).hexdigest()
+
+
+def _tile_cache_path(layer_pk, key, z, x, y):
+    return os.path.join(settings.LAYERSERVER_TILE_CACHE_ROOT, str(layer_pk), key, str(z), str(x), '%s.pbf' % y)
+
+
+def get_cached_tile(layer_pk, key, z, x, y):
+    """
+    Cached tile, None if there isn't any or it's older than LAYERSERVER_TILE_CACHE_TIMEOUT seconds: changes
+    made outside the API don't clear the cache
+    """
+    path = _tile_cache_path(layer_pk, key, z, x, y)
+    try:
+        timeout = settings.LAYERSERVER_TILE_CACHE_TIMEOUT
+        if timeout and time.time() - os.path.getmtime(path) > timeout:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def set_cached_tile(layer_pk, key, z, x, y, tile):
+    path = _tile_cache_path(layer_pk, key, z, x, y)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(tile)
+    os.replace(tmp_path, path)
+
+
+def clear_tile_cache(layer_pk):
+    shutil.rmtree(os.path.join(settings.LAYERSERVER_TILE_CACHE_ROOT, str(layer_pk)), ignore_errors=True)
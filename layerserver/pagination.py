@@ -1,33 +1,191 @@
+import json
+
 from collections import OrderedDict
 
-from rest_framework import pagination
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _
+
+from rest_framework import filters, pagination
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 
+from giscube.db.utils import get_table_parts
+
+from .models import COUNT_MODE_CHOICES
 
-class GeoJsonPagination(pagination.PageNumberPagination):
+
+def estimate_count(queryset):
     """
-    A geoJSON implementation of a pagination serializer.
+    Returns the planner row estimate of the queryset. Unfiltered querysets use pg_class.reltuples
+    (kept by ANALYZE / autovacuum) and filtered ones the "Plan Rows" of EXPLAIN.
     """
-    page_size_query_param = 'page_size'
-    page_size = 50
-    max_page_size = 1000
+    query = queryset.query.chain()
+    query.clear_ordering(force_empty=True)
+    with connections[queryset.db].cursor() as cursor:
+        if not query.where and not query.distinct:
+            table = get_table_parts(queryset.model._meta.db_table)['fixed']
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            # reltuples is -1 (or 0 in old versions) until the table is analyzed
+            if row is not None and row[0] > 0:
+                return row[0]
+        try:
+            sql, params = query.get_compiler(using=queryset.db).as_sql()
+        except EmptyResultSet:
+            return 0
+        cursor.execute('EXPLAIN (FORMAT JSON) %s' % sql, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
 
-    def get_paginated_response(self, data):
-        return Response(OrderedDict([
-            ('type', 'FeatureCollection'),
-            ('count', self.page.paginator.count),
+
+class LayerPage(Page):
+    """
+    Page of a LayerPaginator that doesn't use the total number of objects.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def start_index(self):
+        if len(self.object_list) == 0:
+            return 0
+        return (self.paginator.per_page * (self.number - 1)) + 1
+
+    def end_index(self):
+        if len(self.object_list) == 0:
+            return 0
+        return self.start_index() + len(self.object_list) - 1
+
+
+class LayerPaginator(DjangoPaginator):
+    """
+    Paginator with count modes:
+    - exact: COUNT(*) of the queryset (django Paginator)
+    - estimate: planner estimate, see estimate_count
+    - none: no count at all
+    With estimate and none pages fetch one extra row to know if there is a next page.
+    """
+
+    def __init__(self, object_list, per_page, count_mode=COUNT_MODE_CHOICES.exact, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_mode = count_mode
+
+    @cached_property
+    def count(self):
+        if self.count_mode == COUNT_MODE_CHOICES.none:
+            return None
+        if self.count_mode == COUNT_MODE_CHOICES.estimate:
+            return estimate_count(self.object_list)
+        return super().count
+
+    @cached_property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return super().num_pages
+
+    def validate_number(self, number):
+        if self.count_mode == COUNT_MODE_CHOICES.exact:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        if self.count_mode == COUNT_MODE_CHOICES.exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if len(object_list) == 0 and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        has_next = len(object_list) > self.per_page
+        return LayerPage(object_list[:self.per_page], number, self, has_next)
+
+
+class CountModePaginationMixin(object):
+    """
+    Page number pagination where the count can be exact, estimated or skipped. The layer default
+    count mode can be changed with the count parameter.
+    """
+    django_paginator_class = LayerPaginator
+    count_query_param = 'count'
+    count_mode = COUNT_MODE_CHOICES.exact
+
+    def get_count_mode(self, request):
+        count_mode = request.query_params.get(self.count_query_param) or self.count_mode
+        if count_mode not in COUNT_MODE_CHOICES:
+            raise ValidationError({self.count_query_param: _('Invalid count mode: %s') % count_mode})
+        return count_mode
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.count_mode = self.get_count_mode(request)
+        paginator = self.django_paginator_class(queryset, page_size, count_mode=self.count_mode)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings and self.count_mode == COUNT_MODE_CHOICES.exact:
+            page_number = paginator.num_pages
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        self.request = request
+        return list(self.page)
+
+    def get_page_info(self):
+        info = []
+        if self.count_mode != COUNT_MODE_CHOICES.none:
+            info.append(('count', self.page.paginator.count))
+        info.extend([
             ('from', self.page.start_index()),
             ('to', self.page.end_index()),
             ('page', self.page.number),
             ('next', self.get_next_link()),
             ('previous', self.get_previous_link()),
             ('page_size', self.get_page_size(self.request)),
-            ('total_pages', self.page.paginator.num_pages),
-            ('features', data['features']),
-        ]))
+        ])
+        if self.count_mode != COUNT_MODE_CHOICES.none:
+            info.append(('total_pages', self.page.paginator.num_pages))
+        return info
+
+
+class GeoJsonPagination(CountModePaginationMixin, pagination.PageNumberPagination):
+    """
+    A geoJSON implementation of a pagination serializer.
+    """
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 1000
 
+    def get_paginated_response(self, data):
+        return Response(OrderedDict(
+            [('type', 'FeatureCollection')] + self.get_page_info() + [('features', data['features'])]
+        ))
 
-def create_geojson_pagination_class(page_size=50, max_page_size=1000):
+
+def create_geojson_pagination_class(page_size=50, max_page_size=1000, count_mode=COUNT_MODE_CHOICES.exact):
     attrs = {
         '__module__': 'layerserver',
         'Meta': type(str('Meta'), (object,), {
@@ -35,30 +193,91 @@ def create_geojson_pagination_class(page_size=50, max_page_size=1000):
     }
     attrs['page_size'] = page_size
     attrs['max_page_size'] = max_page_size
+    attrs['count_mode'] = count_mode
 
     return type(str('CustomGeoJsonPagination'), (GeoJsonPagination,), attrs)
 
 
-class JSONPagination(pagination.PageNumberPagination):
+class JSONPagination(CountModePaginationMixin, pagination.PageNumberPagination):
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 1000
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict(self.get_page_info() + [('data', data['data'])]))
+
+
+def create_json_pagination_class(page_size=50, max_page_size=1000, count_mode=COUNT_MODE_CHOICES.exact):
+    attrs = {
+        '__module__': 'layerserver',
+        'Meta': type(str('Meta'), (object,), {
+        })
+    }
+    attrs['page_size'] = page_size
+    attrs['max_page_size'] = max_page_size
+    attrs['count_mode'] = count_mode
+
+    return type(str('CustomJsonPagination'), (JSONPagination,), attrs)
+
+
+class CursorPaginationMixin(object):
+    """
+    Keyset pagination, pages with a WHERE on the ordering column instead of OFFSET and doesn't count.
+    Ordering comes from the ordering parameter (use an indexed column) and defaults to pk_field.
+    """
+    cursor_query_param = 'cursor'
     page_size_query_param = 'page_size'
     page_size = 50
     max_page_size = 1000
+    pk_field = None
 
+    def get_ordering(self, request, queryset, view):
+        ordering = filters.OrderingFilter().get_ordering(request, queryset, view) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(ordering)
+        pk_field = self.pk_field or queryset.model._meta.pk.name
+        # pk_field is always added to the ordering to make it deterministic
+        if pk_field not in [o.lstrip('-') for o in ordering]:
+            ordering = ordering + (pk_field,)
+        return ordering
+
+
+class GeoJsonCursorPagination(CursorPaginationMixin, pagination.CursorPagination):
     def get_paginated_response(self, data):
         return Response(OrderedDict([
-            ('count', self.page.paginator.count),
-            ('from', self.page.start_index()),
-            ('to', self.page.end_index()),
-            ('page', self.page.number),
+            ('type', 'FeatureCollection'),
             ('next', self.get_next_link()),
             ('previous', self.get_previous_link()),
-            ('page_size', self.get_page_size(self.request)),
-            ('total_pages', self.page.paginator.num_pages),
+            ('page_size', self.page_size),
+            ('features', data['features']),
+        ]))
+
+
+def create_geojson_cursor_pagination_class(page_size=50, max_page_size=1000, pk_field=None):
+    attrs = {
+        '__module__': 'layerserver',
+        'Meta': type(str('Meta'), (object,), {
+        })
+    }
+    attrs['page_size'] = page_size
+    attrs['max_page_size'] = max_page_size
+    attrs['pk_field'] = pk_field
+
+    return type(str('CustomGeoJsonCursorPagination'), (GeoJsonCursorPagination,), attrs)
+
+
+class JSONCursorPagination(CursorPaginationMixin, pagination.CursorPagination):
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('page_size', self.page_size),
             ('data', data['data']),
         ]))
 
 
-def create_json_pagination_class(page_size=50, max_page_size=1000):
+def create_json_cursor_pagination_class(page_size=50, max_page_size=1000, pk_field=None):
     attrs = {
         '__module__': 'layerserver',
         'Meta': type(str('Meta'), (object,), {
@@ -66,5 +285,6 @@ def create_json_pagination_class(page_size=50, max_page_size=1000):
     }
     attrs['page_size'] = page_size
     attrs['max_page_size'] = max_page_size
+    attrs['pk_field'] = pk_field
 
-    return type(str('CustomJsonPagination'), (JSONPagination,), attrs)
+    return type(str('CustomJsonCursorPagination'), (JSONCursorPagination,), attrs)
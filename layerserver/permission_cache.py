@@ -0,0 +1,47 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _layer_generation_key(layer_pk):
+    return 'layerserver:permissions_generation:layer:%s' % layer_pk
+
+
+def _user_generation_key(user_pk):
+    return 'layerserver:permissions_generation:user:%s' % user_pk
+
+
+def _get_generations(keys):
+    cache = caches[settings.LAYERSERVER_CACHE]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def get_permissions_cache_key(layer_pk, user_pk):
+    """
+    Key of the permissions of a user on a layer, it changes when the layer permissions or the user
+    groups change
+    """
+    generations = _get_generations([_layer_generation_key(layer_pk), _user_generation_key(user_pk)])
+    return 'layerserver:permissions:%s:%s:%s' % (layer_pk, user_pk, ':'.join(generations))
+
+
+def get_cached_permissions(key):
+    return caches[settings.LAYERSERVER_CACHE].get(key)
+
+
+def set_cached_permissions(key, record):
+    caches[settings.LAYERSERVER_CACHE].set(key, record, timeout=settings.LAYERSERVER_PERMISSIONS_CACHE_TIMEOUT)
+
+
+def invalidate_layer_permissions(layer_pk):
+    caches[settings.LAYERSERVER_CACHE].set(_layer_generation_key(layer_pk), uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_user_permissions(user_pk):
+    caches[settings.LAYERSERVER_CACHE].set(_user_generation_key(user_pk), uuid.uuid4().hex, timeout=None)
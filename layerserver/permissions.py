@@ -1,53 +1,79 @@
+from django.contrib.gis.db import models
+from django.db.models import F, Value
+
 from rest_framework import permissions
 
-from .models import DataBaseLayer, DBLayerGroup
+from .models import DataBaseLayer, DBLayerGroup, DBLayerUser
+from .permission_cache import get_cached_permissions, get_permissions_cache_key, set_cached_permissions
+
+
+PERMISSIONS = ('view', 'add', 'update', 'delete')
+
+
+def compute_layer_permissions(layer, user):
+    """
+    Permissions of user on layer and the data filters of its groups by permission. User permissions
+    replace group permissions, anonymous permissions apply to everybody.
+    """
+    record = {
+        'permissions': {permission: getattr(layer, 'anonymous_%s' % permission) for permission in PERMISSIONS},
+        'data_filters': {permission: [] for permission in PERMISSIONS},
+    }
+    if user.is_anonymous:
+        return record
+
+    fields = ['can_%s' % permission for permission in PERMISSIONS]
+    # Both querysets select the can_* fields and then the annotations in the same order
+    user_rows = DBLayerUser.objects.filter(layer=layer, user=user).annotate(
+        kind=Value('user', output_field=models.CharField()),
+        filter=Value(None, output_field=models.JSONField()),
+    ).values_list(*fields, 'kind', 'filter')
+    group_rows = DBLayerGroup.objects.filter(layer=layer, group__user=user).annotate(
+        kind=Value('group', output_field=models.CharField()),
+        filter=F('data_filter'),
+    ).values_list(*fields, 'kind', 'filter')
+    rows = list(user_rows.union(group_rows, all=True))
+
+    has_user_permissions = any(row[len(PERMISSIONS)] == 'user' for row in rows)
+    for row in rows:
+        values = dict(zip(PERMISSIONS, row))
+        kind, data_filter = row[len(PERMISSIONS):]
+        if kind == 'group' and data_filter:
+            for permission in PERMISSIONS:
+                if values[permission]:
+                    record['data_filters'][permission].append(data_filter)
+        if (kind == 'user') == has_user_permissions:
+            for permission in PERMISSIONS:
+                if values[permission]:
+                    record['permissions'][permission] = True
+    return record
+
+
+def get_layer_permissions(layer, user):
+    """
+    compute_layer_permissions cached in LAYERSERVER_CACHE, anonymous permissions only need the layer
+    """
+    if user.is_anonymous:
+        return compute_layer_permissions(layer, user)
+    key = get_permissions_cache_key(layer.pk, user.pk)
+    record = get_cached_permissions(key)
+    if record is None:
+        record = compute_layer_permissions(layer, user)
+        set_cached_permissions(key, record)
+    return record
 
 
 class DBLayerPermissions():
     @staticmethod
     def get_permissions(layer, user):
-        permission = {
-            'view': False,
-            'add': False,
-            'update': False,
-            'delete': False
-        }
-
-        if user.is_anonymous:
-            permission['view'] = layer.anonymous_view
-            permission['add'] = layer.anonymous_add
-            permission['update'] = layer.anonymous_update
-            permission['delete'] = layer.anonymous_delete
-            return permission
-        else:
-            permission['view'] = layer.anonymous_view
-            permission['add'] = layer.anonymous_add
-            permission['update'] = layer.anonymous_update
-            permission['delete'] = layer.anonymous_delete
-
-        p = layer.user_permissions.filter(user=user).first()
-        if p:
-            if p.can_view:
-                permission['view'] = p.can_view
-            if p.can_add:
-                permission['add'] = p.can_add
-            if p.can_update:
-                permission['update'] = p.can_update
-            if p.can_delete:
-                permission['delete'] = p.can_delete
-        else:
-            ps = DBLayerGroup.objects.filter(layer=layer, group__in=user.groups.all())
-            for p in ps:
-                if p.can_view:
-                    permission['view'] = p.can_view
-                if p.can_add:
-                    permission['add'] = p.can_add
-                if p.can_update:
-                    permission['update'] = p.can_update
-                if p.can_delete:
-                    permission['delete'] = p.can_delete
+        return dict(get_layer_permissions(layer, user)['permissions'])
 
-        return permission
+    @staticmethod
+    def get_data_filters(layer, user, permission):
+        """
+        Data filters of the user groups that have permission on layer, rows must match all of them
+        """
+        return get_layer_permissions(layer, user)['data_filters'][permission]
 
 
 class DBLayerIsValidUser(permissions.BasePermission, DBLayerPermissions):
@@ -72,6 +98,14 @@ class DBLayerIsValidUser(permissions.BasePermission, DBLayerPermissions):
             return False
 
 
+class DBLayerIsValidViewer(permissions.BasePermission, DBLayerPermissions):
+    """
+    Views whose requests only read the layer data (exports), whatever the method
+    """
+    def has_permission(self, request, view):
+        return self.get_permissions(view.layer, request.user)['view']
+
+
 class BulkDBLayerIsValidUser(permissions.BasePermission, DBLayerPermissions):
     def has_permission(self, request, view):
         permission = self.get_permissions(view.layer, request.user)
@@ -0,0 +1,142 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.db import connections
+
+from giscube.db.utils import get_table_parts
+
+from .models import DataBaseLayer, DataBaseLayerVirtualField
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_materialized_count(field):
+    """
+    True if the count of a relation1n virtual field is read from a materialized view of the related layer
+    """
+    if field.widget != DataBaseLayerVirtualField.WIDGET_CHOICES.relation1n:
+        return False
+    try:
+        config = field.config
+    except Exception:
+        return False
+    return config.get('count') is True and config.get('materialized') is True
+
+
+def get_count_view_name(layer, dblayer_fk):
+    digest = hashlib.md5('|'.join((layer.table, dblayer_fk)).encode('utf-8')).hexdigest()
+    return 'giscube_%s_count_%s' % (layer.pk, digest[:10])
+
+
+def get_qualified_name(connection, schema, name):
+    quoted_name = connection.ops.quote_name(name)
+    return '%s.%s' % (connection.ops.quote_name(schema), quoted_name) if schema else quoted_name
+
+
+def get_count_views_status(connection, layer):
+    """
+    Returns {name: populated} of the count views of layer, they live in the schema of the layer table
+    """
+    sql = """
+        SELECT matviewname, ispopulated FROM pg_matviews
+        WHERE matviewname LIKE %s AND schemaname = coalesce(%s, current_schema())
+    """
+    schema = get_table_parts(layer.table)['table_schema']
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ['giscube\\_%s\\_count\\_%%' % layer.pk, schema])
+        return dict(cursor.fetchall())
+
+
+def get_count_view(compiled, dblayer_fk):
+    """
+    Qualified name of the view with the number of rows of the compiled layer by dblayer_fk (columns
+    parent and count), None if it doesn't exist or hasn't been populated
+    """
+    connection = connections[compiled.model.objects.db]
+    try:
+        views = get_count_views_status(connection, compiled.layer)
+    except Exception as e:
+        logger.warning('Unable to check count views of %s: %s', compiled.layer.name, e)
+        return None
+    name = get_count_view_name(compiled.layer, dblayer_fk)
+    if not views.get(name):
+        return None
+    return get_qualified_name(connection, get_table_parts(compiled.layer.table)['table_schema'], name)
+
+
+def get_count_fields(layer):
+    """
+    Enabled virtual fields of any layer whose count is materialized in a view of layer
+    """
+    qs = DataBaseLayerVirtualField.objects.filter(
+        widget=DataBaseLayerVirtualField.WIDGET_CHOICES.relation1n, enabled=True,
+        widget_options__contains=layer.name)
+    return [field for field in qs if is_materialized_count(field) and field.config.get('dblayer') == layer.name]
+
+
+def update_count_views(layer):
+    """
+    Creates the count views the virtual fields related to layer need and drops the ones that are no
+    longer used. Returns the names of the views.
+    """
+    from .compiled_layer import get_compiled_layer, invalidate_compiled_layer
+
+    compiled = get_compiled_layer(layer.name)
+    connection = connections[compiled.model.objects.db]
+    quote = connection.ops.quote_name
+    schema = get_table_parts(layer.table)['table_schema']
+    table = quote(compiled.model._meta.db_table)
+    columns = {}
+    for field in get_count_fields(layer):
+        dblayer_fk = field.config['dblayer_fk']
+        columns[get_count_view_name(layer, dblayer_fk)] = compiled.model._meta.get_field(dblayer_fk).column
+
+    existing = get_count_views_status(connection, layer)
+    with connection.cursor() as cursor:
+        for name in existing:
+            if name not in columns:
+                cursor.execute('DROP MATERIALIZED VIEW IF EXISTS %s' % get_qualified_name(connection, schema, name))
+        for name, column in columns.items():
+            qualified_name = get_qualified_name(connection, schema, name)
+            column = quote(column)
+            cursor.execute(
+                'CREATE MATERIALIZED VIEW IF NOT EXISTS %s AS SELECT %s AS parent, count(*) AS count FROM %s '
+                'WHERE %s IS NOT NULL GROUP BY %s' % (qualified_name, column, table, column, column))
+            # REFRESH MATERIALIZED VIEW CONCURRENTLY needs a unique index
+            cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS %s ON %s (parent)' % (
+                quote('%s_parent' % name), qualified_name))
+    invalidate_compiled_layer(layer.pk)
+    return list(columns.keys())
+
+
+def refresh_count_views(layer_pk):
+    """
+    Refreshes the count views of the layer, reads of the views are not blocked meanwhile
+    """
+    from .compiled_layer import get_compiled_layer
+
+    layer = DataBaseLayer.objects.filter(pk=layer_pk).first()
+    compiled = get_compiled_layer(layer.name) if layer is not None else None
+    if compiled is None:
+        return []
+    connection = connections[compiled.model.objects.db]
+    schema = get_table_parts(layer.table)['table_schema']
+    names = [name for name, populated in get_count_views_status(connection, layer).items() if populated]
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY %s' % get_qualified_name(connection, schema, name))
+    return names
+
+
+def schedule_count_views_refresh(layer):
+    """
+    Called when the layer data changes, its count views are refreshed after
+    LAYERSERVER_RELATION_COUNTS_REFRESH_DELAY seconds
+    """
+    from .tasks import async_dblayer_refresh_count_views
+
+    if get_count_fields(layer):
+        async_dblayer_refresh_count_views.apply_async(
+            (layer.pk,), countdown=settings.LAYERSERVER_RELATION_COUNTS_REFRESH_DELAY)
@@ -0,0 +1,73 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.http import HttpResponse
+
+
+def _generation_key(layer_pk):
+    return 'layerserver:data_generation:%s' % layer_pk
+
+
+def get_data_generation(layer_pk):
+    cache = caches[settings.LAYERSERVER_CACHE]
+    key = _generation_key(layer_pk)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_data_generation(layer_pk):
+    """
+    Called when the layer data changes, cached responses of the layer are no longer used
+    """
+    cache = caches[settings.LAYERSERVER_CACHE]
+    cache.set(_generation_key(layer_pk), uuid.uuid4().hex, timeout=None)
+
+
+def is_response_cache_enabled():
+    return bool(settings.LAYERSERVER_RESPONSE_CACHE)
+
+
+def get_response_cache_key(layer_pk, queryset, *parts):
+    """
+    Responses are cached by the layer data generation and their query, it includes the layer and
+    user data filters, and parts (request parameters, media type, host, access token...)
+    """
+    try:
+        sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    except EmptyResultSet:
+        sql, params = '', ()
+    key = repr((get_data_generation(layer_pk), sql, params, parts))
+    return 'layerserver:response:%s:%s' % (layer_pk, hashlib.md5(key.encode('utf-8')).hexdigest())
+
+
+def get_cached_response(key):
+    """
+    Returns (response, etag) or None
+    """
+    cached = caches[settings.LAYERSERVER_RESPONSE_CACHE].get(key)
+    if cached is None:
+        return None
+    response = HttpResponse(cached['content'], content_type=cached['content_type'])
+    return response, cached['etag']
+
+
+def set_cached_response(key, response, etag=None):
+    """
+    Stores a rendered response if it is small enough
+    """
+    if response.status_code != 200 or response.streaming:
+        return
+    if len(response.content) > settings.LAYERSERVER_RESPONSE_CACHE_MAX_SIZE:
+        return
+    cached = {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'etag': etag,
+    }
+    caches[settings.LAYERSERVER_RESPONSE_CACHE].set(key, cached, timeout=settings.LAYERSERVER_RESPONSE_CACHE_TIMEOUT)
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import re
+
+from django.contrib.gis.db import models
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from giscube.db.utils import get_table_parts
+
+from .models import SEARCH_BACKEND_CHOICES
+
+
+logger = logging.getLogger(__name__)
+
+
+# Model fields whose text representation is searched by the q parameter
+SEARCH_FIELDS = (models.CharField, models.IntegerField, models.TextField)
+
+
+def get_search_fields(compiled):
+    """
+    Full search fields of the compiled layer that can be indexed, sorted by name
+    """
+    names = []
+    for name, field in compiled.fields.items():
+        if field['fullsearch'] is not True or name == compiled.layer.geom_field:
+            continue
+        if isinstance(compiled.model._meta.get_field(name), SEARCH_FIELDS):
+            names.append(name)
+    return sorted(names)
+
+
+def get_index_name(layer, kind, *parts):
+    digest = hashlib.md5('|'.join((layer.table, kind) + parts).encode('utf-8')).hexdigest()
+    return 'giscube_%s_%s_%s' % (layer.pk, kind, digest[:10])
+
+
+def get_column_expression(connection, name):
+    # Same expression Django uses for icontains lookups, the trigram indexes are built on it
+    return 'UPPER(%s::text)' % connection.ops.quote_name(name)
+
+
+def get_tsvector_expression(connection, config, names):
+    document = " || ' ' || ".join(
+        "coalesce(%s::text, '')" % connection.ops.quote_name(name) for name in names)
+    return "to_tsvector('%s'::regconfig, %s)" % (config, document)
+
+
+def get_search_indexes(compiled, connection):
+    """
+    Returns a list of (index name, index expression) the layer search backend needs
+    """
+    layer = compiled.layer
+    names = get_search_fields(compiled)
+    if not names:
+        return []
+    if layer.search_backend == SEARCH_BACKEND_CHOICES.trigram:
+        return [
+            (get_index_name(layer, 'trgm', name), '(%s) gin_trgm_ops' % get_column_expression(connection, name))
+            for name in names
+        ]
+    if layer.search_backend == SEARCH_BACKEND_CHOICES.fulltext:
+        expression = get_tsvector_expression(connection, layer.search_config, names)
+        return [(get_index_name(layer, 'fts', layer.search_config, *names), '(%s)' % expression)]
+    return []
+
+
+def get_index_status(connection, schema, name):
+    """
+    True if the index is valid, False if it is invalid (an interrupted concurrent build) and
+    None if it doesn't exist
+    """
+    sql = """
+        SELECT i.indisvalid FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = %s AND n.nspname = coalesce(%s, current_schema())
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [name, schema])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def has_search_indexes(compiled):
+    """
+    True if every index the layer search backend needs exists and is valid
+    """
+    connection = connections[compiled.model.objects.db]
+    schema = get_table_parts(compiled.layer.table)['table_schema']
+    indexes = get_search_indexes(compiled, connection)
+    try:
+        return bool(indexes) and all(get_index_status(connection, schema, name) for name, _ in indexes)
+    except Exception as e:
+        logger.warning('Unable to check search indexes of %s: %s', compiled.layer.name, e)
+        return False
+
+
+def create_search_indexes(layer):
+    """
+    Creates CONCURRENTLY the indexes of the layer search backend, invalid indexes left by
+    interrupted builds are dropped and created again
+    """
+    from .compiled_layer import get_compiled_layer, invalidate_compiled_layer
+
+    compiled = get_compiled_layer(layer.name)
+    connection = connections[compiled.model.objects.db]
+    table_parts = get_table_parts(layer.table)
+    indexes = get_search_indexes(compiled, connection)
+    with connection.cursor() as cursor:
+        if indexes and layer.search_backend == SEARCH_BACKEND_CHOICES.trigram:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, expression in indexes:
+            status = get_index_status(connection, table_parts['table_schema'], name)
+            if status:
+                continue
+            quoted_name = connection.ops.quote_name(name)
+            if status is False:
+                schema = table_parts['table_schema']
+                qualified_name = '%s.%s' % (connection.ops.quote_name(schema), quoted_name) if schema else quoted_name
+                cursor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % qualified_name)
+            cursor.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s USING gin %s' % (
+                quoted_name, table_parts['fixed'], expression))
+    invalidate_compiled_layer(layer.pk)
+    return [name for name, _ in indexes]
+
+
+def get_tsquery(q):
+    """
+    Prefix query that matches every word of q, None if q has no words
+    """
+    words = re.findall(r'\w+', q)
+    if not words:
+        return None
+    return ' & '.join("'%s':*" % word for word in words)
+
+
+def fulltext_search(compiled, qs, q):
+    connection = connections[qs.db]
+    names = get_search_fields(compiled)
+    tsquery = get_tsquery(q)
+    if tsquery is None:
+        return qs.none()
+    config = compiled.layer.search_config
+    sql = "%s @@ to_tsquery('%s'::regconfig, %%s)" % (get_tsvector_expression(connection, config, names), config)
+    return qs.filter(RawSQL(sql, [tsquery], output_field=models.BooleanField()))
@@ -1,6 +1,7 @@
 from .databaselayer import (DBLayerDetailSerializer, DBLayerReferenceSerializer, DBLayerSerializer,
                             style_representation, style_rules_representation)
 from .databaselayer_content import create_dblayer_serializer
+from .databaselayer_export import DBLayerExportSerializer
 from .dblayer_field import DBLayerFieldListSerializer, DBLayerFieldSerializer
 from .dblayer_virtualfield import DBLayerVirtualFieldListSerializer, DBLayerVirtualFieldSerializer
 from .geojsonfilter import GeoJSONFilterSerializer
@@ -14,5 +15,5 @@ __all__ = [
     'GeoJSONLayerSerializer', 'GeoJSONLayerLogSerializer', 'GeoJSONFilterSerializer',
     'DBLayerSerializer', 'DBLayerReferenceSerializer', 'DBLayerDetailSerializer', 'style_representation',
     'style_rules_representation',
-    'create_dblayer_serializer',
+    'create_dblayer_serializer', 'DBLayerExportSerializer',
 ]
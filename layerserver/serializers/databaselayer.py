@@ -124,7 +124,8 @@ class DBLayerDetailSerializer(serializers.ModelSerializer):
         data = super().to_representation(obj)
         data['pagination'] = {
             'page_size': obj.get_page_size(),
-            'max_page_size': obj.get_max_page_size()
+            'max_page_size': obj.get_max_page_size(),
+            'count_mode': obj.count_mode
         }
         data['design'] = {
             'list_fields': obj.list_fields,
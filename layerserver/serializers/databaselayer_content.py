@@ -1,9 +1,11 @@
 from collections import OrderedDict
+from urllib.parse import quote
 
 from django.contrib.gis.db import models
 from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
 from django.urls import reverse
+from django.utils.http import RFC3986_SUBDELIMS
 
 from rest_framework import serializers
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
@@ -14,10 +16,15 @@ from ..widgets import widgets_types
 
 class Geom4326Serializer(GeoFeatureModelSerializer):
     def to_representation(self, instance):
+        # Geometry computed by the database, already in the output srid
+        # (see DBLayerContentViewSet.get_geom_expression)
+        database_geom = '_giscube_geom' in instance.__dict__
+        if database_geom:
+            setattr(instance, self.Meta.geo_field, instance.__dict__['_giscube_geom'])
         data = super(Geom4326Serializer, self).to_representation(instance)
         field = self.fields[self.Meta.geo_field]
         geo_value = field.get_attribute(instance)
-        if geo_value and geo_value.srid != 4326:
+        if not database_geom and geo_value and geo_value.srid != 4326:
             geo_value = geo_value.clone()
             geo_value.transform(4326)
             data["geometry"] = field.to_representation(geo_value)
@@ -90,14 +97,14 @@ class UndoSerializerMixin(object):
 
 
 class AccessTokenMixin(object):
-    def append_token(self, url):
+    def get_token_suffix(self):
         token = None
         auth = getattr(self.context['request'], 'auth', None)
         if hasattr(auth, 'token'):
             token = self.context['request'].auth.token
         if token:
-            url = '%s?access_token=%s' % (url, token)
-        return url
+            return '?access_token=%s' % token
+        return ''
 
 
 class FixPropertiesSerializerMixin(object):
@@ -112,57 +119,136 @@ class ImageWithThumbnailFieldSerializer(serializers.FileField):
     pass
 
 
-class ImageWithThumbnailSerializerMixin(object):
-    def fix_image_value(self, obj, attribute):
-        image_options = getattr(obj, attribute).field.widget_options
-        value = getattr(obj, attribute)
+URL_PLACEHOLDER = '__giscube_%s__'
+# Characters reverse() doesn't quote in the arguments of an url
+URL_SAFE_CHARS = RFC3986_SUBDELIMS + '/~:@'
+
+
+def get_url_template(request, viewname, kwargs, variables):
+    """
+    Absolute url of viewname as a %-format string with a %(variable)s for each name in variables,
+    reverse() and build_absolute_uri() are called once instead of once per row
+    """
+    kwargs = dict(kwargs, **{variable: URL_PLACEHOLDER % variable for variable in variables})
+    url = request.build_absolute_uri(reverse(viewname, kwargs=kwargs)).replace('%', '%%')
+    for variable in variables:
+        url = url.replace(URL_PLACEHOLDER % variable, '%%(%s)s' % variable)
+    return url
+
+
+def quote_url_value(value):
+    return quote(str(value), safe=URL_SAFE_CHARS)
+
+
+class ImageFieldRepresentation(object):
+    """
+    What the representation of an image field needs that doesn't depend on the row nor the request,
+    built once per compiled layer
+    """
+
+    def __init__(self, model, attribute):
+        self.attribute = attribute
+        self.storage = model._meta.get_field(attribute).storage
+        self.thumbnail_storage = self.storage.get_thumbnail_storage()
+        self.sizes = [size for size in self.storage.get_thumbnail_sizes() if size is not None]
+        image_options = model._meta.get_field(attribute).widget_options
+        self.base_url = 'base_url' in image_options and image_options['base_url'] is not None
+
+    def get_thumbnail_names(self, name):
+        return [(size, self.storage.get_thumbnail_name(name, size)) for size in self.sizes]
+
+
+class ImageFieldEmitter(object):
+    """
+    Representation of the values of an image field in a request, the urls are filled in with plain
+    string formatting
+    """
+
+    def __init__(self, representation, request, layer_name, token_suffix):
+        self.representation = representation
+        self.token_suffix = token_suffix
+        if not representation.base_url:
+            kwargs = {'name': layer_name, 'attribute': representation.attribute}
+            self.file_url = get_url_template(request, 'content-detail-file-value', kwargs, ('pk', 'path'))
+            self.thumbnail_url = get_url_template(
+                request, 'content-detail-thumbnail-value', kwargs, ('pk', 'path'))
+
+    def emit(self, value, pk):
         if value is None or value.name is None or value.name.strip() == '':
             return None
-
-        if 'base_url' in image_options and image_options['base_url'] is not None:
-            if value:
-                res = {
-                    'src': value.storage.url(value.name)
-                }
-                thumbnail = value.storage.get_thumbnail(value.name)
-                if thumbnail:
-                    res['thumbnail'] = thumbnail['url']
-                return res
+        representation = self.representation
+        name = value.name
+        thumbnail_name = representation.storage.get_thumbnail_name(name)
+        if representation.base_url:
+            res = {
+                'src': representation.storage.url(name),
+                'thumbnail': representation.thumbnail_storage.url(thumbnail_name)
+            }
+            thumbnails = {
+                size: representation.thumbnail_storage.url(size_name)
+                for size, size_name in representation.get_thumbnail_names(name)
+            }
         else:
-            pk = getattr(obj, obj._giscube_dblayer_schema['pk_field'])
-            kwargs = {'name': obj._giscube_dblayer_schema['name'], 'pk': pk, 'attribute': attribute,
-                      'path': value.name}
-            url = reverse('content-detail-file-value', kwargs=kwargs)
-            url = self.append_token(self.context['request'].build_absolute_uri(url))
+            pk = quote_url_value(pk)
             res = {
-                'src': url
+                'src': self.file_url % {'pk': pk, 'path': quote_url_value(name)} + self.token_suffix,
+                'thumbnail': self.thumbnail_url % {
+                    'pk': pk, 'path': quote_url_value(thumbnail_name)} + self.token_suffix
             }
-            thumbnail = value.storage.get_thumbnail(value.name)
-            if thumbnail:
-                kwargs = {'name': obj._giscube_dblayer_schema['name'], 'pk': pk, 'attribute': attribute,
-                          'path': thumbnail['name']}
-                url = reverse('content-detail-thumbnail-value', kwargs=kwargs)
-                url = self.context['request'].build_absolute_uri(url)
-                res['thumbnail'] = self.append_token(url)
-            return res
-
-    def to_representation(self, obj):
-        data = super().to_representation(obj)
-        for attribute, field in list(self.fields.items()):
-            if isinstance(field, ImageWithThumbnailFieldSerializer):
-                value = self.fix_image_value(obj, attribute)
-                self.append_value(data, attribute, value)
+            thumbnails = {
+                size: self.thumbnail_url % {'pk': pk, 'path': quote_url_value(size_name)} + self.token_suffix
+                for size, size_name in representation.get_thumbnail_names(name)
+            }
+        if thumbnails:
+            res['thumbnails'] = thumbnails
+        return res
+
+
+class RowEmitter(object):
+    """
+    Adds the image fields and the virtual fields to the representation of each row in a single pass.
+    It's compiled once per serializer, a list of rows shares the child serializer.
+    """
+
+    def __init__(self, serializer):
+        meta = serializer.Meta
+        schema = meta.model._giscube_dblayer_schema
+        self.pk_field = schema['pk_field']
+        request = serializer.context['request']
+        token_suffix = serializer.get_token_suffix() if meta.image_fields else ''
+        self.images = [
+            (attribute, ImageFieldEmitter(meta.image_fields[attribute], request, schema['name'], token_suffix))
+            for attribute, field in serializer.fields.items()
+            if isinstance(field, ImageWithThumbnailFieldSerializer) and attribute in meta.image_fields
+        ]
+        self.virtual_fields = [
+            (field.name, field.widget_class.serialize_value, field) for field in meta.virtual_fields.values()
+        ]
+        self.append_value = serializer.append_value
+
+    def emit(self, obj, data):
+        if self.images:
+            pk = getattr(obj, self.pk_field)
+            for attribute, emitter in self.images:
+                self.append_value(data, attribute, emitter.emit(getattr(obj, attribute), pk))
+        for name, serialize_value, field in self.virtual_fields:
+            value = serialize_value(obj, field)
+            if value:
+                self.append_value(data, name, value)
         return data
 
 
-class VirtualFieldsSerializer(object):
+class RowEmitterSerializerMixin(object):
+    def get_row_emitter(self):
+        row_emitter = getattr(self, '_row_emitter', None)
+        if row_emitter is None:
+            row_emitter = RowEmitter(self)
+            self._row_emitter = row_emitter
+        return row_emitter
+
     def to_representation(self, obj):
         data = super().to_representation(obj)
-        for field in self.Meta.virtual_fields.values():
-            value = field.widget_class.serialize_value(obj, field)
-            if value:
-                self.append_value(data, field.name, value)
-        return data
+        return self.get_row_emitter().emit(obj, data)
 
 
 SERIALIZER_ID_FIELD_MAPPING = {
@@ -218,10 +304,33 @@ class WidgetSerializerMixin(object):
         return super().update(instance, validated_data)
 
 
+class BulkSaveSerializerMixin(object):
+    def create(self, validated_data):
+        """
+        With bulk_save in the context the instance is built but not saved, the caller saves all the
+        instances at once
+        """
+        if not self.context.get('bulk_save'):
+            return super().create(validated_data)
+        return self.Meta.model(**validated_data)
+
+    def update(self, instance, validated_data):
+        """
+        With bulk_save in the context attributes are set but the instance isn't saved, the caller saves
+        all the instances at once. Changed fields are kept in bulk_save_fields.
+        """
+        if not self.context.get('bulk_save'):
+            return super().update(instance, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        self.bulk_save_fields = list(validated_data.keys())
+        return instance
+
+
 class JSONSerializerFactory(object):
     common_mixins = (
-        UndoSerializerMixin, WidgetSerializerMixin, AccessTokenMixin, FixPropertiesSerializerMixin,
-        ImageWithThumbnailSerializerMixin, VirtualFieldsSerializer
+        UndoSerializerMixin, WidgetSerializerMixin, BulkSaveSerializerMixin, AccessTokenMixin,
+        FixPropertiesSerializerMixin, RowEmitterSerializerMixin
     )
     serializer_class = JSONSerializer
 
@@ -247,6 +356,13 @@ class JSONSerializerFactory(object):
             if type(f) is ImageWithThumbnailField:
                 attrs[field] = self.to_image_field(field, f)
 
+    def get_image_fields(self):
+        image_fields = {}
+        for field in self.fields:
+            if type(self.model._meta.get_field(field)) is ImageWithThumbnailField:
+                image_fields[field] = ImageFieldRepresentation(self.model, field)
+        return image_fields
+
     def get_attrs(self):
         attrs = {
             '__module__': 'layerserver',
@@ -288,6 +404,7 @@ class JSONSerializerFactory(object):
         if len(read_only_fields) > 0:
             meta_attrs['read_only_fields'] = read_only_fields
         meta_attrs['virtual_fields'] = self.virtual_fields
+        meta_attrs['image_fields'] = self.get_image_fields()
 
         return meta_attrs
 
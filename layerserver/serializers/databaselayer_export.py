@@ -0,0 +1,25 @@
+from django.urls import reverse
+
+from rest_framework import serializers
+
+from layerserver.models import EXPORT_STATUS_CHOICES, DataBaseLayerExport
+
+
+class DBLayerExportSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(source='uuid')
+    url = serializers.SerializerMethodField()
+    file_url = serializers.SerializerMethodField()
+
+    def get_url(self, obj):
+        url = reverse('content-export-detail', kwargs={'name': obj.layer.name, 'export_uuid': obj.uuid})
+        return self.context['request'].build_absolute_uri(url)
+
+    def get_file_url(self, obj):
+        if obj.status != EXPORT_STATUS_CHOICES.done:
+            return None
+        url = reverse('content-export-file', kwargs={'name': obj.layer.name, 'export_uuid': obj.uuid})
+        return self.context['request'].build_absolute_uri(url)
+
+    class Meta:
+        model = DataBaseLayerExport
+        fields = ['id', 'url', 'format', 'out_srid', 'status', 'progress', 'error', 'created', 'finished', 'file_url']
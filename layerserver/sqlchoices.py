@@ -0,0 +1,78 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _generation_key(field_pk):
+    return 'layerserver:sqlchoices_generation:%s' % field_pk
+
+
+def _get_generation(field_pk):
+    cache = caches[settings.LAYERSERVER_CACHE]
+    key = _generation_key(field_pk)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate_sqlchoices(field_pk):
+    """
+    The query of the field is executed again the next time its choices are needed
+    """
+    cache = caches[settings.LAYERSERVER_CACHE]
+    cache.set(_generation_key(field_pk), uuid.uuid4().hex, timeout=None)
+
+
+def get_sqlchoices_cache_key(field):
+    """
+    Choices are cached by field, the key changes when the field is invalidated or its options change
+    """
+    digest = hashlib.md5((field.widget_options or '').encode('utf-8')).hexdigest()
+    return 'layerserver:sqlchoices:%s:%s:%s' % (field.pk, _get_generation(field.pk), digest)
+
+
+def _get_sqlchoices(field):
+    options = json.loads(field.widget_options)
+    query = options['query'].encode('utf-8').decode('unicode_escape')
+    rows = []
+    with field.layer.db_connection.get_connection().cursor() as cursor:
+        cursor.execute(query)
+        headers = [header.name for header in cursor.description]
+        for r in cursor.fetchall():
+            if len(r) == 1:
+                rows.append(r[0])
+            else:
+                rows.append(list(r))
+    return {'headers': headers, 'rows': rows}
+
+
+def get_sqlchoices(field):
+    """
+    Returns {'headers': [...], 'rows': [...]} with the result of the query of a DataBaseLayerField with
+    the sqlchoices widget, it's executed once every LAYERSERVER_SQLCHOICES_CACHE_TIMEOUT seconds
+    """
+    cache = caches[settings.LAYERSERVER_CACHE]
+    key = get_sqlchoices_cache_key(field)
+    result = cache.get(key)
+    if result is None:
+        result = _get_sqlchoices(field)
+        cache.set(key, result, timeout=settings.LAYERSERVER_SQLCHOICES_CACHE_TIMEOUT)
+    return result
+
+
+def filter_sqlchoices(rows, q):
+    """
+    Rows with some value that contains q, case insensitive
+    """
+    q = q.lower()
+    filtered = []
+    for row in rows:
+        values = row if isinstance(row, list) else [row]
+        if any(value is not None and q in str(value).lower() for value in values):
+            filtered.append(row)
+    return filtered
@@ -1,12 +1,19 @@
+import hashlib
 import io
 import logging
 
+from datetime import timedelta
+
 import pdf2image
 
 from PIL import Image
 
 from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
 from django.core.files.base import ContentFile
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
 
 from giscube.utils import get_cls
 
@@ -14,12 +21,21 @@ from giscube.utils import get_cls
 logger = logging.getLogger(__name__)
 
 
+THUMBNAIL_PENDING = 'pending'
+# Seconds a pending thumbnail is not scheduled again
+THUMBNAIL_PENDING_TIMEOUT = 60
+# Seconds a file that can't be converted into a thumbnail is not tried again
+THUMBNAIL_ERROR_TIMEOUT = 60 * 60
+
+
 class ThumbnailFileSystemStorageMixin(object):
     ALLOWED_IMAGE_FORMATS = ('PNG')
     EXTENSIONS = {
         'PNG': 'png',
+        'WEBP': 'webp',
     }
     PNG_SUPPORTED_MODES = ('1', 'L', 'RGB', 'RGBA')
+    WEBP_SUPPORTED_MODES = ('RGB', 'RGBA')
 
     def __init__(self, *args, **kwargs):
         self.save_thumbnail_enabled = kwargs.pop('save_thumbnail_enabled', True)
@@ -27,9 +43,17 @@ class ThumbnailFileSystemStorageMixin(object):
         self.thumbnail_base_url = kwargs.pop('thumbnail_base_url', None)
         self.thumbnail_width = settings.LAYERSERVER_THUMBNAIL_WIDTH
         self.thumbnail_height = settings.LAYERSERVER_THUMBNAIL_HEIGHT
+        thumbnail_width = kwargs.pop('thumbnail_width', None)
+        thumbnail_height = kwargs.pop('thumbnail_height', None)
         if self.thumbnail_location is not None:
-            self.thumbnail_width = kwargs.pop('thumbnail_width', None) or self.thumbnail_width
-            self.thumbnail_height = kwargs.pop('thumbnail_height', None) or self.thumbnail_height
+            self.thumbnail_width = thumbnail_width or self.thumbnail_width
+            self.thumbnail_height = thumbnail_height or self.thumbnail_height
+        # Other sizes, {name: [width, height]}
+        self.thumbnail_sizes = kwargs.pop('thumbnail_sizes', None) or settings.LAYERSERVER_THUMBNAIL_SIZES
+        self.thumbnail_format = (kwargs.pop('thumbnail_format', None) or settings.LAYERSERVER_THUMBNAIL_FORMAT).upper()
+        # DataBaseLayer field of the storage, its thumbnails can be saved by a celery task
+        self.layer_name = kwargs.pop('layer_name', None)
+        self.field_name = kwargs.pop('field_name', None)
         super().__init__(*args, **kwargs)
 
     def delete(self, name, *args, **kwargs):
@@ -37,13 +61,14 @@ class ThumbnailFileSystemStorageMixin(object):
         self.delete_thumbnail(name)
 
     def delete_thumbnail(self, name):
-        thumbnail_name = self.get_thumbnail_name(name)
         storage_thumbnail = self.get_thumbnail_storage()
-        if storage_thumbnail.exists(thumbnail_name):
-            storage_thumbnail.delete(thumbnail_name)
+        names = [self.get_thumbnail_name(name, size) for size in self.get_thumbnail_sizes()]
+        for thumbnail_name in names + [self.get_thumbnail_error_name(name)]:
+            if storage_thumbnail.exists(thumbnail_name):
+                storage_thumbnail.delete(thumbnail_name)
 
-    def get_thumbnail(self, name, create=False):
-        thumbnail_name = self.get_thumbnail_name(name)
+    def get_thumbnail(self, name, create=False, size=None):
+        thumbnail_name = self.get_thumbnail_name(name, size)
         storage_thumbnail = self.get_thumbnail_storage()
         if create and not storage_thumbnail.exists(thumbnail_name):
             self.save_thumbnail(name)
@@ -53,10 +78,23 @@ class ThumbnailFileSystemStorageMixin(object):
             'url': storage_thumbnail.url(thumbnail_name)
         }
 
-    def get_thumbnail_name(self, file_name):
-        # Only png extension is suported
-        extension = 'png'
-        return '%s.thumbnail.%s' % (file_name, extension)
+    def get_thumbnail_name(self, file_name, size=None):
+        extension = self.EXTENSIONS.get(self.thumbnail_format, 'png')
+        if size is None:
+            return '%s.thumbnail.%s' % (file_name, extension)
+        return '%s.thumbnail.%s.%s' % (file_name, size, extension)
+
+    def get_thumbnail_sizes(self):
+        """
+        Returns {size name: (width, height)}, the default thumbnail size name is None
+        """
+        sizes = {None: (self.thumbnail_width, self.thumbnail_height)}
+        for name, size in self.thumbnail_sizes.items():
+            sizes[name] = (int(size[0]), int(size[1]))
+        return sizes
+
+    def thumbnail_exists(self, name, size=None):
+        return self.get_thumbnail_storage().exists(self.get_thumbnail_name(name, size))
 
     def get_thumbnail_storage(self):
         klass = get_cls('LAYERSERVER_THUMBNAIL_STORAGE_CLASS')
@@ -65,38 +103,114 @@ class ThumbnailFileSystemStorageMixin(object):
     def save(self, *args, **kwargs):
         file_name = super().save(*args, **kwargs)
         if self.thumbnail_location and self.save_thumbnail_enabled:
-            self.save_thumbnail(file_name)
+            self.schedule_thumbnail(file_name)
         return file_name
 
+    def is_thumbnail_async(self):
+        return settings.LAYERSERVER_THUMBNAIL_ASYNC and self.layer_name is not None
+
+    def schedule_thumbnail(self, file_name):
+        """
+        Saves the thumbnails of file_name in a celery task (LAYERSERVER_THUMBNAIL_ASYNC), only once while
+        it's pending. The task is sent when the current transaction is committed, nothing is sent if it's
+        rolled back.
+        """
+        if not self.is_thumbnail_async():
+            self.save_thumbnail(file_name)
+            return
+        from .tasks import async_dblayer_save_thumbnails
+
+        def send_task():
+            key = self.get_thumbnail_status_key(file_name)
+            if caches[settings.LAYERSERVER_CACHE].add(key, THUMBNAIL_PENDING, timeout=THUMBNAIL_PENDING_TIMEOUT):
+                async_dblayer_save_thumbnails.apply_async(
+                    (self.layer_name, self.field_name, [file_name]), queue=settings.LAYERSERVER_THUMBNAIL_QUEUE)
+
+        # The atomic block lets bulk requests (manual transactions) register it too, without a transaction
+        # it's sent now
+        using = self.get_db_alias()
+        with transaction.atomic(using=using, savepoint=False):
+            transaction.on_commit(send_task, using=using)
+
+    def get_db_alias(self):
+        """
+        Database alias of the layer of the storage
+        """
+        from .compiled_layer import get_compiled_layer
+
+        compiled = get_compiled_layer(self.layer_name)
+        return compiled.model.objects.db if compiled is not None else DEFAULT_DB_ALIAS
+
+    def get_thumbnail_status_key(self, file_name):
+        digest = hashlib.md5(('%s|%s' % (self.thumbnail_location, file_name)).encode('utf-8')).hexdigest()
+        return 'layerserver:thumbnail:%s' % digest
+
+    def get_thumbnail_error_name(self, file_name):
+        return '%s.thumbnail.error' % file_name
+
+    def is_thumbnail_error(self, file_name):
+        """
+        True if the file can't be converted into a thumbnail, it won't be tried again for a while. The
+        worker that failed leaves a marker file next to the thumbnails.
+        """
+        try:
+            modified = self.get_thumbnail_storage().get_modified_time(self.get_thumbnail_error_name(file_name))
+        except (OSError, NotImplementedError):
+            return False
+        return timezone.now() - modified < timedelta(seconds=THUMBNAIL_ERROR_TIMEOUT)
+
     def save_thumbnail(self, file_name):
         """
-        Save the thumbnail into storage
+        Save the thumbnails into storage
         """
         storage_thumbnail = self.get_thumbnail_storage()
         result = self._save_thumbnail(file_name)
-        if result:
-            bytes, extension = result
-            filename = self.get_thumbnail_name(file_name)
+        error_name = self.get_thumbnail_error_name(file_name)
+        if storage_thumbnail.exists(error_name):
+            storage_thumbnail.delete(error_name)
+        if not result:
+            storage_thumbnail.save(name=error_name, content=ContentFile(b''))
+        for size, bytes in result.items():
+            filename = self.get_thumbnail_name(file_name, size)
+            if storage_thumbnail.exists(filename):
+                storage_thumbnail.delete(filename)
             storage_thumbnail.save(name=filename, content=ContentFile(bytes))
+        caches[settings.LAYERSERVER_CACHE].delete(self.get_thumbnail_status_key(file_name))
+
+    def _open_pdf(self, file_name, width):
+        # The first page is rendered at the thumbnail width, from the file path if the storage has one
+        try:
+            path = self.path(file_name)
+        except NotImplementedError:
+            path = None
+        if path is not None:
+            images = pdf2image.convert_from_path(path, first_page=1, last_page=1, size=(width, None))
+        else:
+            with self.open(file_name) as file:
+                images = pdf2image.convert_from_bytes(file.read(), first_page=1, last_page=1, size=(width, None))
+        return images[0] if len(images) > 0 else None
 
     def _save_thumbnail(self, file_name):
         """
-        Generate a thumbnail
+        Generate the thumbnails, returns {size name: bytes}
         """
-        # Only png extension is supported
+        sizes = self.get_thumbnail_sizes()
+        max_size = (max(size[0] for size in sizes.values()), max(size[1] for size in sizes.values()))
         im = None
         format = None
         file = None
         if file_name.endswith('.pdf'):
-            file = self.open(file_name)
-            images = pdf2image.convert_from_bytes(file.read(), first_page=1, last_page=1)
-            if len(images) > 0:
-                im = images[0]
-                format = 'PNG'
+            try:
+                im = self._open_pdf(file_name, max_size[0])
+            except Exception as e:
+                logger.warning(e)
+            format = 'PNG'
         else:
             try:
                 file = self.open(file_name)
                 im = Image.open(file)
+                # JPEG images are decoded at the smallest scale larger than the thumbnails
+                im.draft(None, max_size)
                 # Keep the same format if it's OK for us
                 if im.format in self.ALLOWED_IMAGE_FORMATS:
                     format = im.format
@@ -110,20 +224,52 @@ class ThumbnailFileSystemStorageMixin(object):
                 logger.warning(e)
                 im = None
 
+        result = {}
         if im:
-            # generate thumbnail
-            size = (self.thumbnail_width, self.thumbnail_height)
-            im.thumbnail(size, Image.ANTIALIAS)
-            buffer = io.BytesIO()
-            im.save(buffer, format=format)
+            if self.thumbnail_format == 'WEBP':
+                format = 'WEBP'
+                if im.mode not in self.WEBP_SUPPORTED_MODES:
+                    im = im.convert('RGBA')
+            for name, size in sizes.items():
+                # generate thumbnail
+                thumbnail = im.copy() if len(sizes) > 1 else im
+                thumbnail.thumbnail(size, Image.ANTIALIAS)
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, format=format)
 
-            buffer.seek(0)
-            bytes = buffer.read()
-            if file and not file.closed:
-                file.close()
-            return bytes, 'png'
+                buffer.seek(0)
+                result[name] = buffer.read()
+        if file and not file.closed:
+            file.close()
+        return result
 
 
 def get_image_with_thumbnail_storage_class():
     klass = get_cls('LAYERSERVER_FILE_STORAGE_CLASS')
     return type('ThumbnailFileSystemStorage', (ThumbnailFileSystemStorageMixin, klass), {})
+
+
+def get_layer_field_storage(layer_name, field_name):
+    """
+    Thumbnail storage of the image field of a DataBaseLayer, None if it doesn't exist
+    """
+    from .compiled_layer import get_compiled_layer
+
+    compiled = get_compiled_layer(layer_name)
+    if compiled is None:
+        return None
+    try:
+        storage = compiled.model._meta.get_field(field_name).storage
+    except (FieldDoesNotExist, AttributeError):
+        return None
+    return storage if isinstance(storage, ThumbnailFileSystemStorageMixin) else None
+
+
+def save_layer_thumbnails(layer_name, field_name, names):
+    storage = get_layer_field_storage(layer_name, field_name)
+    if storage is None or not storage.thumbnail_location:
+        return
+    for name in names:
+        # Files may be deleted before the thumbnail is saved
+        if storage.exists(name):
+            storage.save_thumbnail(name)
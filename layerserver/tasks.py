@@ -14,3 +14,44 @@ def async_generate_mapfile(pk):
     layer = DataBaseLayer.objects.get(pk=pk)
     ms = MapserverLayer(layer)
     ms.write()
+
+
+@app.task()
+def async_create_search_indexes(pk):
+    from layerserver.models import DataBaseLayer
+    from layerserver.search import create_search_indexes
+    layer = DataBaseLayer.objects.get(pk=pk)
+    create_search_indexes(layer)
+
+
+@app.task()
+def async_dblayer_export(pk):
+    from layerserver.export import run_export
+    run_export(pk)
+
+
+@app.task()
+def async_dblayer_refresh_artifacts(pk, generation=None):
+    from layerserver.export import refresh_artifacts
+    refresh_artifacts(pk, generation)
+
+
+@app.task()
+def async_dblayer_update_count_views(pk):
+    from layerserver.models import DataBaseLayer
+    from layerserver.relation_counts import update_count_views
+    layer = DataBaseLayer.objects.filter(pk=pk).first()
+    if layer is not None:
+        update_count_views(layer)
+
+
+@app.task()
+def async_dblayer_refresh_count_views(pk):
+    from layerserver.relation_counts import refresh_count_views
+    refresh_count_views(pk)
+
+
+@app.task()
+def async_dblayer_save_thumbnails(layer_name, field_name, names):
+    from layerserver.storage import save_layer_thumbnails
+    save_layer_thumbnails(layer_name, field_name, names)
@@ -1,7 +1,7 @@
 from django.urls import path, re_path
 
-from .api import (DBLayerContentBulkViewSet, DBLayerContentViewSet, DBLayerDetailViewSet, DBLayerViewSet,
-                  GeoJSONLayerViewSet)
+from .api import (DBLayerContentBulkViewSet, DBLayerContentIngestView, DBLayerContentViewSet, DBLayerDetailViewSet,
+                  DBLayerExportViewSet, DBLayerViewSet, GeoJSONLayerViewSet)
 
 
 geojsonlayer_list = GeoJSONLayerViewSet.as_view({
@@ -39,6 +39,36 @@ content_detail = DBLayerContentViewSet.as_view({
 
 content_bulk = DBLayerContentBulkViewSet.as_view()
 
+content_ingest = DBLayerContentIngestView.as_view()
+
+content_export_list = DBLayerExportViewSet.as_view({
+    'post': 'create'
+})
+
+content_export_detail = DBLayerExportViewSet.as_view({
+    'get': 'retrieve'
+})
+
+content_export_file = DBLayerExportViewSet.as_view({
+    'get': 'file'
+})
+
+content_artifact = DBLayerExportViewSet.as_view({
+    'get': 'artifact'
+})
+
+content_tiles = DBLayerContentViewSet.as_view({
+    'get': 'tiles'
+})
+
+content_distinct_values = DBLayerContentViewSet.as_view({
+    'get': 'distinct_values'
+})
+
+content_sqlchoices = DBLayerContentViewSet.as_view({
+    'get': 'sqlchoices'
+})
+
 urlpatterns = [
     path('geojsonlayers/', geojsonlayer_list, name='geojsonlayer'),
     re_path(r'^geojsonlayers/(?P<name>[-\w]{1,255})?(\.json|\.geojson)?$',
@@ -49,7 +79,20 @@ urlpatterns = [
          DBLayerContentViewSet.as_view({'get': 'file_value'}), name='content-detail-file-value'),
     path('databaselayers/<slug:name>/data/<str:pk>/', content_detail, name='content-detail'),
     path('databaselayers/<slug:name>/data/', content_list, name='content-list'),
+    path('databaselayers/<slug:name>/data.fgb', content_artifact, {'artifact_format': 'fgb'}, name='content-fgb'),
+    path('databaselayers/<slug:name>/data.parquet', content_artifact, {'artifact_format': 'parquet'},
+         name='content-parquet'),
     path('databaselayers/<slug:name>/bulk/', content_bulk, name='content-bulk'),
+    path('databaselayers/<slug:name>/ingest/', content_ingest, name='content-ingest'),
+    path('databaselayers/<slug:name>/exports/<uuid:export_uuid>/file/', content_export_file,
+         name='content-export-file'),
+    path('databaselayers/<slug:name>/exports/<uuid:export_uuid>/', content_export_detail,
+         name='content-export-detail'),
+    path('databaselayers/<slug:name>/exports/', content_export_list, name='content-export-list'),
+    path('databaselayers/<slug:name>/tiles/<int:z>/<int:x>/<int:y>.pbf', content_tiles, name='content-tiles'),
+    path('databaselayers/<slug:name>/fields/<str:field>/values/', content_distinct_values,
+         name='content-distinct-values'),
+    path('databaselayers/<slug:name>/fields/<str:field>/choices/', content_sqlchoices, name='content-sqlchoices'),
     path('databaselayers/<slug:name>/wms/', content_wms, name='content-wms'),
     path('databaselayers/<slug:name>/', layer_detail, name='layer-detail'),
     path('databaselayers/', layer_list, name='layer-list'),
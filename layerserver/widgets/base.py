@@ -29,6 +29,14 @@ class BaseWidget(object):
     def serialize_value(model_obj, field):
         pass
 
+    @staticmethod
+    def serialize_value_expression(field):
+        """
+        Database expression that returns what serialize_value returns, None if there is no value.
+        Raise NotImplementedError if the value can only be serialized in python.
+        """
+        raise NotImplementedError
+
     @staticmethod
     def get_queryset(qs, field, request):
         return qs
@@ -1,6 +1,7 @@
 import inspect
 import json
 import os
+import re
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -44,7 +45,11 @@ def _get_storage_class(dblayer_field, widget_options):
             thumbnail_location=thumbnail_root,
             thumbnail_base_url=thumbnail_base_url,
             thumbnail_width=widget_options.get('thumbnail_width', None),
-            thumbnail_height=widget_options.get('thumbnail_height', None)
+            thumbnail_height=widget_options.get('thumbnail_height', None),
+            thumbnail_sizes=widget_options.get('thumbnail_sizes', None),
+            thumbnail_format=widget_options.get('thumbnail_format', None),
+            layer_name=dblayer_field.layer.name,
+            field_name=dblayer_field.name
         )
         storage.save_thumbnail_enabled = thumbnail_root is not None
         return storage
@@ -67,6 +72,8 @@ class ImageWidget(BaseJSONWidget):
     ERROR_THUMBNAIL_ROOT_NOT_EXISTS = _('\'thumbnail_root\' folder doesn\'t exist')
     ERROR_THUMBNAIL_ROOT_NOT_WRITABLE = _('\'thumbnail_root\' folder is not writable')
     ERROR_THUMBNAIL_BASE_URL = _('\'thumbnail_base_url\' is not valid')
+    ERROR_THUMBNAIL_SIZES = _('\'thumbnail_sizes\' must be an object of [width, height] sizes')
+    ERROR_THUMBNAIL_FORMAT = _('\'thumbnail_format\' must be PNG or WEBP')
     base_type = 'image'
 
     @staticmethod
@@ -144,6 +151,26 @@ class ImageWidget(BaseJSONWidget):
             except ValidationError:
                 return ImageWidget.ERROR_THUMBNAIL_BASE_URL
 
+    @staticmethod
+    def validate_thumbnail_sizes(data):
+        sizes = data.get('thumbnail_sizes', None)
+        if sizes is None:
+            return
+        if not isinstance(sizes, dict):
+            return ImageWidget.ERROR_THUMBNAIL_SIZES
+        for name, size in sizes.items():
+            if not re.match(r'^[\w-]+$', name):
+                return ImageWidget.ERROR_THUMBNAIL_SIZES
+            if not isinstance(size, list) or len(size) != 2 or \
+                    not all(isinstance(value, int) and value > 0 for value in size):
+                return ImageWidget.ERROR_THUMBNAIL_SIZES
+
+    @staticmethod
+    def validate_thumbnail_format(data):
+        thumbnail_format = data.get('thumbnail_format', None)
+        if thumbnail_format is not None and str(thumbnail_format).upper() not in ('PNG', 'WEBP'):
+            return ImageWidget.ERROR_THUMBNAIL_FORMAT
+
     @staticmethod
     def is_valid(cleaned_data):  # noqa C901
         value = cleaned_data['widget_options']
@@ -155,7 +182,9 @@ class ImageWidget(BaseJSONWidget):
         result = ImageWidget.validate_upload_root(data) or \
             ImageWidget.validate_base_url(data) or \
             ImageWidget.validate_thumbnail_root(data) or \
-            ImageWidget.validate_thumbnail_base_url(data)
+            ImageWidget.validate_thumbnail_base_url(data) or \
+            ImageWidget.validate_thumbnail_sizes(data) or \
+            ImageWidget.validate_thumbnail_format(data)
         if result:
             return result
 
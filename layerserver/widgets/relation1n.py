@@ -1,10 +1,13 @@
 import inspect
 import json
 
-from django.db.models import Count, OuterRef, Subquery, Value
+from django.db import connections
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
 from django.db.models.functions import Coalesce
 from django.utils.translation import gettext as _
 
+from ..functions import JSONBuildObject
 from .base import BaseJSONWidget
 
 
@@ -14,7 +17,8 @@ class Relation1NWidget(BaseJSONWidget):
         "dblayer": "layername",
         "to_field": "id",
         "dblayer_fk": "parent_id",
-        "count": false
+        "count": false,
+        "materialized": false
     }
     """)
     ERROR_DBLAYER_REQUIRED = _('\'dblayer\' attribute is required')
@@ -51,22 +55,31 @@ class Relation1NWidget(BaseJSONWidget):
 
     @staticmethod
     def get_queryset(qs, field, request):
-        from layerserver.model_legacy import create_dblayer_model
-        from layerserver.models import DataBaseLayer
+        from layerserver.compiled_layer import get_compiled_layer
         if field.config.get('count') is True:
             dblayer = field.config['dblayer']
-            related_layer = DataBaseLayer.objects.filter(name=dblayer).first()
+            related_layer = get_compiled_layer(dblayer)
             if not related_layer:
                 msg = 'Invalid configuration for DataBaseLayerVirtualField: %s.%s. %s doesn\'t exist' % (
                     field.layer.name, field.name, dblayer)
                 raise Exception(msg)
 
             dblayer_fk = field.config['dblayer_fk']
-            related_model = create_dblayer_model(related_layer)
-            filter = {dblayer_fk: OuterRef(field.config['to_field'])}
-            items = related_model.objects.filter(**filter).order_by().values(dblayer_fk)
-            count_items = items.annotate(count=Count(dblayer_fk)).values('count')
-            qs = qs.annotate(**{field.name: Coalesce(Subquery(count_items), Value(0))})
+            count_view = None
+            if field.config.get('materialized') is True:
+                count_view = related_layer.get_count_view(dblayer_fk)
+            if count_view is not None:
+                # One row by parent in the view, read with its unique index
+                quote = connections[qs.db].ops.quote_name
+                to_field = qs.model._meta.get_field(field.config['to_field'])
+                sql = 'SELECT count FROM %s WHERE parent = %s.%s' % (
+                    count_view, quote(qs.model._meta.db_table), quote(to_field.column))
+                count = RawSQL(sql, [], output_field=IntegerField())
+            else:
+                filter = {dblayer_fk: OuterRef(field.config['to_field'])}
+                items = related_layer.model.objects.filter(**filter).order_by().values(dblayer_fk)
+                count = Subquery(items.annotate(count=Count(dblayer_fk)).values('count'))
+            qs = qs.annotate(**{field.name: Coalesce(count, Value(0))})
         return qs
 
     @staticmethod
@@ -74,3 +87,8 @@ class Relation1NWidget(BaseJSONWidget):
         if field.config.get('count') is True:
             value = getattr(model_obj, field.name)
             return {'count': value}
+
+    @staticmethod
+    def serialize_value_expression(field):
+        if field.config.get('count') is True:
+            return JSONBuildObject([('count', F(field.name))])
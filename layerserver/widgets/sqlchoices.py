@@ -1,8 +1,10 @@
 import inspect
 import json
 
+from django.urls import reverse
 from django.utils.translation import gettext as _
 
+from ..sqlchoices import get_sqlchoices
 from .base import BaseJSONWidget
 
 
@@ -29,30 +31,21 @@ class SqlchoicesWidget(BaseJSONWidget):
 
     @staticmethod
     def serialize_widget_options(obj):
+        """
+        The values are not embedded, values_url searches and pages through them (?q=&limit=&offset=)
+        """
         data = {}
-        headers = []
-        rows = []
         try:
             options = json.loads(obj.widget_options)
         except Exception:
             return {'error': 'ERROR PARSING WIDGET OPTIONS'}
         try:
-            with obj.layer.db_connection.get_connection().cursor() as cursor:
-                query = options['query'].encode('utf-8').decode('unicode_escape')
-                cursor.execute('%s LIMIT 0' % query)
-                for header in cursor.description:
-                    headers.append(header.name)
-                cursor.execute(query)
-                for r in cursor.fetchall():
-                    if len(r) == 1:
-                        rows.append(r[0])
-                    else:
-                        rows.append(r)
+            headers = get_sqlchoices(obj)['headers']
         except Exception:
             return {'error': 'ERROR WITH WIDGET OPTIONS'}
 
         data['values_list_headers'] = headers
-        data['values_list'] = rows
+        data['values_url'] = reverse('content-sqlchoices', kwargs={'name': obj.layer.name, 'field': obj.name})
         if 'table_headers' in options:
             data['table_headers'] = options['table_headers']
         if 'label' in options:
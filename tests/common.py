@@ -14,6 +14,8 @@ from django.utils import timezone
 from oauth2_provider.models import get_access_token_model, get_application_model
 from rest_framework.test import APIClient, APITransactionTestCase
 
+from layerserver.compiled_layer import clear_compiled_layers
+
 
 UserModel = get_user_model()
 ApplicationModel = get_application_model()
@@ -109,10 +111,16 @@ class BaseTest(APITransactionTestCase):
     def logout(self):
         self.client.credentials(HTTP_AUTHORIZATION='')
 
+    def response_json(self, response):
+        if response.streaming:
+            return json.loads(b''.join(response.streaming_content).decode('utf-8'))
+        return response.json()
+
     def tearDown(self):
         if 'layerserver_databaselayer' in apps.all_models:
             for x in list(apps.all_models['layerserver_databaselayer'].keys()):
                 del apps.all_models['layerserver_databaselayer'][x]
+        clear_compiled_layers()
         self.application.delete()
         self.test_user.delete()
         self.dev_user.delete()
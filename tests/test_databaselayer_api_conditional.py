@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer
+from tests.common import BaseTest
+
+
+class DataBaseLayerAPIConditionalTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests-location'
+        layer.table = 'tests_location'
+        layer.pk_field = 'id'
+        layer.geom_field = 'geometry'
+        layer.anonymous_view = True
+        layer.anonymous_add = True
+        layer.anonymous_update = True
+        layer.anonymous_delete = True
+        layer.save()
+        self.layer = layer
+
+        self.Location = create_dblayer_model(layer)
+        self.locations = []
+        for i in range(0, 3):
+            location = self.Location()
+            location.code = 'C%s' % str(i).zfill(3)
+            location.address = 'C/ Jaume %s, Girona' % i
+            location.geometry = 'POINT(0 %s)' % i
+            location.save()
+            self.locations.append(location)
+
+    def test_list_not_modified(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(url, data={'page': 2, 'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_data_changes(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        etag = self.client.get(url)['ETag']
+
+        location = self.locations[1]
+        detail_url = reverse('content-detail', kwargs={'name': self.layer.name, 'pk': location.pk})
+        response = self.client.patch(detail_url, {'address': 'C/ Nou, Girona'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.delete(detail_url).status_code, 204)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['features']), 2)
+
+    def test_list_row_versions(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Changes made outside the API
+        location = self.locations[1]
+        location.address = 'C/ Nou, Girona'
+        location.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.locations[2].delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['features']), 2)
+
+    def test_list_without_count(self):
+        # Pages that don't count the rows don't read them, only changes made through the API are seen
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        etag = self.client.get(url, data={'count': 'none'})['ETag']
+        location = self.locations[1]
+        location.address = 'C/ Nou, Girona'
+        location.save()
+        self.assertEqual(self.client.get(url, data={'count': 'none'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_view(self):
+        with self.layer.db_connection.get_connection().cursor() as cursor:
+            cursor.execute('CREATE VIEW tests_location_view AS SELECT * FROM tests_location')
+        try:
+            self.layer.table = 'tests_location_view'
+            self.layer.save()
+            url = reverse('content-list', kwargs={'name': self.layer.name})
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('ETag'))
+        finally:
+            with self.layer.db_connection.get_connection().cursor() as cursor:
+                cursor.execute('DROP VIEW IF EXISTS tests_location_view')
+
+    def test_detail_not_modified(self):
+        location = self.locations[0]
+        url = reverse('content-detail', kwargs={'name': self.layer.name, 'pk': location.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Other rows don't change the detail validator
+        self.locations[1].delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        data = {'address': 'C/ Nou, Girona'}
+        response = self.client.patch(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_not_found(self):
+        url = reverse('content-detail', kwargs={'name': self.layer.name, 'pk': 'abc'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(LAYERSERVER_CONDITIONAL_GET=False)
+    def test_disabled(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
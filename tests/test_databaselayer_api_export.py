@@ -0,0 +1,262 @@
+import csv
+import io
+import json
+import shutil
+import tempfile
+
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry
+from django.test import override_settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.arrow import is_arrow_available
+from layerserver.export import is_format_available, refresh_artifacts
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer, DataBaseLayerExport
+from layerserver.response_cache import bump_data_generation, get_data_generation
+from tests.common import BaseTest
+
+
+class DataBaseLayerAPIExportTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        self.export_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(LAYERSERVER_EXPORT_ROOT=self.export_root)
+        self.settings_override.enable()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests-location'
+        layer.table = 'tests_location'
+        layer.pk_field = 'id'
+        layer.geom_field = 'geometry'
+        layer.anonymous_view = True
+        layer.anonymous_add = True
+        layer.anonymous_update = True
+        layer.anonymous_delete = True
+        layer.save()
+        self.layer = layer
+
+        Location = create_dblayer_model(layer)
+        self.locations = []
+        for i in range(0, 5):
+            location = Location()
+            location.code = 'C%s' % str(i).zfill(3)
+            location.address = 'C/ Jaume %s, Girona' % i
+            location.geometry = 'POINT(0 %s)' % i
+            location.save()
+            self.locations.append(location)
+
+        self.url = reverse('content-export-list', kwargs={'name': self.layer.name})
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.export_root, ignore_errors=True)
+        super().tearDown()
+
+    def post_export(self, format, query=''):
+        response = self.client.post(self.url + query, {'format': format}, format='json')
+        self.assertIn(response.status_code, (200, 202))
+        return response.json()
+
+    def export(self, format, query=''):
+        # Celery tasks are eager in tests, the export has finished when it's polled
+        response = self.client.get(self.post_export(format, query)['url'])
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def read_csv(self, export):
+        response = self.client.get(export['file_url'])
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.DictReader(io.StringIO(content)))
+
+    def test_csv(self):
+        export = self.export('csv', '?q=Jaume 3')
+        self.assertEqual(export['status'], 'done')
+        self.assertEqual(export['progress'], 100)
+        rows = self.read_csv(export)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['code'], 'C003')
+        self.assertEqual(rows[0]['WKT'], 'POINT (0 3)')
+
+    def test_gpkg(self):
+        export = self.export('gpkg')
+        self.assertEqual(export['status'], 'done')
+        response = self.client.get(export['file_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="tests-location.gpkg"')
+
+    def test_file_range(self):
+        export = self.export('csv')
+        response = self.client.get(export['file_url'])
+        content = b''.join(response.streaming_content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.client.get(export['file_url'], HTTP_RANGE='bytes=2-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-9/%s' % len(content))
+        self.assertEqual(b''.join(response.streaming_content), content[2:10])
+
+        response = self.client.get(export['file_url'], HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), content[-5:])
+
+        response = self.client.get(export['file_url'], HTTP_RANGE='bytes=%s-' % len(content))
+        self.assertEqual(response.status_code, 416)
+
+    def test_fgb(self):
+        if not is_format_available('fgb'):
+            self.skipTest('FlatGeobuf needs GDAL >= 3.1')
+        url = reverse('content-fgb', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(url, HTTP_RANGE='bytes=0-7')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content)[:3], b'fgb')
+        etag = response['ETag']
+
+        # Written again in the background (celery tasks are eager in tests)
+        detail_url = reverse('content-detail', kwargs={'name': self.layer.name, 'pk': self.locations[0].pk})
+        response = self.client.patch(detail_url, {'address': 'C/ Nou, Girona'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_fgb_refreshed_by_celery(self):
+        if not is_format_available('fgb'):
+            self.skipTest('FlatGeobuf needs GDAL >= 3.1')
+        url = reverse('content-fgb', kwargs={'name': self.layer.name})
+        self.client.get(url)
+        bump_data_generation(self.layer.pk)
+        # The task gets the generation of the web process, celery workers may have another one
+        with mock.patch('layerserver.export.get_data_generation', return_value='celery'):
+            refresh_artifacts(self.layer.pk, get_data_generation(self.layer.pk))
+        count = DataBaseLayerExport.objects.count()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DataBaseLayerExport.objects.count(), count)
+
+    def test_refresh_outdated_generation(self):
+        if not is_format_available('fgb'):
+            self.skipTest('FlatGeobuf needs GDAL >= 3.1')
+        self.client.get(reverse('content-fgb', kwargs={'name': self.layer.name}))
+        generation = get_data_generation(self.layer.pk)
+        bump_data_generation(self.layer.pk)
+        count = DataBaseLayerExport.objects.count()
+        refresh_artifacts(self.layer.pk, generation)
+        self.assertEqual(DataBaseLayerExport.objects.count(), count)
+
+    def test_arrow(self):
+        if not is_arrow_available():
+            self.skipTest('pyarrow is not installed')
+        import pyarrow
+
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url, data={'format': 'arrow', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.arrow.stream')
+        table = pyarrow.ipc.open_stream(b''.join(response.streaming_content)).read_all()
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(table.schema.field('id').type, pyarrow.int32())
+        self.assertEqual(table.column('code').to_pylist(), ['C000', 'C001'])
+        # POINT(0 1) as little endian WKB
+        self.assertEqual(len(table.column('geometry')[1].as_py()), 21)
+
+    def test_parquet(self):
+        if not is_arrow_available():
+            self.skipTest('pyarrow is not installed')
+        import pyarrow.parquet
+
+        export = self.export('parquet', '?q=Jaume 3')
+        self.assertEqual(export['status'], 'done')
+        response = self.client.get(export['file_url'])
+        table = pyarrow.parquet.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.column('code').to_pylist(), ['C003'])
+        self.assertIn(b'geo', table.schema.metadata)
+        geo = json.loads(table.schema.metadata[b'geo'])
+        self.assertNotIn('crs', geo['columns']['geometry'])
+
+    def test_parquet_out_srid(self):
+        if not is_arrow_available():
+            self.skipTest('pyarrow is not installed')
+        import pyarrow.parquet
+
+        export = self.export('parquet', '?q=Jaume 3&out_srid=25831')
+        self.assertEqual(export['status'], 'done')
+        response = self.client.get(export['file_url'])
+        table = pyarrow.parquet.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        geo = json.loads(table.schema.metadata[b'geo'])
+        self.assertIn('crs', geo['columns']['geometry'])
+        geometry = GEOSGeometry(memoryview(table.column('geometry')[0].as_py()), srid=25831)
+        geometry.transform(4326)
+        self.assertAlmostEqual(geometry.x, 0, places=5)
+        self.assertAlmostEqual(geometry.y, 3, places=5)
+
+    def test_reused_until_data_changes(self):
+        export = self.export('csv')
+        self.assertEqual(self.export('csv')['id'], export['id'])
+        self.assertNotEqual(self.export('csv', '?q=Jaume 3')['id'], export['id'])
+
+        url = reverse('content-detail', kwargs={'name': self.layer.name, 'pk': self.locations[0].pk})
+        response = self.client.patch(url, {'address': 'C/ Nou, Girona'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        new_export = self.export('csv')
+        self.assertNotEqual(new_export['id'], export['id'])
+        self.assertEqual(self.read_csv(new_export)[0]['address'], 'C/ Nou, Girona')
+
+        # Changes made outside the API are detected too
+        location = self.locations[1]
+        location.address = 'C/ Vell, Girona'
+        location.save()
+        self.assertNotEqual(self.export('csv')['id'], new_export['id'])
+
+    def test_other_users(self):
+        self.login_test_user()
+        export = self.export('csv')
+        self.login_dev_user()
+        self.assertEqual(self.client.get(export['url']).status_code, 404)
+        self.assertEqual(self.client.get(export['file_url']).status_code, 404)
+        self.logout()
+        self.assertEqual(self.client.get(export['url']).status_code, 404)
+        # The same content is exported again for each user
+        self.assertNotEqual(self.export('csv')['id'], export['id'])
+
+    def test_data_filter(self):
+        self.layer.data_filter = {'code__in': ['C001', 'C002']}
+        self.layer.save()
+        rows = self.read_csv(self.export('csv'))
+        self.assertEqual([row['code'] for row in rows], ['C001', 'C002'])
+
+    def test_expired(self):
+        export = self.export('csv')
+        with override_settings(LAYERSERVER_EXPORT_EXPIRE=0):
+            self.assertNotEqual(self.post_export('csv')['id'], export['id'])
+        self.assertFalse(DataBaseLayerExport.objects.filter(uuid=export['id']).exists())
+
+    def test_invalid(self):
+        response = self.client.post(self.url, {'format': 'xls'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url + '?out_srid=1', {'format': 'csv'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_permissions(self):
+        export = self.export('csv')
+        self.layer.anonymous_view = False
+        self.layer.save()
+        response = self.client.post(self.url, {'format': 'csv'}, format='json')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get(export['file_url'])
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer
+from tests.common import BaseTest
+
+
+class DataBaseLayerAPIGeomOutputTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests_location_25831'
+        layer.table = 'tests_location_25831'
+        layer.srid = 25831
+        layer.pk_field = 'code'
+        layer.geom_field = 'geometry'
+        layer.anonymous_view = True
+        layer.save()
+        self.layer = layer
+
+        Location = create_dblayer_model(layer)
+        location = Location()
+        location.code = 'B1'
+        location.address = 'Carrer de Montori, 6, Girona'
+        location.geometry = 'SRID=25831;POINT(485984.399179716 4646678.69635524)'
+        location.save()
+
+    def get_coordinates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with override_settings(LAYERSERVER_SQL_GEOJSON=False):
+            python_response = self.client.get(url)
+        self.assertEqual(python_response.status_code, 200)
+        coordinates = response.json()['features'][0]['geometry']['coordinates']
+        python_coordinates = python_response.json()['features'][0]['geometry']['coordinates']
+        for value, python_value in zip(coordinates, python_coordinates):
+            self.assertAlmostEqual(value, python_value, places=9)
+        return coordinates
+
+    def test_precision(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        coordinates = self.get_coordinates('%s?precision=3' % url)
+        self.assertAlmostEqual(coordinates[0], 2.831, places=9)
+        self.assertAlmostEqual(coordinates[1], 41.972, places=9)
+
+    def test_zoom_and_resolution(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        coordinates = self.get_coordinates(url)
+        self.assertEqual(coordinates, self.get_coordinates('%s?zoom=12' % url))
+        self.assertEqual(coordinates, self.get_coordinates('%s?resolution=10' % url))
+
+    def test_invalid_parameters(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        for params in ['zoom=a', 'zoom=31', 'resolution=-1', 'precision=16', 'precision=1.5']:
+            response = self.client.get('%s?%s' % (url, params))
+            self.assertEqual(response.status_code, 400)
+
+    def test_out_srid(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        coordinates = self.get_coordinates('%s?out_srid=25831' % url)
+        self.assertAlmostEqual(coordinates[0], 485984.399179716, places=6)
+        self.assertAlmostEqual(coordinates[1], 4646678.69635524, places=6)
+
+        response = self.client.get('%s?out_srid=25831' % url)
+        self.assertEqual(response.json()['crs']['properties']['name'], 'EPSG:25831')
+        response = self.client.get(url)
+        self.assertNotIn('crs', response.json())
+
+        coordinates = self.get_coordinates('%s?out_srid=3857&precision=0' % url)
+        self.assertEqual(coordinates, [round(coordinates[0]), round(coordinates[1])])
+
+        self.layer.allow_page_size_0 = True
+        self.layer.save()
+        response = self.client.get('%s?out_srid=25831&page_size=0' % url)
+        result = self.response_json(response)
+        self.assertEqual(result['crs']['properties']['name'], 'EPSG:25831')
+        coordinates = result['features'][0]['geometry']['coordinates']
+        self.assertAlmostEqual(coordinates[0], 485984.399179716, places=6)
+
+    def test_invalid_out_srid(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get('%s?out_srid=999999' % url)
+        self.assertEqual(response.status_code, 400)
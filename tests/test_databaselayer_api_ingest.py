@@ -0,0 +1,121 @@
+import json
+
+from django.conf import settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer
+from tests.common import BaseTest
+
+
+class DataBaseLayerAPIIngestTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests-location-25831'
+        layer.table = 'tests_location_25831'
+        layer.pk_field = 'code'
+        layer.geom_field = 'geometry'
+        layer.srid = 25831
+        layer.anonymous_view = True
+        layer.anonymous_add = True
+        layer.anonymous_update = True
+        layer.anonymous_delete = True
+        layer.save()
+        self.layer = layer
+
+        self.Location = create_dblayer_model(layer)
+        location = self.Location()
+        location.code = 'C000'
+        location.address = 'C/ Jaume 0, Girona'
+        location.geometry = 'SRID=4326;POINT(2.82 41.98)'
+        location.save()
+
+        self.url = reverse('content-ingest', kwargs={'name': self.layer.name})
+
+    def ndjson(self, features):
+        return '\n'.join(json.dumps(feature) for feature in features)
+
+    def feature(self, code, address, x=2.8, y=41.9):
+        return {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [x, y]},
+            'properties': {'code': code, 'address': address}
+        }
+
+    def test_ndjson(self):
+        body = self.ndjson([self.feature('A%s' % i, 'C/ Nou %s, Girona' % i, y=41 + i / 10) for i in range(0, 5)])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'inserted': 5, 'updated': 0, 'skipped': 0})
+
+        obj = self.Location.objects.get(code='A3')
+        self.assertEqual(obj.address, 'C/ Nou 3, Girona')
+        self.assertEqual(obj.geometry.srid, 25831)
+        obj.geometry.transform(4326)
+        self.assertAlmostEqual(obj.geometry.y, 41.3, places=6)
+
+    def test_csv(self):
+        body = 'code,address,geometry\nA1,"C/ Nou, Girona",POINT(2.8 41.9)\nA2,,SRID=25831;POINT(485000 4650000)\n'
+        response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['inserted'], 2)
+        self.assertEqual(self.Location.objects.get(code='A1').address, 'C/ Nou, Girona')
+        obj = self.Location.objects.get(code='A2')
+        self.assertIsNone(obj.address)
+        self.assertEqual(obj.geometry.coords, (485000, 4650000))
+
+    def test_conflict(self):
+        body = self.ndjson([self.feature('A1', 'C/ Nou, Girona'), self.feature('C000', 'C/ Vell, Girona')])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.Location.objects.filter(code='A1').exists())
+
+        response = self.client.post(self.url + '?on_conflict=ignore', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'inserted': 1, 'updated': 0, 'skipped': 1})
+        self.assertEqual(self.Location.objects.get(code='C000').address, 'C/ Jaume 0, Girona')
+
+        response = self.client.post(self.url + '?on_conflict=update', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'inserted': 0, 'updated': 2, 'skipped': 0})
+        self.assertEqual(self.Location.objects.get(code='C000').address, 'C/ Vell, Girona')
+
+    def test_data_filter(self):
+        self.layer.data_filter = {'code__startswith': 'A'}
+        self.layer.save()
+        body = self.ndjson([self.feature('A1', 'C/ Nou, Girona'), self.feature('B1', 'C/ Vell, Girona')])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.Location.objects_default.filter(code__in=['A1', 'B1']).exists())
+
+    def test_invalid(self):
+        response = self.client.post(self.url, '{"code": "A1"}\n{', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['line'], 2)
+        self.assertFalse(self.Location.objects.filter(code='A1').exists())
+
+        response = self.client.post(self.url, 'code\nA1', content_type='application/xml')
+        self.assertEqual(response.status_code, 415)
+
+        response = self.client.post(self.url + '?on_conflict=replace', 'code\nA1', content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_permissions(self):
+        self.layer.anonymous_add = False
+        self.layer.save()
+        body = self.ndjson([self.feature('A1', 'C/ Nou, Girona')])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 401)
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.test.utils import override_settings
 from django.urls import reverse
 
 from giscube.models import DBConnection
@@ -129,4 +130,112 @@ class DataBaseLayerAPIPaginationTestCase(BaseTest):
 
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.json()['features']), len(self.locations))
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(self.response_json(response)['features']), len(self.locations))
+
+    def test_cursor_pagination(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        url = '%s?cursor=' % url
+        codes = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            result = response.json()
+            self.assertNotIn('count', result)
+            self.assertNotIn('total_pages', result)
+            self.assertLessEqual(len(result['features']), 5)
+            codes.extend([feature['properties']['code'] for feature in result['features']])
+            url = result['next']
+        self.assertEqual(codes, sorted([location.code for location in self.locations]))
+
+    def test_cursor_pagination_ordering_and_filters(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        url = '%s?cursor=&ordering=-code&q=Montori&page_size=4' % url
+        codes = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            result = response.json()
+            codes.extend([feature['properties']['code'] for feature in result['features']])
+            url = result['next']
+        expected = sorted([location.code for location in self.locations if 'Montori' in location.address])
+        self.assertEqual(codes, list(reversed(expected)))
+
+    def test_cursor_pagination_ordering_not_in_fields(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        url = '%s?cursor=&ordering=-address&fields=code&page_size=4' % url
+        codes = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            result = response.json()
+            self.assertTrue(all(list(feature['properties']) == ['code'] for feature in result['features']))
+            codes.extend([feature['properties']['code'] for feature in result['features']])
+            url = result['next']
+        self.assertEqual(sorted(codes), sorted([location.code for location in self.locations]))
+
+    def test_count_none(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get('%s?count=none&page=5' % url)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertNotIn('count', result)
+        self.assertNotIn('total_pages', result)
+        self.assertEqual(result['from'], 21)
+        self.assertEqual(result['to'], 25)
+        self.assertIsNotNone(result['next'])
+
+        response = self.client.get('%s?count=none&page=6' % url)
+        result = response.json()
+        self.assertEqual(len(result['features']), 4)
+        self.assertEqual(result['to'], 29)
+        self.assertIsNone(result['next'])
+        self.assertIsNotNone(result['previous'])
+
+        response = self.client.get('%s?count=none&page=7' % url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_count_estimate(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get('%s?count=estimate&q=Montori' % url)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertIsInstance(result['count'], int)
+        self.assertIn('total_pages', result)
+        self.assertEqual(len(result['features']), 5)
+        self.assertIsNotNone(result['next'])
+
+    def test_count_mode_layer_default(self):
+        self.layer.count_mode = 'none'
+        self.layer.save()
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        self.assertNotIn('count', response.json())
+
+        response = self.client.get('%s?count=exact' % url)
+        self.assertEqual(response.json()['count'], len(self.locations))
+
+        response = self.client.get('%s?count=wrong' % url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_size_0_streaming(self):
+        self.layer.allow_page_size_0 = True
+        self.layer.save()
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        url = '%s?page_size=0' % url
+        expected = sorted([location.code for location in self.locations])
+
+        with override_settings(LAYERSERVER_STREAMING_CHUNK_SIZE=4, LAYERSERVER_SQL_GEOJSON=False):
+            response = self.client.get(url)
+            self.assertTrue(response.streaming)
+            result = self.response_json(response)
+        self.assertEqual(result['type'], 'FeatureCollection')
+        self.assertEqual([feature['properties']['code'] for feature in result['features']], expected)
+
+        field = self.layer.fields.filter(name='geometry').first()
+        field.enabled = False
+        field.save()
+        with override_settings(LAYERSERVER_STREAMING_CHUNK_SIZE=4):
+            response = self.client.get(url)
+            result = self.response_json(response)
+        self.assertEqual([item['code'] for item in result['data']], expected)
@@ -0,0 +1,150 @@
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files import File
+from django.test import override_settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer, DataBaseLayerField
+from tests.common import BaseTest
+
+
+@override_settings(LAYERSERVER_RESPONSE_CACHE='default')
+class DataBaseLayerAPIResponseCacheTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        caches['default'].clear()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests-location'
+        layer.table = 'tests_location'
+        layer.pk_field = 'id'
+        layer.geom_field = 'geometry'
+        layer.anonymous_view = True
+        layer.anonymous_add = True
+        layer.anonymous_update = True
+        layer.anonymous_delete = True
+        layer.save()
+        self.layer = layer
+
+        Location = create_dblayer_model(layer)
+        self.locations = []
+        for i in range(0, 3):
+            location = Location()
+            location.code = 'C%s' % str(i).zfill(3)
+            location.address = 'C/ Jaume %s, Girona' % i
+            location.geometry = 'POINT(0 %s)' % i
+            location.save()
+            self.locations.append(location)
+
+    def get_addresses(self, **params):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url, data=params)
+        self.assertEqual(response.status_code, 200)
+        return [feature['properties']['address'] for feature in response.json()['features']]
+
+    def test_cached_until_data_changes(self):
+        self.assertEqual(self.get_addresses()[0], 'C/ Jaume 0, Girona')
+
+        # Changes made outside the API are only seen when the cache entry expires
+        location = self.locations[0]
+        location.address = 'C/ Nou, Girona'
+        location.save()
+        self.assertEqual(self.get_addresses()[0], 'C/ Jaume 0, Girona')
+        # Parameters are part of the key
+        self.assertEqual(self.get_addresses(ordering='-code')[-1], 'C/ Nou, Girona')
+
+        url = reverse('content-detail', kwargs={'name': self.layer.name, 'pk': location.pk})
+        response = self.client.patch(url, {'address': 'C/ Vell, Girona'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_addresses()[0], 'C/ Vell, Girona')
+
+    def test_layer_change(self):
+        self.assertEqual(len(self.get_addresses()), 3)
+        self.layer.page_size = 2
+        self.layer.save()
+        self.assertEqual(len(self.get_addresses()), 2)
+
+    @override_settings(LAYERSERVER_RESPONSE_CACHE_MAX_SIZE=10)
+    def test_max_size(self):
+        self.get_addresses()
+        location = self.locations[0]
+        location.address = 'C/ Nou, Girona'
+        location.save()
+        self.assertEqual(self.get_addresses()[0], 'C/ Nou, Girona')
+
+
+@override_settings(LAYERSERVER_RESPONSE_CACHE='default')
+class DataBaseLayerAPIResponseCacheImageTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        caches['default'].clear()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests_specie'
+        layer.table = 'tests_specie'
+        layer.pk_field = 'code'
+        layer.geom_field = None
+        layer.anonymous_view = True
+        layer.save()
+        layer.refresh_from_db()
+        field = layer.fields.filter(name='image').first()
+        field.widget = DataBaseLayerField.WIDGET_CHOICES.image
+        field.widget_options = json.dumps({'upload_root': '<auto>', 'thumbnail_root': '<auto>'})
+        field.save()
+        self.layer = layer
+
+        Model = create_dblayer_model(layer)
+        specie = Model()
+        specie.code = 'B0'
+        specie.name = 'Abies alba'
+        with open('tests/files/giscube_01.png', 'rb') as f:
+            specie.image.save(name='giscube_01.png', content=File(f))
+        specie.save()
+
+    def get_image_src(self, **extra):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data'][0]['image']['src']
+
+    def test_access_token_isnt_shared(self):
+        self.login_test_user()
+        test_user_token = self.token
+        self.assertTrue(self.get_image_src().endswith('?access_token=%s' % test_user_token))
+
+        self.login_superuser()
+        src = self.get_image_src()
+        self.assertTrue(src.endswith('?access_token=%s' % self.token))
+        self.assertNotIn(test_user_token, src)
+
+        self.logout()
+        self.assertNotIn('access_token', self.get_image_src())
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'example.com'])
+    def test_host(self):
+        self.assertTrue(self.get_image_src().startswith('http://testserver/'))
+        self.assertTrue(self.get_image_src(HTTP_HOST='example.com').startswith('http://example.com/'))
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.compiled_layer import get_compiled_layer
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer
+from layerserver.search import create_search_indexes, has_search_indexes
+from tests.common import BaseTest
+
+
+class DataBaseLayerAPISearchTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests-location'
+        layer.table = 'tests_location'
+        layer.pk_field = 'id'
+        layer.geom_field = 'geometry'
+        layer.anonymous_view = True
+        layer.anonymous_add = True
+        layer.anonymous_update = True
+        layer.anonymous_delete = True
+        layer.save()
+        layer.fields.filter(name__in=['code', 'address']).update(fullsearch=True)
+        self.layer = layer
+
+        Location = create_dblayer_model(layer)
+        addresses = ['C/ Jaume I, Girona', 'C/ Nou, Salt', 'Plaça Catalunya, Girona']
+        for i, address in enumerate(addresses):
+            location = Location()
+            location.code = 'C%s' % str(i).zfill(3)
+            location.address = address
+            location.geometry = 'POINT(0 %s)' % i
+            location.save()
+
+    def search(self, q):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url, data={'q': q})
+        self.assertEqual(response.status_code, 200)
+        return sorted(f['properties']['code'] for f in self.response_json(response)['features'])
+
+    def test_trigram(self):
+        self.layer.search_backend = 'trigram'
+        self.layer.save()
+        self.assertFalse(has_search_indexes(get_compiled_layer(self.layer.name)))
+        self.assertEqual(len(create_search_indexes(self.layer)), 2)
+        self.assertTrue(has_search_indexes(get_compiled_layer(self.layer.name)))
+        # Indexes are created once
+        create_search_indexes(self.layer)
+
+        self.assertEqual(self.search('giro'), ['C000', 'C002'])
+        self.assertEqual(self.search('C001'), ['C001'])
+
+    def test_fulltext(self):
+        self.layer.search_backend = 'fulltext'
+        self.layer.save()
+        self.assertEqual(self.search('girona jaume'), [])
+        compiled = get_compiled_layer(self.layer.name)
+        self.assertFalse(compiled.fulltext_search)
+
+        self.assertEqual(len(create_search_indexes(self.layer)), 1)
+        self.assertTrue(get_compiled_layer(self.layer.name).fulltext_search)
+        # Layers compiled before the indexes existed use them too
+        self.assertTrue(compiled.fulltext_search)
+        self.assertEqual(self.search('girona jaume'), ['C000'])
+        self.assertEqual(self.search('gir'), ['C000', 'C002'])
+        self.assertEqual(self.search('c001'), ['C001'])
+        self.assertEqual(self.search('?'), [])
+
+    def test_fulltext_field_change(self):
+        self.layer.search_backend = 'fulltext'
+        self.layer.save()
+        create_search_indexes(self.layer)
+        self.assertTrue(get_compiled_layer(self.layer.name).fulltext_search)
+
+        field = self.layer.fields.filter(name='code').first()
+        field.fullsearch = False
+        field.save()
+        # The index no longer matches the full search fields, q falls back to icontains
+        self.assertFalse(get_compiled_layer(self.layer.name).fulltext_search)
+        self.assertEqual(self.search('salt'), ['C001'])
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.compiled_layer import get_compiled_layer
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer
+from tests.common import BaseTest
+
+
+class DataBaseLayerAPISQLGeoJSONTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+        self.conn = conn
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests_location_25831'
+        layer.table = 'tests_location_25831'
+        layer.srid = 25831
+        layer.pk_field = 'code'
+        layer.geom_field = 'geometry'
+        layer.anonymous_view = True
+        layer.save()
+        self.layer = layer
+
+        Location = create_dblayer_model(layer)
+        for i in range(0, 12):
+            location = Location()
+            location.code = 'C%s' % str(i).zfill(3)
+            location.address = 'C/ Jaume %s, Girona' % i if i % 2 else None
+            location.geometry = 'SRID=25831;POINT(%s %s)' % (485984.399179716 + i, 4646678.69635524 + i)
+            location.save()
+
+    def assertSameFeatures(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        result = self.response_json(response)
+        with override_settings(LAYERSERVER_SQL_GEOJSON=False):
+            response = self.client.get(url)
+        expected = self.response_json(response)
+
+        self.assertEqual(len(result['features']), len(expected['features']))
+        for feature, expected_feature in zip(result['features'], expected['features']):
+            coordinates = feature['geometry'].pop('coordinates')
+            expected_coordinates = expected_feature['geometry'].pop('coordinates')
+            for value, expected_value in zip(coordinates, expected_coordinates):
+                self.assertAlmostEqual(value, expected_value, places=7)
+        self.assertEqual(result, expected)
+
+    def test_same_features(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        self.assertSameFeatures(url)
+        self.assertSameFeatures('%s?page=2&page_size=5' % url)
+        self.assertSameFeatures('%s?fields=address' % url)
+        self.assertSameFeatures('%s?cursor=&page_size=5&ordering=-code' % url)
+
+        self.layer.allow_page_size_0 = True
+        self.layer.save()
+        self.assertSameFeatures('%s?page_size=0' % url)
+
+    def test_pk_field_disabled(self):
+        field = self.layer.fields.filter(name='code').first()
+        field.enabled = False
+        field.save()
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        self.assertSameFeatures(url)
+
+    def test_python_only_fields(self):
+        layer = DataBaseLayer()
+        layer.db_connection = self.conn
+        layer.name = 'tests-testfield'
+        layer.table = 'tests_testfield'
+        layer.pk_field = 'id'
+        layer.geom_field = 'geometry'
+        layer.save()
+
+        fields = ['id', 'code', 'price', 'geometry']
+        self.assertIsNone(get_compiled_layer(layer.name).get_feature_expression(fields))
+        fields = ['id', 'code', 'enabled', 'x', 'geometry']
+        self.assertIsNotNone(get_compiled_layer(layer.name).get_feature_expression(fields))
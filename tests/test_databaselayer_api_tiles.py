@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer
+from layerserver.mvt import tile_bounds
+from tests.common import BaseTest
+
+
+class DataBaseLayerAPITilesTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests-location'
+        layer.table = 'tests_location'
+        layer.pk_field = 'id'
+        layer.geom_field = 'geometry'
+        layer.anonymous_view = True
+        layer.anonymous_add = True
+        layer.anonymous_update = True
+        layer.anonymous_delete = True
+        layer.save()
+        self.layer = layer
+
+        Location = create_dblayer_model(layer)
+        for i in range(0, 3):
+            location = Location()
+            location.code = 'C%s' % str(i).zfill(3)
+            location.address = 'C/ Jaume %s, Girona' % i
+            location.geometry = 'POINT(10 %s)' % (10 + i)
+            location.save()
+
+        self.tile_cache_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tile_cache_root, ignore_errors=True)
+        super().tearDown()
+
+    def tile_url(self, z, x, y):
+        return reverse('content-tiles', kwargs={'name': self.layer.name, 'z': z, 'x': x, 'y': y})
+
+    def test_tile_bounds(self):
+        self.assertEqual(tile_bounds(0, 0, 0), (-20037508.342789244, -20037508.342789244,
+                                                20037508.342789244, 20037508.342789244))
+        minx, miny, maxx, maxy = tile_bounds(1, 1, 0)
+        self.assertEqual((minx, miny), (0, 0))
+
+    def test_tile(self):
+        response = self.client.get(self.tile_url(0, 0, 0))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        tile = response.content
+        self.assertIn(self.layer.name.encode('utf-8'), tile)
+        for code in ['C000', 'C001', 'C002']:
+            self.assertIn(code.encode('utf-8'), tile)
+        self.assertIn(b'address', tile)
+
+        response = self.client.get(self.tile_url(1, 0, 1))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'C000', response.content)
+
+        response = self.client.get(self.tile_url(1, 2, 0))
+        self.assertEqual(response.status_code, 404)
+
+    def test_tile_fields_and_filters(self):
+        field = self.layer.fields.filter(name='address').first()
+        field.enabled = False
+        field.save()
+        self.layer.data_filter = {'code': 'C001'}
+        self.layer.save()
+
+        response = self.client.get(self.tile_url(0, 0, 0))
+        tile = response.content
+        self.assertNotIn(b'address', tile)
+        self.assertIn(b'C001', tile)
+        self.assertNotIn(b'C000', tile)
+
+    def test_tile_permissions(self):
+        self.layer.anonymous_view = False
+        self.layer.save()
+        response = self.client.get(self.tile_url(0, 0, 0))
+        self.assertEqual(response.status_code, 401)
+
+    def test_tile_cache(self):
+        self.layer.tile_cache = True
+        self.layer.save()
+        layer_cache = os.path.join(self.tile_cache_root, str(self.layer.pk))
+
+        with override_settings(LAYERSERVER_TILE_CACHE_ROOT=self.tile_cache_root):
+            response = self.client.get(self.tile_url(0, 0, 0))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(os.path.exists(layer_cache))
+            cached = self.client.get(self.tile_url(0, 0, 0))
+            self.assertEqual(response.content, cached.content)
+
+            url = reverse('content-list', kwargs={'name': self.layer.name})
+            data = {'code': 'C100', 'address': 'C/ Jaume 100, Girona', 'geometry': 'POINT (10 20)'}
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertFalse(os.path.exists(layer_cache))
+
+            response = self.client.get(self.tile_url(0, 0, 0))
+            self.assertIn(b'C100', response.content)
+
+    def test_tile_cache_timeout(self):
+        self.layer.tile_cache = True
+        self.layer.save()
+
+        with override_settings(LAYERSERVER_TILE_CACHE_ROOT=self.tile_cache_root, LAYERSERVER_TILE_CACHE_TIMEOUT=60):
+            self.client.get(self.tile_url(0, 0, 0))
+            # Changes made outside the API
+            location = create_dblayer_model(self.layer)()
+            location.code = 'C100'
+            location.address = 'C/ Jaume 100, Girona'
+            location.geometry = 'POINT(10 20)'
+            location.save()
+            self.assertNotIn(b'C100', self.client.get(self.tile_url(0, 0, 0)).content)
+
+            for root, _dirs, files in os.walk(self.tile_cache_root):
+                for name in files:
+                    os.utime(os.path.join(root, name), (0, 0))
+            self.assertIn(b'C100', self.client.get(self.tile_url(0, 0, 0)).content)
+
+    def test_tile_cache_filtered(self):
+        self.layer.tile_cache = True
+        self.layer.save()
+        layer_cache = os.path.join(self.tile_cache_root, str(self.layer.pk))
+
+        with override_settings(LAYERSERVER_TILE_CACHE_ROOT=self.tile_cache_root):
+            response = self.client.get(self.tile_url(0, 0, 0), data={'code': 'C001'})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'C001', response.content)
+            self.assertNotIn(b'C000', response.content)
+            self.assertFalse(os.path.exists(layer_cache))
+
+            self.client.get(self.tile_url(0, 0, 0))
+            self.assertEqual(len(os.listdir(layer_cache)), 1)
+            self.client.get(self.tile_url(0, 0, 0), data={'q': 'Jaume 1'})
+            self.client.get(self.tile_url(0, 0, 0), data={'fields': 'code'})
+            self.assertEqual(len(os.listdir(layer_cache)), 1)
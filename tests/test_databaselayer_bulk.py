@@ -1,4 +1,6 @@
 from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from giscube.models import DBConnection
@@ -244,6 +246,51 @@ class DataBaseLayerBulkAPITestCase(BaseTest):
 
         self.assertEqual(response.status_code, 400)
 
+    def test_bulk_update_set_based(self):
+        data = {
+            'UPDATE': [
+                {
+                    'code': location.code,
+                    'address': 'C/ Nou %s, Girona' % i
+                } for i, location in enumerate(self.locations)
+            ]
+        }
+        url = reverse('content-bulk', kwargs={'name': self.layer.name})
+        with CaptureQueriesContext(connections[self.Location._giscube_dblayer_db_connection]) as context:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(len([sql for sql in queries if sql.startswith('SELECT')]), 1)
+        self.assertEqual(len([sql for sql in queries if sql.startswith('UPDATE')]), 1)
+
+        Location = create_dblayer_model(self.layer)
+        for i, location in enumerate(self.locations):
+            obj = Location.objects.get(code=location.code)
+            self.assertEqual(obj.address, 'C/ Nou %s, Girona' % i)
+            self.assertEqual(obj.geometry.wkt, location.geometry.wkt)
+
+    def test_bulk_update_not_found_index(self):
+        data = {
+            'UPDATE': [
+                {
+                    'code': self.locations[5].code,
+                    'address': 'C/ Cor de Maria 5, Girona'
+                },
+                {
+                    'code': 'XXXX',
+                    'address': 'C/ Cor de Maria 1, Girona'
+                }
+            ]
+        }
+        url = reverse('content-bulk', kwargs={'name': self.layer.name})
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'UPDATE': {'1': 'ERROR_NOT_EXIST'}})
+
+        Location = create_dblayer_model(self.layer)
+        obj = Location.objects.get(code=self.locations[5].code)
+        self.assertEqual(obj.address, self.locations[5].address)
+
     def test_bulk_geometry_null(self):
         data = {
             'ADD': [],
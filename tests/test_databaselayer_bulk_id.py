@@ -1,4 +1,6 @@
 from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from giscube.models import DBConnection
@@ -104,6 +106,50 @@ class DataBaseLayerBulkIDAPITestCase(BaseTest):
         self.assertEqual(
             0, self.Location.objects.filter(code__in=data['DELETE']).count())
 
+    def test_bulk_add_batched(self):
+        data = {
+            'ADD': [
+                {
+                    'code': 'A%s' % str(i).zfill(3),
+                    'address': 'C/ Nou %s, Girona' % i,
+                    'geometry': 'POINT (1 %s)' % i
+                } for i in range(0, 20)
+            ]
+        }
+        url = reverse('content-bulk', kwargs={'name': self.layer.name})
+        with CaptureQueriesContext(connections[self.Location._giscube_dblayer_db_connection]) as context:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        inserts = [query['sql'] for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+        result = response.json()['ADD']
+        self.assertEqual(len(result), 20)
+        for i, item in enumerate(result):
+            obj = self.Location.objects.get(id=item['id'])
+            self.assertEqual(obj.code, data['ADD'][i]['code'])
+
+    def test_bulk_add_error_index(self):
+        data = {
+            'ADD': [
+                {
+                    'code': 'A101',
+                    'address': 'C/ Jaume 100, Girona',
+                    'geometry': 'POINT (0 10)'
+                },
+                {
+                    'code': 'A101',
+                    'address': 'C/ Jaume 100, Girona',
+                    'geometry': 'POINT (11 10)'
+                },
+            ]
+        }
+        url = reverse('content-bulk', kwargs={'name': self.layer.name})
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'ADD': {'1': 'ERROR_ON_SAVE'}})
+        self.assertFalse(self.Location.objects.filter(code='A101').exists())
+
     def test_bulk_ok_geojson(self):
         data = {
             'ADD': [
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.compiled_layer import get_compiled_layer
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer
+from tests.common import BaseTest
+
+
+class DataBaseLayerCompiledLayerTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests-location'
+        layer.table = 'tests_location'
+        layer.pk_field = 'id'
+        layer.geom_field = 'geometry'
+        layer.anonymous_view = True
+        layer.anonymous_add = True
+        layer.anonymous_update = True
+        layer.anonymous_delete = True
+        layer.save()
+        self.layer = layer
+
+        Location = create_dblayer_model(layer)
+        for i in range(0, 3):
+            location = Location()
+            location.code = 'C%s' % str(i).zfill(3)
+            location.address = 'C/ Jaume %s, Girona' % i
+            location.geometry = 'POINT(0 %s)' % i
+            location.save()
+
+    def test_compiled_layer_is_reused(self):
+        compiled = get_compiled_layer(self.layer.name)
+        self.assertIs(compiled, get_compiled_layer(self.layer.name))
+        Serializer = compiled.get_serializer_class(['id', 'code'])
+        self.assertIs(Serializer, compiled.get_serializer_class(['code', 'id']))
+
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['features']), 3)
+        self.assertIs(compiled, get_compiled_layer(self.layer.name))
+
+    def test_unknown_layer(self):
+        self.assertIsNone(get_compiled_layer('tests-unknown'))
+        url = reverse('content-list', kwargs={'name': 'tests-unknown'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_field_change_invalidates(self):
+        compiled = get_compiled_layer(self.layer.name)
+        self.assertIn('address', compiled.fields)
+
+        field = self.layer.fields.filter(name='address').first()
+        field.enabled = False
+        field.save()
+
+        new_compiled = get_compiled_layer(self.layer.name)
+        self.assertIsNot(compiled, new_compiled)
+        self.assertNotIn('address', new_compiled.fields)
+
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        feature = response.json()['features'][0]
+        self.assertNotIn('address', feature['properties'])
+
+    def test_layer_change_invalidates(self):
+        compiled = get_compiled_layer(self.layer.name)
+        self.layer.page_size = 2
+        self.layer.save()
+
+        self.assertIsNot(compiled, get_compiled_layer(self.layer.name))
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()['features']), 2)
+
+    def test_layer_delete_invalidates(self):
+        get_compiled_layer(self.layer.name)
+        self.layer.delete()
+        self.assertIsNone(get_compiled_layer(self.layer.name))
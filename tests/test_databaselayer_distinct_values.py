@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.models import DataBaseLayer, DataBaseLayerField
+from tests.common import BaseTest
+
+
+class DataBaseLayerDistinctValuesTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        with conn.get_connection().cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO tests_specie (code, name) VALUES
+                    ('001', 'Abies alba'), ('002', 'Abies alba'), ('003', 'Acer campestre'),
+                    ('004', 'Pinus nigra'), ('005', 'Pinus pinea'), ('006', NULL)
+            """)
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests_specie'
+        layer.table = 'tests_specie'
+        layer.pk_field = 'code'
+        layer.geom_field = None
+        layer.anonymous_view = True
+        layer.anonymous_add = True
+        layer.save()
+        layer.refresh_from_db()
+        field = layer.fields.filter(name='name').first()
+        field.widget = DataBaseLayerField.WIDGET_CHOICES.distinctvalues
+        field.widget_options = '{"allow_add_new": false}'
+        field.save()
+        self.layer = layer
+        self.url = reverse('content-distinct-values', kwargs={'name': layer.name, 'field': 'name'})
+
+    def test_detail_reference(self):
+        response = self.client.get(reverse('layer-detail', kwargs={'name': self.layer.name}))
+        self.assertEqual(response.status_code, 200)
+        field = [f for f in response.json()['fields'] if f['name'] == 'name'][0]
+        self.assertEqual(field['widget_options'], {'values_url': self.url, 'allow_add_new': False})
+
+    def test_pages(self):
+        response = self.client.get(self.url, {'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['values'], ['Abies alba', 'Acer campestre', 'Pinus nigra'])
+
+        response = self.client.get(result['next'])
+        result = response.json()
+        self.assertEqual(result['values'], ['Pinus pinea', None])
+        self.assertIsNone(result['next'])
+
+    def test_null_page(self):
+        response = self.client.get(self.url, {'limit': 2})
+        result = response.json()
+        self.assertEqual(result['values'], ['Abies alba', 'Acer campestre'])
+
+        result = self.client.get(result['next']).json()
+        self.assertEqual(result['values'], ['Pinus nigra', 'Pinus pinea'])
+        result = self.client.get(result['next']).json()
+        self.assertEqual(result['values'], [None])
+        self.assertIsNone(result['next'])
+
+    def test_prefix(self):
+        response = self.client.get(self.url, {'q': 'Pinus'})
+        self.assertEqual(response.json()['values'], ['Pinus nigra', 'Pinus pinea'])
+        response = self.client.get(self.url, {'q': 'Pinus%'})
+        self.assertEqual(response.json()['values'], [])
+        response = self.client.get(self.url, {'q': 'A', 'limit': 1})
+        result = response.json()
+        self.assertEqual(result['values'], ['Abies alba'])
+        response = self.client.get(result['next'])
+        result = response.json()
+        self.assertEqual(result['values'], ['Acer campestre'])
+        self.assertIsNone(result['next'])
+
+    def test_prefix_punctuation(self):
+        # Characters after 'z' and 'Z' are punctuation, sorted apart from letters by most collations
+        with self.layer.db_connection.get_connection().cursor() as cursor:
+            cursor.execute("INSERT INTO tests_specie (code, name) VALUES ('007', 'Azalea'), ('008', 'PZ 1')")
+        response = self.client.get(self.url, {'q': 'Az'})
+        self.assertEqual(response.json()['values'], ['Azalea'])
+        response = self.client.get(self.url, {'q': 'PZ'})
+        self.assertEqual(response.json()['values'], ['PZ 1'])
+
+    def test_cache_invalidated_by_writes(self):
+        response = self.client.get(self.url, {'q': 'Quercus'})
+        self.assertEqual(response.json()['values'], [])
+        response = self.client.post(
+            reverse('content-list', kwargs={'name': self.layer.name}), {'code': '007', 'name': 'Quercus ilex'})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(self.url, {'q': 'Quercus'})
+        self.assertEqual(response.json()['values'], ['Quercus ilex'])
+
+    def test_not_distinct_values_field(self):
+        url = reverse('content-distinct-values', kwargs={'name': self.layer.name, 'field': 'code'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
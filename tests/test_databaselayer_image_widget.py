@@ -231,6 +231,31 @@ class DataBaseLayerImageWidgetTestCase(BaseTest, TransactionTestCase):
 
         self.assertEqual(UserAsset.objects.all().count(), 0)
 
+    def test_bulk_delete_images(self):
+        self.login_test_user()
+
+        Model = create_dblayer_model(self.layer)
+        test_files = self.add_test_files(['giscube_01.png', 'giscube_02.png', 'giscube_03.png'])
+        paths = [test_file.image.path for test_file in test_files]
+        thumbnails = [test_file.image.storage.get_thumbnail(test_file.image.name)['path'] for test_file in test_files]
+        for path in paths + thumbnails:
+            self.assertTrue(os.path.exists(path))
+
+        data = {
+            'DELETE': [test_files[0].code, test_files[2].code]
+        }
+        url = reverse('content-bulk', kwargs={'name': self.layer.name})
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertFalse(Model.objects.filter(code__in=data['DELETE']).exists())
+        self.assertTrue(Model.objects.filter(code=test_files[1].code).exists())
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(thumbnails[0]))
+        self.assertTrue(os.path.exists(paths[1]))
+        self.assertFalse(os.path.exists(paths[2]))
+        self.assertFalse(os.path.exists(thumbnails[2]))
+
     def test_bulk_undo_create(self):
         """
         Undo created object due a failed update
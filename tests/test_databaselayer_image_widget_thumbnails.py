@@ -0,0 +1,147 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer, DataBaseLayerField
+from tests.common import BaseTest
+
+
+class DataBaseLayerImageWidgetThumbnailsTestCase(BaseTest, TransactionTestCase):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests_specie'
+        layer.table = 'tests_specie'
+        layer.pk_field = 'code'
+        layer.geom_field = None
+        layer.anonymous_view = True
+        layer.anonymous_add = True
+        layer.save()
+        layer.refresh_from_db()
+        field = layer.fields.filter(name='image').first()
+        field.widget = DataBaseLayerField.WIDGET_CHOICES.image
+        field.widget_options = json.dumps({
+            'upload_root': '<auto>',
+            'thumbnail_root': '<auto>',
+            'thumbnail_sizes': {'large': [512, 512]},
+            'thumbnail_format': 'webp'
+        })
+        field.save()
+        self.layer = layer
+
+    def add_image(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        with open('tests/files/giscube_01.png', 'rb') as f:
+            response = self.client.post(url, {'code': '001', 'name': 'Abies alba', 'image': f})
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def get_thumbnail_paths(self):
+        storage = create_dblayer_model(self.layer)._meta.get_field('image').storage
+        thumbnail_storage = storage.get_thumbnail_storage()
+        return [
+            os.path.join(thumbnail_storage.location, 'giscube_01.png.thumbnail.webp'),
+            os.path.join(thumbnail_storage.location, 'giscube_01.png.thumbnail.large.webp'),
+        ]
+
+    def test_sizes(self):
+        result = self.add_image()
+        for path in self.get_thumbnail_paths():
+            self.assertTrue(os.path.isfile(path))
+
+        c = Client()
+        response = c.get(result['image']['thumbnails']['large'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+
+    def test_pending(self):
+        result = self.add_image()
+        for path in self.get_thumbnail_paths():
+            os.remove(path)
+
+        c = Client()
+        response = c.get(result['image']['thumbnail'])
+        self.assertEqual(response.status_code, 202)
+        # Celery tasks are eager in the tests, the thumbnail has been saved
+        response = c.get(result['image']['thumbnail'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_rolled_back(self):
+        Model = create_dblayer_model(self.layer)
+        with self.assertRaises(ValueError):
+            with transaction.atomic(using=Model.objects.db):
+                specie = Model(code='001', name='Abies alba')
+                with open('tests/files/giscube_01.png', 'rb') as f:
+                    specie.image.save(name='giscube_01.png', content=File(f))
+                raise ValueError
+        # The thumbnails task isn't sent
+        for path in self.get_thumbnail_paths():
+            self.assertFalse(os.path.isfile(path))
+
+    def get_thumbnail_url(self, code, name):
+        kwargs = {'name': self.layer.name, 'pk': code, 'attribute': 'image', 'path': name}
+        return reverse('content-detail-thumbnail-value', kwargs=kwargs)
+
+    def test_error(self):
+        Model = create_dblayer_model(self.layer)
+        specie = Model(code='001', name='Abies alba')
+        specie.image.save(name='broken.png', content=ContentFile(b'not an image'))
+        specie.save()
+        # The worker leaves a marker file, the thumbnail isn't requested again
+        response = Client().get(self.get_thumbnail_url('001', 'broken.png.thumbnail.webp'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_without_thumbnail_root(self):
+        field = self.layer.fields.filter(name='image').first()
+        field.widget_options = json.dumps({'upload_root': '<auto>'})
+        field.save()
+        Model = create_dblayer_model(self.layer)
+        specie = Model(code='001', name='Abies alba')
+        with open('tests/files/giscube_01.png', 'rb') as f:
+            specie.image.save(name='giscube_01.png', content=File(f))
+        specie.save()
+        response = Client().get(self.get_thumbnail_url('001', 'giscube_01.png.thumbnail.png'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_generate_thumbnails_command(self):
+        self.add_image()
+        for path in self.get_thumbnail_paths():
+            os.remove(path)
+        call_command('dblayer_generate_thumbnails', self.layer.name)
+        for path in self.get_thumbnail_paths():
+            self.assertTrue(os.path.isfile(path))
+
+    def test_list_urls(self):
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        with open('tests/files/giscube_01.png', 'rb') as f:
+            response = self.client.post(url, {'code': '001 à', 'name': 'Abies alba', 'image': f})
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        image = response.json()['data'][0]['image']
+        kwargs = {'name': self.layer.name, 'pk': '001 à', 'attribute': 'image'}
+        self.assertEqual(image['src'], 'http://testserver%s' % reverse(
+            'content-detail-file-value', kwargs=dict(kwargs, path='giscube_01.png')))
+        self.assertEqual(image['thumbnails']['large'], 'http://testserver%s' % reverse(
+            'content-detail-thumbnail-value', kwargs=dict(kwargs, path='giscube_01.png.thumbnail.large.webp')))
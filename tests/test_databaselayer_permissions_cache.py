@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.model_legacy import create_dblayer_model
+from layerserver.models import DataBaseLayer, DBLayerGroup, DBLayerUser
+from layerserver.permissions import DBLayerPermissions
+from tests.common import BaseTest
+
+
+class DataBaseLayerPermissionsCacheTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test_connection'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests_location'
+        layer.table = 'tests_location'
+        layer.pk_field = 'id'
+        layer.geom_field = 'geometry'
+        layer.anonymous_view = False
+        layer.save()
+        self.layer = layer
+
+        Location = create_dblayer_model(layer)
+        for address in ('C/ Jaume 1, Girona', 'C/ Nou 2, Girona'):
+            location = Location()
+            location.address = address
+            location.geometry = 'POINT(0 1)'
+            location.save()
+
+        self.group = Group.objects.create(name='test')
+        self.group.user_set.add(self.test_user)
+        self.layer_group = DBLayerGroup.objects.create(
+            layer=layer, group=self.group, can_view=True, can_add=False, can_update=False, can_delete=False,
+            data_filter={'address': 'C/ Jaume 1, Girona'})
+
+    def test_group_permissions_and_data_filters(self):
+        permissions = DBLayerPermissions.get_permissions(self.layer, self.test_user)
+        self.assertEqual(permissions, {'view': True, 'add': False, 'update': False, 'delete': False})
+        self.assertEqual(
+            DBLayerPermissions.get_data_filters(self.layer, self.test_user, 'view'),
+            [{'address': 'C/ Jaume 1, Girona'}])
+        self.assertEqual(DBLayerPermissions.get_data_filters(self.layer, self.test_user, 'update'), [])
+
+    def test_user_permissions_replace_group_permissions(self):
+        DBLayerUser.objects.create(
+            layer=self.layer, user=self.test_user, can_view=False, can_add=True, can_update=False, can_delete=False)
+        permissions = DBLayerPermissions.get_permissions(self.layer, self.test_user)
+        self.assertEqual(permissions, {'view': False, 'add': True, 'update': False, 'delete': False})
+
+    def test_content_list_uses_cached_permissions(self):
+        self.login_test_user()
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['features']), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['features']), 1)
+        self.assertFalse(any('layerserver_dblayergroup' in query['sql'] for query in queries.captured_queries))
+
+    def test_layer_group_change_invalidates_permissions(self):
+        self.login_test_user()
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()['features']), 1)
+
+        self.layer_group.data_filter = {}
+        self.layer_group.save()
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()['features']), 2)
+
+        self.layer_group.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_user_groups_change_invalidates_permissions(self):
+        self.login_test_user()
+        url = reverse('content-list', kwargs={'name': self.layer.name})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        self.group.user_set.remove(self.test_user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        self.test_user.groups.add(self.group)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
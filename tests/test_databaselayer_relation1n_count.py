@@ -0,0 +1,131 @@
+import json
+
+from django.conf import settings
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.compiled_layer import get_compiled_layer
+from layerserver.models import DataBaseLayer, DataBaseLayerVirtualField
+from layerserver.relation_counts import get_count_view_name, get_count_views_status
+from tests.common import BaseTest
+
+
+class DataBaseLayerRelation1NCountTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test_connection'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+        self.conn = conn
+
+        with conn.get_connection().cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE street
+                (
+                  id serial NOT NULL,
+                  code character varying(20),
+                  geometry geometry(LineString,4326),
+                  CONSTRAINT street_id_pkey PRIMARY KEY (id),
+                  CONSTRAINT street_code_unique UNIQUE (code)
+                );
+                CREATE TABLE address
+                (
+                  id serial NOT NULL,
+                  street_code character varying(20),
+                  address character varying(255),
+                  geometry geometry(Point,4326),
+                  CONSTRAINT address_id_pkey PRIMARY KEY (id)
+                );
+                INSERT INTO street (code, geometry) VALUES
+                    ('A', 'SRID=4326;LINESTRING(0 0, 1 1)'), ('B', 'SRID=4326;LINESTRING(1 1, 2 2)');
+                INSERT INTO address (street_code, address, geometry) VALUES
+                    ('A', 'A 1', 'SRID=4326;POINT(0 0)'), ('A', 'A 2', 'SRID=4326;POINT(1 1)');
+            """)
+
+        self.street_layer = self.create_layer('street', 'street')
+        self.address_layer = self.create_layer('address', 'address')
+        for layer in (self.street_layer, self.address_layer):
+            layer.anonymous_view = True
+            layer.anonymous_add = True
+            layer.save()
+
+    def tearDown(self):
+        with self.conn.get_connection().cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS address CASCADE')
+            cursor.execute('DROP TABLE IF EXISTS street CASCADE')
+        super().tearDown()
+
+    def create_layer(self, name, table):
+        layer = DataBaseLayer()
+        layer.db_connection = self.conn
+        layer.name = name
+        layer.table = table
+        layer.pk_field = 'id'
+        layer.geom_field = 'geometry'
+        layer.save()
+        return layer
+
+    def create_virtual_field(self, materialized):
+        options = {'dblayer': 'address', 'to_field': 'code', 'dblayer_fk': 'street_code', 'count': True,
+                   'materialized': materialized}
+        return DataBaseLayerVirtualField.objects.create(
+            layer=self.street_layer, name='addresses', widget=DataBaseLayerVirtualField.WIDGET_CHOICES.relation1n,
+            widget_options=json.dumps(options))
+
+    def get_counts(self):
+        url = reverse('content-list', kwargs={'name': 'street'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return {
+            feature['properties']['code']: feature['properties']['addresses']['count']
+            for feature in response.json()['features']
+        }
+
+    def add_address(self, street_code):
+        url = reverse('content-bulk', kwargs={'name': 'address'})
+        data = {'ADD': [{'street_code': street_code, 'address': 'new', 'geometry': 'POINT (2 2)'}]}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_count(self):
+        self.create_virtual_field(materialized=False)
+        self.assertEqual(self.get_counts(), {'A': 2, 'B': 0})
+        self.add_address('B')
+        self.assertEqual(self.get_counts(), {'A': 2, 'B': 1})
+
+    def test_materialized_count(self):
+        self.create_virtual_field(materialized=True)
+        connection = self.conn.get_connection()
+        views = get_count_views_status(connection, self.address_layer)
+        self.assertEqual(views, {get_count_view_name(self.address_layer, 'street_code'): True})
+        self.assertIsNotNone(get_compiled_layer('address').get_count_view('street_code'))
+
+        self.assertEqual(self.get_counts(), {'A': 2, 'B': 0})
+        # The view is refreshed after the address layer changes
+        self.add_address('B')
+        self.assertEqual(self.get_counts(), {'A': 2, 'B': 1})
+
+        url = reverse('content-list', kwargs={'name': 'street'})
+        response = self.client.get(url, {'addresses': 1})
+        self.assertEqual([feature['properties']['code'] for feature in response.json()['features']], ['B'])
+
+    def test_count_view_created_later(self):
+        # A compiled layer that didn't find the view finds it once it's created
+        compiled = get_compiled_layer('address')
+        self.assertIsNone(compiled.get_count_view('street_code'))
+        self.create_virtual_field(materialized=True)
+        self.assertIsNotNone(compiled.get_count_view('street_code'))
+
+    def test_materialized_count_disabled(self):
+        field = self.create_virtual_field(materialized=True)
+        field.widget_options = json.dumps(dict(field.config, materialized=False))
+        field.save()
+        connection = self.conn.get_connection()
+        self.assertEqual(get_count_views_status(connection, self.address_layer), {})
+        self.assertEqual(self.get_counts(), {'A': 2, 'B': 0})
@@ -0,0 +1,90 @@
+import json
+
+from django.conf import settings
+from django.core.management import call_command
+from django.urls import reverse
+
+from giscube.models import DBConnection
+from layerserver.models import DataBaseLayer, DataBaseLayerField
+from tests.common import BaseTest
+
+
+class DataBaseLayerSqlchoicesTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        conn = DBConnection()
+        conn.alias = 'test'
+        conn.engine = settings.DATABASES['default']['ENGINE']
+        conn.name = settings.DATABASES['default']['NAME']
+        conn.user = settings.DATABASES['default']['USER']
+        conn.password = settings.DATABASES['default']['PASSWORD']
+        conn.host = settings.DATABASES['default']['HOST']
+        conn.port = settings.DATABASES['default']['PORT']
+        conn.save()
+        self.conn = conn
+
+        with conn.get_connection().cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO tests_specie (code, name) VALUES
+                    ('001', 'Abies alba'), ('002', 'Acer campestre'), ('003', 'Pinus nigra')
+            """)
+
+        layer = DataBaseLayer()
+        layer.db_connection = conn
+        layer.name = 'tests_specie'
+        layer.table = 'tests_specie'
+        layer.pk_field = 'code'
+        layer.geom_field = None
+        layer.anonymous_view = True
+        layer.save()
+        layer.refresh_from_db()
+        field = layer.fields.filter(name='image').first()
+        field.widget = DataBaseLayerField.WIDGET_CHOICES.sqlchoices
+        field.widget_options = json.dumps({
+            'query': 'select code, name from tests_specie order by code',
+            'label': '{code} - {name}'
+        })
+        field.save()
+        self.layer = layer
+        self.url = reverse('content-sqlchoices', kwargs={'name': layer.name, 'field': 'image'})
+
+    def test_detail_reference(self):
+        response = self.client.get(reverse('layer-detail', kwargs={'name': self.layer.name}))
+        self.assertEqual(response.status_code, 200)
+        field = [f for f in response.json()['fields'] if f['name'] == 'image'][0]
+        self.assertEqual(field['widget_options'], {
+            'values_list_headers': ['code', 'name'],
+            'values_url': self.url,
+            'label': '{code} - {name}'
+        })
+
+    def test_pages(self):
+        response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['count'], 3)
+        self.assertEqual(result['headers'], ['code', 'name'])
+        self.assertEqual(result['values'], [['001', 'Abies alba'], ['002', 'Acer campestre']])
+
+        result = self.client.get(result['next']).json()
+        self.assertEqual(result['values'], [['003', 'Pinus nigra']])
+        self.assertIsNone(result['next'])
+
+    def test_search(self):
+        result = self.client.get(self.url, {'q': 'ABIES'}).json()
+        self.assertEqual(result['count'], 1)
+        self.assertEqual(result['values'], [['001', 'Abies alba']])
+
+    def test_cache(self):
+        self.assertEqual(self.client.get(self.url).json()['count'], 3)
+        with self.conn.get_connection().cursor() as cursor:
+            cursor.execute("INSERT INTO tests_specie (code, name) VALUES ('004', 'Quercus ilex')")
+        self.assertEqual(self.client.get(self.url).json()['count'], 3)
+
+        call_command('dblayer_clear_sqlchoices_cache', self.layer.name)
+        self.assertEqual(self.client.get(self.url).json()['count'], 4)
+
+    def test_not_sqlchoices_field(self):
+        url = reverse('content-sqlchoices', kwargs={'name': self.layer.name, 'field': 'name'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,68 @@
+import os
+
+from django.conf import settings
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from giscube.utils import serve_protected_file
+from tests.common import BaseTest
+
+
+class FileDeliveryTestCase(BaseTest):
+    def setUp(self):
+        super(self.__class__, self).setUp()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'images'), exist_ok=True)
+        self.path = os.path.join(settings.MEDIA_ROOT, 'images', 'photo 1.jpg')
+        self.content = b'0123456789' * 10
+        with open(self.path, 'wb') as f:
+            f.write(self.content)
+        self.factory = RequestFactory()
+
+    def test_django(self):
+        response = serve_protected_file(self.factory.get('/'), self.path, cache_timeout=60)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('max-age=60', response['Cache-Control'])
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = serve_protected_file(self.factory.get('/', HTTP_IF_NONE_MATCH=etag), self.path)
+        self.assertEqual(response.status_code, 304)
+        response = serve_protected_file(self.factory.get('/', HTTP_IF_MODIFIED_SINCE=last_modified), self.path)
+        self.assertEqual(response.status_code, 304)
+
+        response = serve_protected_file(self.factory.get('/', HTTP_RANGE='bytes=10-19'), self.path)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+
+        # The file has changed, If-Range doesn't match
+        response = serve_protected_file(
+            self.factory.get('/', HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"other"'), self.path)
+        self.assertEqual(response.status_code, 200)
+        response = serve_protected_file(
+            self.factory.get('/', HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE=etag), self.path)
+        self.assertEqual(response.status_code, 206)
+
+    @override_settings(PROTECTED_FILES_DELIVERY_CLASS='giscube.utils.file_delivery.XAccelRedirectFileDelivery')
+    def test_x_accel_redirect(self):
+        with self.settings(PROTECTED_FILES_X_ACCEL_LOCATIONS={settings.MEDIA_ROOT: '/protected/media/'}):
+            response = serve_protected_file(self.factory.get('/'), self.path, as_attachment=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-Accel-Redirect'], '/protected/media/images/photo%201.jpg')
+            self.assertEqual(response['Content-Type'], 'image/jpeg')
+            self.assertEqual(response['Content-Disposition'], 'attachment; filename="photo 1.jpg"')
+            self.assertEqual(response.content, b'')
+
+        # Files out of the internal locations are sent from Django
+        with self.settings(PROTECTED_FILES_X_ACCEL_LOCATIONS={}):
+            response = serve_protected_file(self.factory.get('/'), self.path)
+            self.assertFalse(response.has_header('X-Accel-Redirect'))
+            self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    @override_settings(PROTECTED_FILES_DELIVERY_CLASS='giscube.utils.file_delivery.XSendfileFileDelivery')
+    def test_x_sendfile(self):
+        response = serve_protected_file(self.factory.get('/'), self.path)
+        self.assertEqual(response['X-Sendfile'], self.path)
+        self.assertEqual(response.content, b'')